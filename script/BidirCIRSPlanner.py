@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import time
+import sys
+import os
+import copy
+import random
+from collections import OrderedDict
+
+import rospy
+
+from RearrangementTaskPlanner import RearrangementTaskPlanner
+from RearrangementTaskPlanner import ArrNode
+from UnidirCIRSPlanner import UnidirCIRSPlanner
+from CIRSSolver import CIRSSolver
+
+############################### description ###########################################
+### This class defines a BidirCIRSPlanner class which
+### grows a left tree (treeL) from the initial arrangement toward the final arrangement
+### and a right tree (treeR) from the final arrangement toward the initial arrangement.
+### The right tree is grown with reversed actions (an object is moved from its
+### final-side position back to a buffer or its initial position).
+### The two trees are connected when they share an arrangement: the reversed actions
+### along the right tree are then replayed forward in the plan scene from the left node
+### so that the object paths of the solution are valid in the forward direction.
+### Besides, connections are attempted by growing a subTree from a left node
+### toward the arrangement of its nearest right node (fewest objects to move).
+#######################################################################################
+
+
+# Disable
+def blockPrint():
+    sys.stdout = open(os.devnull, 'w')
+
+# Restore
+def enablePrint():
+    sys.stdout = sys.__stdout__
+
+
+class BidirCIRSPlanner(UnidirCIRSPlanner):
+    def __init__(
+        self, initial_arrangement, final_arrangement, time_allowed, isLabeledRoadmapUsed=True,
+        heuristic_level=0, connection_time_allowed=10):
+        ### UnidirCIRSPlanner.__init__ runs the unidirectional search, so only the base is initialized here
+        RearrangementTaskPlanner.__init__(
+            self, initial_arrangement, final_arrangement, time_allowed, isLabeledRoadmapUsed)
+        rospy.logwarn("initialize a bidirectional CIRS planner")
+        self.heuristic_level = heuristic_level
+        ### the time (second) given to each attempt to connect a left node to a right node
+        self.connection_time_allowed = connection_time_allowed
+
+        ### initialize the right tree with the final_arrangement as the root node
+        ### the robot starts (and ends) at the same config as the left root
+        self.treeR = OrderedDict() ### key: ("R0", etc.) value: ArrNode
+        self.trees["Right"] = self.treeR
+        self.arrRightRegistr = []
+        self.idRightRegistr = []
+        self.orderRightRegistr = []
+        self.right_idx = 0
+        self.treeR["R0"] = ArrNode(
+            self.final_arrangement, self.treeL["L0"].robotConfig, "R0",
+            None, None, None, None, 0, None, [])
+        self.arrRightRegistr.append(self.final_arrangement)
+        self.idRightRegistr.append("R0")
+        self.orderRightRegistr.append([])
+        self.failedConnections = [] ### a list of (left node_id, right node_id) which fail to connect
+
+        remaining_time_allowed = self.time_threshold - (time.time() - self.planning_startTime)
+        self.growSubTree(self.treeL["L0"], self.final_arrangement, remaining_time_allowed, self.isLabeledRoadmapUsed)
+        if self.isSolved == False:
+            remaining_time_allowed = self.time_threshold - (time.time() - self.planning_startTime)
+            self.growRightSubTree(
+                self.treeR["R0"], self.initial_arrangement, remaining_time_allowed, self.isLabeledRoadmapUsed)
+            self.connectTrees()
+
+        ### alternate between the expansion of the two trees and the connection attempts
+        expansion_turn = 0
+        while (self.isSolved == False):
+            remaining_time_allowed = self.time_threshold - (time.time() - self.planning_startTime)
+            if (remaining_time_allowed <= 0):
+                break
+            if expansion_turn % 3 == 0:
+                ### perturb and grow the left tree toward the final arrangement
+                perturb_success, perturb_node = self.perturbNode()
+                if perturb_success:
+                    remaining_time_allowed = self.time_threshold - (time.time() - self.planning_startTime)
+                    num_nodes = len(self.treeL)
+                    self.growSubTree(perturb_node, self.final_arrangement, remaining_time_allowed, self.isLabeledRoadmapUsed)
+                    if len(self.treeL) == num_nodes:
+                        ### nothing grows from the perturbation
+                        self.recordPerturbationFailure(perturb_node.parent_id)
+            elif expansion_turn % 3 == 1:
+                ### perturb and grow the right tree toward the initial arrangement
+                perturb_success, perturb_node = self.perturbRightNode()
+                if perturb_success:
+                    remaining_time_allowed = self.time_threshold - (time.time() - self.planning_startTime)
+                    num_nodes = len(self.treeR)
+                    self.growRightSubTree(
+                        perturb_node, self.initial_arrangement, remaining_time_allowed, self.isLabeledRoadmapUsed)
+                    if len(self.treeR) == num_nodes:
+                        ### nothing grows from the perturbation
+                        self.recordPerturbationFailure(perturb_node.parent_id)
+            else:
+                ### grow a left node toward the arrangement of its nearest right node
+                self.growTowardRightTree()
+            expansion_turn += 1
+            if self.isSolved == False:
+                self.connectTrees()
+
+        if self.isSolved:
+            self.harvestSolution()
+
+
+    def growTowardRightTree(self):
+        '''this function randomly selects a left node and grows a subTree from it
+           toward the arrangement of the nearest node in the right tree'''
+        temp_node_id = random.choice(self.idLeftRegistr)
+        temp_node = self.treeL[temp_node_id]
+        ### the nearest right node has the fewest objects to move from the left node
+        nearest_right_idx = min(
+            range(len(self.arrRightRegistr)),
+            key=lambda i: self.getArrangementDistance(temp_node.arrangement, self.arrRightRegistr[i]))
+        target_arrangement = self.arrRightRegistr[nearest_right_idx]
+        if target_arrangement == temp_node.arrangement:
+            ### the two nodes are already connected
+            return
+        remaining_time_allowed = self.time_threshold - (time.time() - self.planning_startTime)
+        self.growSubTree(
+            temp_node, target_arrangement, min(remaining_time_allowed, self.connection_time_allowed),
+            self.isLabeledRoadmapUsed)
+
+
+    def getArrangementDistance(self, arrangement1, arrangement2):
+        '''the number of objects at different positions in two arrangements'''
+        return len([i for i in range(len(arrangement1)) if arrangement1[i] != arrangement2[i]])
+
+
+    def connectTrees(self):
+        '''this function checks if any arrangement is shared by the left and the right tree
+           and connects the two trees at this arrangement'''
+        for right_registr_idx in range(len(self.arrRightRegistr)):
+            right_arrangement = self.arrRightRegistr[right_registr_idx]
+            right_nodeID = self.idRightRegistr[right_registr_idx]
+            for left_registr_idx in range(len(self.arrLeftRegistr)):
+                if self.arrLeftRegistr[left_registr_idx] != right_arrangement:
+                    continue
+                left_nodeID = self.idLeftRegistr[left_registr_idx]
+                if (left_nodeID, right_nodeID) in self.failedConnections:
+                    continue
+                rospy.logwarn("the two trees meet at arrangement: %s" % str(right_arrangement))
+                connect_success = self.replayRightBranch(self.treeL[left_nodeID], self.treeR[right_nodeID])
+                if connect_success:
+                    return True
+                self.failedConnections.append((left_nodeID, right_nodeID))
+        return False
+
+
+    def replayRightBranch(self, leftNode, rightNode):
+        '''this function replays the reversed actions on the path from the rightNode to the
+           right root (final arrangement) forward, starting from the leftNode.
+           The resulting nodes are engrafted to the left tree.'''
+        set_scene_success = self.serviceCall_setSceneBasedOnArrangementNode(leftNode.arrangement, leftNode.robotConfig, "Right_torso")
+        if not set_scene_success:
+            rospy.logwarn("fail to set the scene to replay the right tree")
+            return False
+        ### the replayed actions form a chain subTree rooted at the leftNode
+        subTree = OrderedDict()
+        subTree[0] = copy.deepcopy(leftNode)
+        subTree[0].updateParent(None)
+        node_idx = 0
+        while rightNode.parent_id != None:
+            ### the reversed action moves the object from its position in the parent (right) node
+            ### to its position in the current right node. Replay it forward.
+            object_idx = rightNode.objectTransferred_idx
+            target_position_idx = rightNode.obj_transfer_position_indices[0]
+            curr_node = subTree[node_idx]
+            success, object_path = self.serviceCall_rearrangeCylinderObject(
+                object_idx, target_position_idx, "Right_torso", self.isLabeledRoadmapUsed)
+            if success == False:
+                rospy.logwarn("fail to replay the right tree to connect the two trees")
+                return False
+            new_arrangement = copy.deepcopy(curr_node.arrangement)
+            new_arrangement[object_idx] = target_position_idx
+            robot_config = self.serviceCall_getCurrRobotConfig()
+            if curr_node.objectTransferred_idx == None:
+                transit_from_info = None
+            else:
+                transit_from_info = [curr_node.objectTransferred_idx, curr_node.obj_transfer_position_indices[1]]
+            subTree[node_idx+1] = ArrNode(
+                new_arrangement, robot_config, node_idx+1, transit_from_info,
+                [curr_node.arrangement[object_idx], target_position_idx], object_idx, object_path,
+                curr_node.cost_to_come + 1, node_idx, copy.deepcopy(curr_node.object_ordering) + [object_idx]
+            )
+            node_idx += 1
+            rightNode = self.treeR[rightNode.parent_id]
+
+        self.engraftingLeftTree(leftNode, subTree)
+        return self.isSolved
+
+
+    def perturbRightNode(self):
+        '''this function selects a node in the right tree to perturb by
+           choosing an object to put on a buffer (a reversed action)'''
+        ### (i) first select a node (informed selection with heuristic_level >= 2, same as the left tree)
+        temp_node_id = self.pickNodeToPerturb(self.idRightRegistr, self.treeR, self.initial_arrangement)
+        temp_node = self.treeR[temp_node_id]
+        set_scene_success = self.serviceCall_setSceneBasedOnArrangementNode(temp_node.arrangement, temp_node.robotConfig, "Right_torso")
+        if not set_scene_success:
+            return False, None
+        ### (ii) randomly select an object and then buffer
+        ### the goal of the right tree is the initial arrangement
+        objects_yet_to_move = [
+            i for i in range(len(self.initial_arrangement)) if temp_node.arrangement[i] != self.initial_arrangement[i]]
+        success, object_idx, buffer_idx, object_path = self.serviceCall_selectObjectAndBuffer(
+                            objects_yet_to_move, self.initial_arrangement, "Right_torso", self.heuristic_level, self.isLabeledRoadmapUsed)
+        if success == False:
+            self.recordPerturbationFailure(temp_node_id)
+            return False, None
+        ### the perturbation is a success, generate a tree node for this perturbation
+        perturbed_arrangement = copy.deepcopy(temp_node.arrangement)
+        perturbed_arrangement[object_idx] = buffer_idx
+        robot_config = self.serviceCall_getCurrRobotConfig()
+        if temp_node.objectTransferred_idx == None:
+            transit_from_info = None
+        else:
+            transit_from_info = [temp_node.objectTransferred_idx, temp_node.obj_transfer_position_indices[1]]
+        perturbation_node = ArrNode(
+            perturbed_arrangement, robot_config, 0, transit_from_info,
+            [temp_node.arrangement[object_idx], buffer_idx], object_idx, object_path,
+            temp_node.cost_to_come + 1, temp_node.node_id, copy.deepcopy(temp_node.object_ordering) + [object_idx]
+        )
+        ### before add this node to the tree, check it this resulting node is already in the tree
+        isSameNodeInTheTree, same_nodeID = self.checkSameArrangementNodeInTheRightTree(perturbation_node)
+        if isSameNodeInTheTree:
+            return False, None
+        self.right_idx += 1
+        perturbation_node.updateNodeID("R"+str(self.right_idx))
+        self.treeR["R"+str(self.right_idx)] = perturbation_node
+        return True, perturbation_node
+
+
+    def growRightSubTree(self, rootNode, target_arrangement, time_allowed, isLabeledRoadmapUsed):
+        rospy.logwarn("grow a right subTree at root arrangement: %s" % str(rootNode.arrangement))
+        rospy.logwarn("toward to target arrangement: %s" % str(target_arrangement))
+        ### (i) set the scene to the rootNode arrangement
+        set_scene_success = self.serviceCall_setSceneBasedOnArrangementNode(rootNode.arrangement, rootNode.robotConfig, "Right_torso")
+        if not set_scene_success:
+            rospy.logwarn("fail to set the scene to grow the right subTree")
+            return
+        ### (ii) generate the subTree (with reversed actions)
+        cirs_solver = CIRSSolver(
+            rootNode, target_arrangement, time_allowed, isLabeledRoadmapUsed)
+        local_task_success, subTree = cirs_solver.cirs_solve()
+        ### (iii) engraft the subTree to the right tree
+        self.engraftingRightTree(rootNode, subTree)
+
+
+    def engraftingRightTree(self, rootNode, subTree):
+        if len(subTree) == 1:
+            ### the subTree only contains the rootNode, there is nothing to engraft
+            return
+
+        ### first construct a child dict
+        ### so we can use BFS to traverse the tree during engrafting
+        child_dict = {} ### key: parent, value: children (list)
+        for node_id, arr_node in subTree.items():
+            parent_id = arr_node.parent_id
+            if parent_id == None:
+                continue
+            if parent_id not in child_dict.keys():
+                child_dict[parent_id] = []
+            child_dict[parent_id].append(node_id)
+
+        ### use BFS to add the subTree to the right tree
+        idToID = OrderedDict()
+        queue = [0]
+        idToID[0] = rootNode.node_id
+
+        while (len(queue) != 0):
+            parent_id = queue.pop()
+            parent_nodeID = idToID[parent_id]
+            if parent_id not in child_dict.keys():
+                children_ids = []
+            else:
+                children_ids = child_dict[parent_id]
+            for child_id in children_ids:
+                isSameNodeInTheTree, same_nodeID = self.checkSameArrangementNodeInTheRightTree(subTree[child_id])
+                if isSameNodeInTheTree:
+                    idToID[child_id] = same_nodeID
+                    if self.treeR[same_nodeID].cost_to_come > subTree[child_id].cost_to_come:
+                        ### rewire to the better parent
+                        self.treeR[same_nodeID].updateCostToCome(subTree[child_id].cost_to_come)
+                        self.treeR[same_nodeID].updateParent(parent_nodeID)
+                        self.treeR[same_nodeID].updateObjectOrdering(subTree[child_id].object_ordering)
+                else:
+                    ### this is a new node to be added to the right tree
+                    self.right_idx += 1
+                    self.treeR["R"+str(self.right_idx)] = copy.deepcopy(subTree[child_id])
+                    self.treeR["R"+str(self.right_idx)].updateNodeID("R"+str(self.right_idx))
+                    self.treeR["R"+str(self.right_idx)].updateParent(parent_nodeID)
+                    self.arrRightRegistr.append(subTree[child_id].arrangement)
+                    self.idRightRegistr.append("R"+str(self.right_idx))
+                    self.orderRightRegistr.append(subTree[child_id].object_ordering)
+                    idToID[child_id] = "R"+str(self.right_idx)
+                queue.insert(0, child_id)
+
+
+    def checkSameArrangementNodeInTheRightTree(self, arr_node):
+        '''This function checks if an arrangement node is already in the right tree
+        It returns (1) same or not (bool) (2) if same, the node ID (string)'''
+        similar_arrangement_indices = [
+            i for i in range(len(self.arrRightRegistr)) if self.arrRightRegistr[i] == arr_node.arrangement]
+        for similar_arrangement_idx in similar_arrangement_indices:
+            similar_arrangement_nodeID = self.idRightRegistr[similar_arrangement_idx]
+            similar_node = self.treeR[similar_arrangement_nodeID]
+            if (arr_node.objectTransferred_idx == similar_node.objectTransferred_idx) and \
+                (arr_node.obj_transfer_position_indices == similar_node.obj_transfer_position_indices) and \
+                (arr_node.transit_from_info == similar_node.transit_from_info):
+                return True, similar_arrangement_nodeID
+        return False, None
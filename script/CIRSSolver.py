@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 from __future__ import division
 
-import time
 import sys
 import os
 import copy
@@ -13,6 +12,7 @@ import rospkg
 
 from MonotoneLocalSolver import MonotoneLocalSolver
 from MonotoneLocalSolver import ArrNode
+from ServiceProxyRegistry import service_proxy_registry
 
 from uniform_object_rearrangement.srv import DetectInvalidArrStates, DetectInvalidArrStatesRequest
 
@@ -27,9 +27,11 @@ def enablePrint():
 
 
 class CIRSSolver(MonotoneLocalSolver):
-    def __init__(self, startArrNode, target_arrangement, time_allowed, isLabeledRoadmapUsed=True):
+    def __init__(self, startArrNode, target_arrangement, time_allowed, isLabeledRoadmapUsed=True,
+                    plan_scene_ns="", stop_event=None):
         MonotoneLocalSolver.__init__(
-            self, startArrNode, target_arrangement, time_allowed, isLabeledRoadmapUsed)
+            self, startArrNode, target_arrangement, time_allowed, isLabeledRoadmapUsed,
+            plan_scene_ns, stop_event)
         rospy.logwarn("a CIRSSolver starts to work")
         self.explored = [] ### a list of arrangements which have been explored
 
@@ -38,6 +40,8 @@ class CIRSSolver(MonotoneLocalSolver):
         ### detect all invalid arrangement at which each object to be manipulated
         self.detectInvalidArrStates()
         LOCAL_TASK_SUCCESS = self.CIDFS_DP()
+        self.releaseSceneSnapshots()
+        self.reportPlansAvoided()
         return LOCAL_TASK_SUCCESS, self.tree
 
     def detectInvalidArrStates(self):
@@ -71,14 +75,46 @@ class CIRSSolver(MonotoneLocalSolver):
         if (current_arrangement == self.target_arrangement):
             ### the problem is solved
             return True
-        ### otherwise it's not solved yet. Check if time exceeds
-        if time.time() - self.local_planning_startTime >= self.time_threshold:
+        ### otherwise it's not solved yet. Check if time exceeds (or the search is stopped)
+        if self.isTerminated():
             return False
 
         FLAG = False
         remaining_objects = [i for i in range(len(current_arrangement)) \
                             if current_arrangement[i] != self.target_arrangement[i]]
-        for obj_idx in remaining_objects:
+        objects_to_try = self.getObjectsToTry(current_arrangement, remaining_objects)
+        while len(objects_to_try) != 0:
+            ### try to rearrange the objects (in order) until one of them succeeds
+            ### (the scene is restored by the plan scene after each failed attempt)
+            obj_position, transition_path, snapshot_id = self.rearrangeFirstFeasibleObject(objects_to_try)
+            if obj_position == None:
+                ### none of the objects can be rearranged, the scene stays at the current arrangement
+                break
+            obj_idx = objects_to_try[obj_position]
+            obj_curr_position_idx = current_arrangement[obj_idx]
+            self.generateLocalNode(current_node_id, obj_idx, transition_path)
+            ### recursive call
+            FLAG = self.CIDFS_DP()
+            if FLAG:
+                return FLAG
+            ### first check if FLAG == False is due to timeout, if it is, just return
+            if self.isTerminated():
+                return FLAG
+            ### put the scene back to the snapshot taken at the beginning of the function call
+            self.revertBackToSnapshot(snapshot_id, current_node_id, obj_idx, obj_curr_position_idx, "Right_torso")
+            ### move on to the objects after obj_idx
+            objects_to_try = self.getObjectsToTry(current_arrangement, objects_to_try[obj_position+1:])
+
+        ### the problem is not solved but there is no option
+        ### the current arrangement is not the right parent
+        ### from which a solution can be found, mark it as exlored
+        self.explored.append(current_arrangement)
+        return FLAG
+
+    def getObjectsToTry(self, current_arrangement, objects):
+        '''get the objects (in order) worth rearranging at the current arrangement'''
+        objects_to_try = []
+        for obj_idx in objects:
             ### first check if the resulting arrangement after rearranging object obj_idx
             ### has been explored before
             resulting_arrangement = copy.deepcopy(current_arrangement)
@@ -87,47 +123,14 @@ class CIRSSolver(MonotoneLocalSolver):
                 ### this resulting arrangement has been explored before and
                 ### turns out to be failure, so no need to do it again
                 continue
-            ### otherwise, this object obj_idx has not been considered
-            ### BUT BEFORE REARRANGE THIS OBJECT, 
+            ### BUT BEFORE REARRANGE THIS OBJECT,
             ### check if current_arrangement belongs to one of invalid
             ### arr states for the object to be manipulated
             if self.checkInvalidArrStates(current_arrangement, obj_idx):
                 ### this is not the right time to rearrange that object
-                # print("I see the current arrangement {} is invalid for {} to be manipulated now: ".format(current_arrangement, obj_idx))
-                # input("check if it is really the case...")
                 continue
-            ### otherwise, let's check this object by rearranging it
-            obj_curr_position_idx = current_arrangement[obj_idx]
-            obj_target_position_idx = self.target_arrangement[obj_idx]
-            rearrange_success, transition_path = self.serviceCall_rearrangeCylinderObject(
-                obj_idx, obj_target_position_idx, "Right_torso", isLabeledRoadmapUsed=self.isLabeledRoadmapUsed)
-            # print("\n====================")
-            # print("rearranging_success: ", rearrange_success)
-            # input("enter to continue")
-            # print("====================\n")
-            if rearrange_success:
-                self.generateLocalNode(current_node_id, obj_idx, transition_path)
-                ### recursive call
-                FLAG = self.CIDFS_DP()
-                if FLAG:
-                    return FLAG
-                else:
-                    ### first check if FLAG == False is due to timeout, if it is, just return
-                    if time.time() - self.local_planning_startTime >= self.time_threshold:
-                        return FLAG
-                    ### put the object and robot back to the configuration they belong to
-                    ### at the beginning of the function call
-                    self.revertBackToParentNode(current_node_id, obj_idx, obj_curr_position_idx, "Right_torso")
-            else:
-                ### put the object and robot back to the configuration they belong to
-                ### at the beginning of the function call
-                self.revertBackToParentNode(current_node_id, obj_idx, obj_curr_position_idx, "Right_torso")
-
-        ### the problem is not solved but there is no option
-        ### the current arrangement is not the right parent
-        ### from which a solution can be found, mark it as exlored
-        self.explored.append(current_arrangement)
-        return FLAG
+            objects_to_try.append(obj_idx)
+        return MonotoneLocalSolver.getObjectsToTry(self, current_arrangement, objects_to_try)
 
     def checkInvalidArrStates(self, current_arrangement, obj_idx):
         for invalid_arr_state in self.invalid_arr_states_per_obj[obj_idx]:
@@ -152,14 +155,12 @@ class CIRSSolver(MonotoneLocalSolver):
 
 
     def serviceCall_detectInvalidArrStates(self):
-        rospy.wait_for_service("detect_invalid_arr_states")
         request = DetectInvalidArrStatesRequest()
         request.start_arrangement = self.start_arrangement
         request.target_arrangement = self.target_arrangement
         try:
-            detectInvalidArrStates_proxy = rospy.ServiceProxy(
-                "detect_invalid_arr_states", DetectInvalidArrStates)
-            detect_invalid_arr_states_response = detectInvalidArrStates_proxy(request)
+            detect_invalid_arr_states_response = service_proxy_registry.call(
+                self.plan_scene_ns + "detect_invalid_arr_states", DetectInvalidArrStates, request)
             return detect_invalid_arr_states_response.all_obj_invalid_arr_states
         except rospy.ServiceException as e:
             print("detect_invalid_arr_states service call failed: %s" % e)
\ No newline at end of file
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import time
+import random
+import multiprocessing
+import numpy as np
+from collections import OrderedDict
+
+from Planner import PositionCandidateConfigs
+
+############################### description ###########################################
+### This module builds the config poses of all the position candidates
+### (CandidatesConfigPoses.obj) without any interaction, which is needed each time
+### the workspace parameters (e.g., discretization_x/y, cylinder radius) change.
+### (1) the (candidate, orientation) pairs are processed in a pool of worker processes,
+###     each holding a headless plan scene (a PybulletPlanScene in "direct" mode)
+### (2) retry policy: see Planner.generateConfigBasedOnPose_candidatesHeadless
+### (3) deterministic seeding: the random generators are seeded per (candidate, orientation)
+###     and the robot is reset home before each pair, and no IK solution is learned online
+###     (see IKSeeding.py), so the database only depends on the seed
+###     (not on the number of processes or the order of the pairs)
+### (4) progress reporting: #pairs done, elapsed time and the estimated time left
+### (the pairs unreachable in the reachability map are not skipped: the config poses are the second,
+### deeper check before a candidate is taken as unreachable, see ReachabilityMap.py)
+#######################################################################################
+
+### the plan scene of a worker process
+worker_plan_scene = None
+
+
+def initWorkerPlanScene():
+    global worker_plan_scene
+    from PybulletPlanScene import PybulletPlanScene
+    worker_plan_scene = PybulletPlanScene(["PybulletPlanScene.py", "direct"])
+
+
+def getPoseSeed(seed, candidate_idx, pose_id):
+    return (seed * 1000003 + candidate_idx * 101 + pose_id) % (2**32)
+
+
+def generateCandidateConfigPose(planner, robot, workspace, pose_task):
+    candidate_idx, pose_id, pose, armType, seed, num_solutions, max_rounds, max_trials = pose_task
+    random.seed(getPoseSeed(seed, candidate_idx, pose_id))
+    np.random.seed(getPoseSeed(seed, candidate_idx, pose_id))
+    robot.resetRobotToHomeConfiguration()
+    planner.isIKSeedLearned = False
+    cylinder_position_candidates = {
+        candidate.position_idx : candidate for candidate in workspace.candidate_geometries.values()}
+    config_pose = planner.generateConfigBasedOnPose_candidatesHeadless(
+        pose, robot, workspace, armType, cylinder_position_candidates, num_solutions, max_rounds, max_trials)
+    return candidate_idx, pose_id, config_pose
+
+
+def generateCandidateConfigPoseInWorker(pose_task):
+    return generateCandidateConfigPose(
+        worker_plan_scene.planner_p, worker_plan_scene.robot_p, worker_plan_scene.workspace_p, pose_task)
+
+
+def buildCandidatesConfigPoses(planner, robot, workspace, armType,
+                    num_processes=0, seed=0, num_solutions=3, max_rounds=6, max_trials=10):
+    '''build the config poses of all the position candidates of the workspace
+       planner, robot, workspace: the plan scene (which generates the config poses if num_processes <= 1)
+       return an OrderedDict (key: candidate_idx, value: PositionCandidateConfigs)'''
+    pose_tasks = []
+    config_poses = {}
+    for candidate_idx, cylinder_candidate in workspace.candidate_geometries.items():
+        graspingPose_candidates = planner.generate_pose_candidates(cylinder_candidate.pos, workspace.cylinder_height)
+        for pose_id, graspingPose in enumerate(graspingPose_candidates):
+            pose_tasks.append((candidate_idx, pose_id, graspingPose, armType, seed, num_solutions, max_rounds, max_trials))
+    print("build the config poses of {} candidates ({} poses) with {} process(es), seed {}".format(
+        len(workspace.candidate_geometries), len(pose_tasks), max(num_processes, 1), seed))
+
+    start_time = time.time()
+    pool = None
+    if num_processes > 1:
+        pool = multiprocessing.get_context("spawn").Pool(num_processes, initializer=initWorkerPlanScene)
+        results = pool.imap_unordered(generateCandidateConfigPoseInWorker, pose_tasks)
+    else:
+        results = (generateCandidateConfigPose(planner, robot, workspace, pose_task) for pose_task in pose_tasks)
+    for (candidate_idx, pose_id, config_pose) in results:
+        config_poses[(candidate_idx, pose_id)] = config_pose
+        num_done = len(config_poses)
+        elapsed_time = time.time() - start_time
+        if (num_done % 10 == 0) or (num_done == len(pose_tasks)):
+            print("[{}/{}] poses done, {:.1f}s elapsed, {:.1f}s left".format(
+                num_done, len(pose_tasks), elapsed_time, elapsed_time / num_done * (len(pose_tasks) - num_done)))
+    if pool != None:
+        pool.close()
+        pool.join()
+    robot.resetRobotToHomeConfiguration()
+
+    ### put the config poses of each candidate in the order of the orientations
+    position_candidates_configPoses = OrderedDict()
+    candidates_without_poses = []
+    total_rounds = 0
+    for (candidate_idx, pose_id) in sorted(config_poses.keys()):
+        if candidate_idx not in position_candidates_configPoses:
+            position_candidates_configPoses[candidate_idx] = PositionCandidateConfigs(candidate_idx)
+        approaching_config, grasping_config, approaching_label, grasping_label, total_label, num_rounds = \
+                                                                config_poses[(candidate_idx, pose_id)]
+        total_rounds += num_rounds
+        if approaching_config != []:
+            position_candidates_configPoses[candidate_idx].approaching_configs.append(approaching_config)
+            position_candidates_configPoses[candidate_idx].grasping_configs.append(grasping_config)
+            position_candidates_configPoses[candidate_idx].approaching_labels.append(approaching_label)
+            position_candidates_configPoses[candidate_idx].grasping_labels.append(grasping_label)
+            position_candidates_configPoses[candidate_idx].total_labels.append(total_label)
+    for candidate_idx, candidate_configPoses in position_candidates_configPoses.items():
+        if len(candidate_configPoses.grasping_configs) == 0:
+            candidates_without_poses.append(candidate_idx)
+    print("finish building the config poses in {:.1f}s ({} IK rounds)".format(time.time() - start_time, total_rounds))
+    print("candidates without any valid pose: {}".format(candidates_without_poses))
+    return position_candidates_configPoses
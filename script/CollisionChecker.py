@@ -1,4 +1,5 @@
 from __future__ import division
+import numpy as np
 import pybullet as p
 import pybullet_data
 import IPython
@@ -235,6 +236,41 @@ class CollisionChecker(object):
                     break
         return isCollision, objectCollided
 
+    def getCandidatesNearBody(self, bodyGEO, candidates, margin=0.0):
+        ### broad phase of the labeled check against the position candidates
+        ### candidates is a dictionary (key: position_idx, value: CylinderCandidate)
+        ### output: the position_idx of the candidates whose bounding box (enlarged by margin)
+        ###         overlaps the AABB of a link of the body (the others cannot be in contact)
+        if len(candidates) == 0:
+            return []
+        link_aabbs = np.array([p.getAABB(bodyGEO, link_idx, physicsClientId=self.server) \
+                        for link_idx in range(-1, p.getNumJoints(bodyGEO, physicsClientId=self.server))])
+        position_indices = list(candidates.keys())
+        candidate_positions = np.array([candidates[position_idx].pos for position_idx in position_indices])
+        half_extents = np.array([[candidate.cylinder_radius, candidate.cylinder_radius, candidate.cylinder_height / 2] \
+                        for candidate in candidates.values()]) + margin
+        candidate_mins = (candidate_positions - half_extents)[:, np.newaxis, :]
+        candidate_maxs = (candidate_positions + half_extents)[:, np.newaxis, :]
+        ### (#candidates x #links)
+        isOverlapped = np.all(candidate_mins <= link_aabbs[np.newaxis, :, 1, :], axis=2) & \
+                       np.all(candidate_maxs >= link_aabbs[np.newaxis, :, 0, :], axis=2)
+        return [position_indices[i] for i in np.nonzero(np.any(isOverlapped, axis=1))[0]]
+
+    def collisionCheck_robot_candidates_labeled(self, robotGEO, candidates):
+        ### the labeled check between the robot and the position candidates
+        ### (key: position_idx, value: CylinderCandidate), only the meshes of the candidates
+        ### near the robot are created (lazily) and checked
+        near_candidates = self.getCandidatesNearBody(robotGEO, candidates)
+        return self.collisionCheck_robot_staticObjectGEOs_labeled(
+            robotGEO, {position_idx : candidates[position_idx].geo for position_idx in near_candidates})
+
+    def collisionCheck_object_candidates_labeled(self, objectGEO, candidates):
+        ### the labeled check between the object in hand and the position candidates
+        ### (same distance as collisionCheck_object_objectGEO_labeled)
+        near_candidates = self.getCandidatesNearBody(objectGEO, candidates, margin=0.003)
+        return self.collisionCheck_object_objectGEO_labeled(
+            objectGEO, {position_idx : candidates[position_idx].geo for position_idx in near_candidates})
+
     def collisionCheck_object_objectGEO_labeled(self, objectGEO, object_geometries):
         ### here object_geometries is a dictionary (key: object_index, value: objectGEO)
         isCollision = False
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import os
+import pickle
+import numpy as np
+
+from sensor_msgs.msg import JointState
+from uniform_object_rearrangement.msg import ArmTrajectory
+from uniform_object_rearrangement.msg import ObjectRearrangePath
+from TrajectoryInterpolation import densifyObjectRearrangePath
+
+############################### description ###########################################
+### This module defines the compact (columnar) plan format and a CompactPlan class
+### which loads a plan lazily. A plan in an instance folder consists of
+### (1) plan_waypoints.npy: a float32 array (#waypoints x #joints) of all the waypoints
+###     of all the trajectory segments, segment after segment
+### (2) plan_segments.npy: an int32 array (#segments x 4), one row per trajectory segment
+###     [first waypoint row, last waypoint row (exclusive), object_idx, event]
+###     where event is what to do with the object after the segment (see SEGMENT_EVENT_*).
+###     An object path has three segments (transit, transfer, finish),
+###     the trajectory to reset the robot home (if any) is the last segment (object_idx -1)
+### (3) plan_meta.txt: the armType (1st line) and the joint names (2nd line)
+### The waypoints are memory-mapped when the plan is loaded, so a segment is only read
+### (and converted to JointState) when it is executed.
+### The pickled plans (path.obj) can be loaded in memory (loadPickledPlan, nothing is written)
+### or converted into the compact format explicitly (importPickledPlan).
+#######################################################################################
+
+SEGMENT_EVENT_NONE = 0
+SEGMENT_EVENT_ATTACH = 1
+SEGMENT_EVENT_DETACH = 2
+
+
+def buildCompactPlanArrays(object_paths, resetHome_trajectory=None):
+    '''the arrays of a plan (a list of ObjectRearrangePath and the trajectory to reset home)
+       in the compact format: waypoints, segment table, armType, joint names'''
+    segments = []
+    for object_path in object_paths:
+        ### the paths of a plan can be sparse if they come from the search
+        object_path = densifyObjectRearrangePath(object_path)
+        segments.append((object_path.transit_trajectory, object_path.object_idx, SEGMENT_EVENT_ATTACH))
+        segments.append((object_path.transfer_trajectory, object_path.object_idx, SEGMENT_EVENT_DETACH))
+        segments.append((object_path.finish_trajectory, object_path.object_idx, SEGMENT_EVENT_NONE))
+    if resetHome_trajectory != None:
+        segments.append((resetHome_trajectory, -1, SEGMENT_EVENT_NONE))
+
+    armType = ""
+    jointNames = []
+    for (arm_trajectory, object_idx, event) in segments:
+        if len(arm_trajectory.trajectory) != 0:
+            armType = arm_trajectory.armType
+            jointNames = list(arm_trajectory.trajectory[0].name)
+            break
+    waypoints = [joint_state.position for (arm_trajectory, object_idx, event) in segments \
+                                                for joint_state in arm_trajectory.trajectory]
+    waypoints = np.array(waypoints, dtype=np.float32).reshape(len(waypoints), len(jointNames))
+    segment_table = np.zeros((len(segments), 4), dtype=np.int32)
+    first_row = 0
+    for segment_idx, (arm_trajectory, object_idx, event) in enumerate(segments):
+        last_row = first_row + len(arm_trajectory.trajectory)
+        segment_table[segment_idx] = [first_row, last_row, object_idx, event]
+        first_row = last_row
+    return waypoints, segment_table, armType, jointNames
+
+
+def saveCompactPlan(object_paths, instanceFolder, resetHome_trajectory=None):
+    '''save a plan (a list of ObjectRearrangePath and the trajectory to reset home) in the compact format'''
+    waypoints, segment_table, armType, jointNames = buildCompactPlanArrays(object_paths, resetHome_trajectory)
+    if not os.path.exists(instanceFolder):
+        os.makedirs(instanceFolder)
+    np.save(os.path.join(instanceFolder, "plan_waypoints.npy"), waypoints)
+    np.save(os.path.join(instanceFolder, "plan_segments.npy"), segment_table)
+    f_meta = open(os.path.join(instanceFolder, "plan_meta.txt"), "w")
+    f_meta.write(armType + "\n")
+    f_meta.write(" ".join(jointNames) + "\n")
+    f_meta.close()
+
+
+def isCompactPlanSaved(instanceFolder):
+    return os.path.exists(os.path.join(instanceFolder, "plan_segments.npy"))
+
+
+def readPickledPlan(instanceFolder):
+    '''the object paths and the trajectory to reset home of the pickled plan (path.obj)'''
+    f_path = open(os.path.join(instanceFolder, "path.obj"), 'rb')
+    object_paths = pickle.load(f_path)
+    resetHome_trajectory = pickle.load(f_path)
+    f_path.close()
+    return object_paths, resetHome_trajectory
+
+
+def loadPickledPlan(instanceFolder):
+    '''a CompactPlan (in memory) of the pickled plan in the instance folder, nothing is written'''
+    object_paths, resetHome_trajectory = readPickledPlan(instanceFolder)
+    return CompactPlan.fromArrays(*buildCompactPlanArrays(object_paths, resetHome_trajectory))
+
+
+def importPickledPlan(instanceFolder):
+    '''convert the pickled plan (path.obj) in the instance folder into the compact format (plan_*)'''
+    object_paths, resetHome_trajectory = readPickledPlan(instanceFolder)
+    saveCompactPlan(object_paths, instanceFolder, resetHome_trajectory)
+
+
+class CompactPlan(object):
+    '''a plan in the compact format, loaded lazily from an instance folder
+    It can be used as a list of ObjectRearrangePath (an object path is only
+    converted to JointState when it is accessed)'''
+    def __init__(self, instanceFolder=None):
+        ### instanceFolder=None: an empty plan, see fromArrays
+        self.waypoints = np.zeros((0, 0), dtype=np.float32)
+        self.segments = np.zeros((0, 4), dtype=np.int32)
+        self.armType = ""
+        self.jointNames = []
+        if instanceFolder != None:
+            self.waypoints = np.load(os.path.join(instanceFolder, "plan_waypoints.npy"), mmap_mode='r')
+            self.segments = np.load(os.path.join(instanceFolder, "plan_segments.npy"))
+            f_meta = open(os.path.join(instanceFolder, "plan_meta.txt"), "r")
+            self.armType = f_meta.readline().strip()
+            self.jointNames = f_meta.readline().split()
+            f_meta.close()
+        self.num_object_paths = len([1 for segment in self.segments if segment[2] != -1]) // 3
+
+    @staticmethod
+    def fromArrays(waypoints, segments, armType, jointNames):
+        '''a plan held in memory (e.g., the arrays of buildCompactPlanArrays)'''
+        compact_plan = CompactPlan()
+        compact_plan.waypoints = waypoints
+        compact_plan.segments = segments
+        compact_plan.armType = armType
+        compact_plan.jointNames = list(jointNames)
+        compact_plan.num_object_paths = len([1 for segment in segments if segment[2] != -1]) // 3
+        return compact_plan
+
+    def __len__(self):
+        return self.num_object_paths
+
+    def __getitem__(self, path_idx):
+        if path_idx < 0:
+            path_idx += self.num_object_paths
+        if (path_idx < 0) or (path_idx >= self.num_object_paths):
+            raise IndexError("object path index out of range")
+        object_path = ObjectRearrangePath()
+        object_path.transit_trajectory = self.getArmTrajectory(3*path_idx)
+        object_path.transfer_trajectory = self.getArmTrajectory(3*path_idx+1)
+        object_path.finish_trajectory = self.getArmTrajectory(3*path_idx+2)
+        object_path.object_idx = int(self.segments[3*path_idx][2])
+        return object_path
+
+    def __iter__(self):
+        for path_idx in range(self.num_object_paths):
+            yield self[path_idx]
+
+    def getSegmentWaypoints(self, segment_idx):
+        '''the waypoints of a segment (a read-only view of the memory-mapped array)'''
+        first_row, last_row = self.segments[segment_idx][0], self.segments[segment_idx][1]
+        return self.waypoints[first_row:last_row]
+
+    def getArmTrajectory(self, segment_idx):
+        arm_trajectory = ArmTrajectory()
+        arm_trajectory.armType = self.armType
+        for config in self.getSegmentWaypoints(segment_idx).tolist():
+            joint_state = JointState()
+            joint_state.name = self.jointNames
+            joint_state.position = config
+            arm_trajectory.trajectory.append(joint_state)
+        return arm_trajectory
+
+    def iterateSegments(self):
+        '''yield (arm trajectory, object_idx, event) of each segment in order'''
+        for segment_idx in range(len(self.segments)):
+            yield self.getArmTrajectory(segment_idx), int(self.segments[segment_idx][2]), int(self.segments[segment_idx][3])
+
+    def getResetHomeTrajectory(self):
+        '''the trajectory to reset the robot home (None if it is not saved with the plan)'''
+        if (len(self.segments) == 0) or (self.segments[-1][2] != -1):
+            return None
+        return self.getArmTrajectory(len(self.segments)-1)
@@ -7,6 +7,7 @@ import math
 
 import utils
 from CollisionChecker import CollisionChecker
+from TrajectoryInterpolation import interpolateConfigs, timeParameterizeWaypoints
 
 import rospy
 from sensor_msgs.msg import JointState
@@ -22,6 +23,20 @@ class Executor(object):
         self.objectInRightHand = objectInRightHand
         self.leftLocalPose = [[-1, -1, -1], [-1, -1, -1, -1]]
         self.rightLocalPose = [[-1, -1, -1], [-1, -1, -1, -1]]
+        ### time parameterization of the trajectories (see setTimeParameterization)
+        self.isTimeParameterized = False
+        self.max_joint_velocity = 1.0 ### rad/s
+        self.max_joint_acceleration = 2.0 ### rad/s^2
+        self.control_rate = 30.0 ### Hz
+
+    def setTimeParameterization(self, isTimeParameterized, max_joint_velocity, max_joint_acceleration, control_rate):
+        """execute the trajectories with a trapezoidal velocity profile (limited by max_joint_velocity
+        and max_joint_acceleration) sampled at control_rate, instead of waypoint by waypoint
+        """
+        self.isTimeParameterized = isTimeParameterized
+        self.max_joint_velocity = max_joint_velocity
+        self.max_joint_acceleration = max_joint_acceleration
+        self.control_rate = control_rate
 
     def attachObject(self, object_idx, workspace, robot, armType):
         """attach or detach the object
@@ -98,7 +113,7 @@ class Executor(object):
                 self.objectInRightHand, object_global_pose[0], object_global_pose[1], 
                 physicsClientId=self.executingServer)
 
-    def executeTrajectory(self, traj, robot, armType):
+    def executeTrajectory(self, traj, robot, armType, isSparse=False):
         """the function to execute the trajectory with robot arm
         in the real / execution scene
         inputs
@@ -106,18 +121,47 @@ class Executor(object):
             traj (JointState[]): a list of JointState
             robot (robot_e): the robot on which the trajectory is executed
             armType (string): specified arm (e.g., "Left" or "Right_torso")
+            isSparse (bool): traj only contains the waypoints, starting with the start config
+                             (see ArmTrajectory.msg)
         outputs
         =======
             None
         """
-        for joint_state in traj:
-            if armType == "Left" or armType == "Right":
-                robot.moveSingleArm(joint_state.position, armType)
-            if armType == "Left_torso" or armType == "Right_torso":
-                robot.moveSingleArm_torso(joint_state.position[1:8], joint_state.position[0], armType)
-            ### if the object is in hand, it's a in-hand manipulation
-            ### also move the manipulated object as well
-            if (self.isObjectInLeftHand and (armType == "left" or armType == "Left_torso") or \
-                self.isObjectInRightHand and (armType == "Right" or armType == "Right_torso")):
-                self.updateRealObjectBasedonLocalPose(robot, armType)
-            time.sleep(0.01) ### you can tune the time here to make it more real-time control
\ No newline at end of file
+        if isSparse:
+            waypoints = [list(joint_state.position) for joint_state in traj]
+        else:
+            ### a dense trajectory does not include the start config (the current config)
+            waypoints = [robot.getRobotCurrSingleArmConfig(armType)] + [list(joint_state.position) for joint_state in traj]
+        if len(waypoints) < 2:
+            return
+
+        if self.isTimeParameterized:
+            times, configs = timeParameterizeWaypoints(
+                waypoints, self.max_joint_velocity, self.max_joint_acceleration, self.control_rate)
+            start_time = time.time()
+            for (config_time, config) in zip(times, configs):
+                self.moveArmToConfig(config, robot, armType)
+                ### keep up with the time of the profile
+                time.sleep(max(0.0, start_time + config_time - time.time()))
+            return
+
+        if isSparse:
+            configs = []
+            for i in range(len(waypoints)-1):
+                configs += interpolateConfigs(waypoints[i], waypoints[i+1])
+        else:
+            configs = waypoints[1:]
+        for config in configs:
+            self.moveArmToConfig(config, robot, armType)
+            time.sleep(0.01) ### you can tune the time here to make it more real-time control
+
+    def moveArmToConfig(self, config, robot, armType):
+        if armType == "Left" or armType == "Right":
+            robot.moveSingleArm(config, armType)
+        if armType == "Left_torso" or armType == "Right_torso":
+            robot.moveSingleArm_torso(config[1:8], config[0], armType)
+        ### if the object is in hand, it's a in-hand manipulation
+        ### also move the manipulated object as well
+        if (self.isObjectInLeftHand and (armType == "left" or armType == "Left_torso") or \
+            self.isObjectInRightHand and (armType == "Right" or armType == "Right_torso")):
+            self.updateRealObjectBasedonLocalPose(robot, armType)
\ No newline at end of file
@@ -7,6 +7,7 @@ import os
 import numpy as np
 
 import utils2
+from InstanceCorpus import getCorpusFile, readCorpusHeader, streamInstances
 
 import rospy
 import rospkg
@@ -22,6 +23,8 @@ from UnidirCIRSPlanner import UnidirCIRSPlanner
 ### It
 ### (1) asks the execution scene to generate an instance
 ### (2) asks the pose estimator to get the object poses
+###     (or streams the instances of the instance corpus with the "corpus" argument,
+###      see InstanceCorpus.py)
 ### (3) reproduces the instance in task planner 
 ### (4) solves it with all methods
 ### (5) collect statistics (e.g., time/actions) from each method for comparison purpose
@@ -38,6 +41,9 @@ class FinalExperimenter(object):
         self.numObjects_options = [6,7,8,9,10,11,12]
         self.numExperiments_perObject = int(args[1])
         self.maxInstancesNeed_perObject = int(args[2])
+        ### the instances are streamed from the instance corpus of each #objects (if it exists)
+        self.isCorpusUsed = (len(args) > 3) and (args[3] == "corpus")
+        self.corpusFile = ""
         self.time_allowed_monotone = 180
         self.time_allowed_nonMonotone = 360
 
@@ -218,6 +224,20 @@ class FinalExperimenter(object):
         ######################################################################################################
 
 
+    def getCorpusInstances(self, num_objects):
+        ### stream the instances of the corpus of num_objects objects
+        ### (None: the instances are generated in the execution scene)
+        self.corpusFile = ""
+        if not self.isCorpusUsed:
+            return None
+        corpusFile = getCorpusFile(self.rosPackagePath, num_objects)
+        if not os.path.exists(corpusFile):
+            print("no instance corpus of {} objects, generate the instances".format(num_objects))
+            return None
+        self.corpusFile = corpusFile
+        self.corpus_header = readCorpusHeader(self.corpusFile)
+        return streamInstances(self.corpusFile)
+
     def rosInit(self):
         ### This function specifies the role of a node instance for this class ###
         ### and initializes a ros node
@@ -236,6 +256,7 @@ def main(args):
         num_monotoneInstancesSaved = 0
         num_nonMonotoneInstancesSaved = 0
         totalNum_instancesSaved = num_monotoneInstancesSaved + num_nonMonotoneInstancesSaved
+        corpus_instances = final_experimenter.getCorpusInstances(num_objects)
 
         for experiment_id in range(1, final_experimenter.numExperiments_perObject+1):
             all_methods_time_instance = []
@@ -243,17 +264,27 @@ def main(args):
             all_methods_nActions_instance = []
             ### first see if we already have enough instances
             if (totalNum_instancesSaved >= final_experimenter.maxInstancesNeed_perObject): break
-            ### generate an instance in the execution scene
-            initialize_instance_success = utils2.serviceCall_generateInstanceCylinder(
-                                                num_objects, totalNum_instancesSaved+1, True)
-            if not initialize_instance_success: continue
-            ### object pose estimation
-            cylinder_objects = utils2.serviceCall_cylinderPositionEstimate()
+            corpus_instance = None
+            if corpus_instances == None:
+                ### generate an instance in the execution scene
+                initialize_instance_success = utils2.serviceCall_generateInstanceCylinder(
+                                                    num_objects, totalNum_instancesSaved+1, True)
+                if not initialize_instance_success: continue
+                ### object pose estimation
+                cylinder_objects = utils2.serviceCall_cylinderPositionEstimate()
+            else:
+                ### the next instance of the corpus
+                corpus_instance = next(corpus_instances, None)
+                if corpus_instance == None: break
+                cylinder_objects = corpus_instance.getCylinderObjects(
+                    final_experimenter.corpus_header["cylinder_radius"], final_experimenter.corpus_header["cylinder_height"])
             ### reproduce the estimated object poses in the planning scene
             initial_arrangement, final_arrangement, reproduce_instance_success = \
                     utils2.serviceCall_reproduceInstanceCylinder(cylinder_objects)
             ### generate IK config for start positions for all objects
-            ik_generate_success = utils2.serviceCall_generateConfigsForStartPositions("Right_torso")
+            ### (the config poses precomputed in the corpus are used if the instance is from the corpus)
+            ik_generate_success = utils2.serviceCall_generateConfigsForStartPositions("Right_torso",
+                corpus_file=final_experimenter.corpusFile, instance_id=(corpus_instance.instance_id if corpus_instance != None else 0))
 
             ########################## now using different methods to solve the instance ##########################
             ### use CIRS method first to classify
@@ -385,7 +416,7 @@ def main(args):
                 all_methods_time_instance, all_methods_success_instance, all_methods_nActions_instance, tempInstanceFolder)
             
             ### Before moving on to the next instance, clear the current instance
-            clear_instance_success = utils2.clearInstance("Right_torso")
+            clear_instance_success = utils2.clearInstance("Right_torso", corpus_instance == None)
             # input("check the instance clearance!!!")
         
         ### reach here as all experiments have been finished for the #objects specified
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import numpy as np
+import xml.etree.ElementTree as ET
+
+############################### description ###########################################
+### This module computes the forward kinematics of a kinematic chain of the URDF
+### (e.g., the torso + the right arm of the motoman up to the right end effector)
+### in numpy, for a batch of configurations at once, without the physics server.
+### The chain is read from the joints of the URDF (origin xyz/rpy, axis) from the root
+### link to the tip link, and a config is the values of the revolute joints on the chain
+### (in order, e.g., [torso, right joint 1, ..., right joint 7] for "Right_torso").
+### The pose of the root link in the world is calibrated against the physics server once
+### (see MotomanRobot.calibrateForwardKinematics), since the base of a loaded URDF may
+### be placed at its inertial frame.
+### Poses are [[x,y,z],[x,y,z,w]] as in pybullet.
+#######################################################################################
+
+
+def getRotationMatrixFromRPY(rpy):
+    ### URDF convention: R = Rz(yaw) * Ry(pitch) * Rx(roll)
+    roll, pitch, yaw = rpy
+    Rx = np.array([[1, 0, 0], [0, np.cos(roll), -np.sin(roll)], [0, np.sin(roll), np.cos(roll)]])
+    Ry = np.array([[np.cos(pitch), 0, np.sin(pitch)], [0, 1, 0], [-np.sin(pitch), 0, np.cos(pitch)]])
+    Rz = np.array([[np.cos(yaw), -np.sin(yaw), 0], [np.sin(yaw), np.cos(yaw), 0], [0, 0, 1]])
+    return np.dot(Rz, np.dot(Ry, Rx))
+
+
+def getRotationMatrixFromQuaternion(quat):
+    x, y, z, w = quat
+    return np.array([
+        [1 - 2*(y*y + z*z), 2*(x*y - z*w), 2*(x*z + y*w)],
+        [2*(x*y + z*w), 1 - 2*(x*x + z*z), 2*(y*z - x*w)],
+        [2*(x*z - y*w), 2*(y*z + x*w), 1 - 2*(x*x + y*y)]])
+
+
+def getTransformFromPose(pose):
+    transform = np.eye(4)
+    transform[:3, :3] = getRotationMatrixFromQuaternion(pose[1])
+    transform[:3, 3] = pose[0]
+    return transform
+
+
+def getQuaternionsFromRotationMatrices(R):
+    '''the quaternions (N x 4, [x,y,z,w]) of the rotation matrices (N x 3 x 3)'''
+    w = 0.5 * np.sqrt(np.maximum(0.0, 1.0 + R[:, 0, 0] + R[:, 1, 1] + R[:, 2, 2]))
+    x = 0.5 * np.sqrt(np.maximum(0.0, 1.0 + R[:, 0, 0] - R[:, 1, 1] - R[:, 2, 2]))
+    y = 0.5 * np.sqrt(np.maximum(0.0, 1.0 - R[:, 0, 0] + R[:, 1, 1] - R[:, 2, 2]))
+    z = 0.5 * np.sqrt(np.maximum(0.0, 1.0 - R[:, 0, 0] - R[:, 1, 1] + R[:, 2, 2]))
+    x = np.copysign(x, R[:, 2, 1] - R[:, 1, 2])
+    y = np.copysign(y, R[:, 0, 2] - R[:, 2, 0])
+    z = np.copysign(z, R[:, 1, 0] - R[:, 0, 1])
+    quats = np.stack([x, y, z, w], axis=1)
+    return quats / np.linalg.norm(quats, axis=1).reshape(-1, 1)
+
+
+def getRotationMatricesAboutAxis(axis, angles):
+    '''the rotation matrices (N x 3 x 3) about a unit axis by the angles (N) (Rodrigues)'''
+    K = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+    sin = np.sin(angles).reshape(-1, 1, 1)
+    cos = np.cos(angles).reshape(-1, 1, 1)
+    return np.eye(3) + sin * K + (1 - cos) * np.dot(K, K)
+
+
+class KinematicChain(object):
+    def __init__(self, urdf_filepath, tip_link):
+        ### the joints of the URDF keyed by their child links
+        joints_by_child = {}
+        for joint in ET.parse(urdf_filepath).getroot().findall("joint"):
+            origin = joint.find("origin")
+            axis = joint.find("axis")
+            joints_by_child[joint.find("child").get("link")] = {
+                "name": joint.get("name"),
+                "type": joint.get("type"),
+                "parent": joint.find("parent").get("link"),
+                "xyz": [float(e) for e in origin.get("xyz", "0 0 0").split()] if origin != None else [0.0, 0.0, 0.0],
+                "rpy": [float(e) for e in origin.get("rpy", "0 0 0").split()] if origin != None else [0.0, 0.0, 0.0],
+                "axis": [float(e) for e in axis.get("xyz").split()] if axis != None else [1.0, 0.0, 0.0]}
+        ### walk from the tip link up to the root link
+        chain = []
+        link = tip_link
+        while link in joints_by_child:
+            chain.append(joints_by_child[link])
+            link = joints_by_child[link]["parent"]
+        chain.reverse()
+        self.root_link = link
+        self.tip_link = tip_link
+        ### each joint: (the fixed transform of its origin, the unit axis or None if the joint is fixed)
+        self.joints = []
+        self.joint_names = [] ### the names of the (revolute) joints of a config
+        for joint in chain:
+            origin_transform = np.eye(4)
+            origin_transform[:3, :3] = getRotationMatrixFromRPY(joint["rpy"])
+            origin_transform[:3, 3] = joint["xyz"]
+            if joint["type"] in ("revolute", "continuous"):
+                axis = np.array(joint["axis"]) / np.linalg.norm(joint["axis"])
+                self.joint_names.append(joint["name"])
+            else:
+                axis = None
+            self.joints.append((origin_transform, axis))
+        ### the pose of the root link in the world
+        self.base_transform = np.eye(4)
+
+    def setBasePose(self, base_pose):
+        self.base_transform = getTransformFromPose(base_pose)
+
+    def calibrateBaseTransform(self, config, tip_transform):
+        '''set the pose of the root link so that the tip link is at tip_transform (4 x 4) for the config'''
+        self.base_transform = np.eye(4)
+        fk_tip_transform = self.computeTipTransforms([config])[0]
+        self.base_transform = np.dot(tip_transform, np.linalg.inv(fk_tip_transform))
+
+    def computeTipTransforms(self, configs):
+        '''the transforms (N x 4 x 4) of the tip link in the world for the configs (N x #joints)'''
+        configs = np.atleast_2d(np.array(configs, dtype=float))
+        transforms = np.tile(self.base_transform, (len(configs), 1, 1))
+        joint_idx = 0
+        for origin_transform, axis in self.joints:
+            transforms = np.matmul(transforms, origin_transform)
+            if axis is not None:
+                joint_transforms = np.tile(np.eye(4), (len(configs), 1, 1))
+                joint_transforms[:, :3, :3] = getRotationMatricesAboutAxis(axis, configs[:, joint_idx])
+                transforms = np.matmul(transforms, joint_transforms)
+                joint_idx += 1
+        return transforms
+
+    def computeTipPoses(self, configs):
+        '''the positions (N x 3) and quaternions (N x 4) of the tip link for the configs'''
+        transforms = self.computeTipTransforms(configs)
+        return transforms[:, :3, 3], getQuaternionsFromRotationMatrices(transforms[:, :3, :3])
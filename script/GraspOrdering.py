@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import os
+import time
+import fcntl
+import pickle
+
+############################### description ###########################################
+### This module orders the candidate grasps (the grasping configs of a position, one per
+### orientation, see PositionCandidateConfigs) which the plan scene tries one after another
+### to pick/place an object, by their expected cost learned from the past attempts.
+### (1) an attempt of a grasp covers the collision checks, the neighbor connections and
+###     the A* search of that grasp, and it succeeds if a path is found with that grasp
+### (2) the statistics are kept per stage ("pick"/"place") and per grasp, a grasp being
+###     identified by its grasping config (rounded). The config poses of the position
+###     candidates are loaded from the roadmap folder, so their statistics carry over the
+###     instances. The config poses of the start positions are generated for each instance,
+###     so their statistics are only kept in memory (the branches of the search) and not saved
+### (3) expected cost of a grasp = mean time of an attempt / success rate (the expected time
+###     of the attempts until a success), with a prior of one success and one failure and
+###     the mean time of all the attempts of the stage for the grasps never tried
+### (4) the statistics are persisted across runs (roadmaps/GraspOrderingStats.obj); a save
+###     merges the new attempts into the file under a file lock (<statsFile>.lock), so the
+###     plan scenes of several processes (e.g., the parallel planners) all contribute to
+###     the same statistics
+#######################################################################################
+
+
+class GraspOrderingStats(object):
+    def __init__(self, statsFile, save_interval=20, isOrderingUsed=False):
+        self.statsFile = statsFile
+        ### #attempts after which the new statistics are saved (0: only saved by save())
+        self.save_interval = save_interval
+        ### isOrderingUsed=False: the grasps are tried in the stored order (the statistics are still kept)
+        self.isOrderingUsed = isOrderingUsed
+        ### key: (stage, grasp key), value: [#attempts, #successes, total time of the attempts]
+        self.stats = self.loadStats()
+        ### the attempts which are not saved yet (same format)
+        self.new_stats = {}
+        self.num_new_attempts = 0
+        ### the attempt in progress: (stage, grasp key, start time, isSaved)
+        self.curr_attempt = None
+
+    def loadStats(self):
+        if not os.path.exists(self.statsFile):
+            return {}
+        f_stats = open(self.statsFile, 'rb')
+        stats = pickle.load(f_stats)
+        f_stats.close()
+        return stats
+
+    def getGraspKey(self, grasping_config):
+        return tuple(round(joint_value, 3) for joint_value in grasping_config)
+
+    def getOrder(self, stage, grasping_configs):
+        '''the indices of the grasping configs in the order of their expected costs
+           (the stored order among the grasps of the same cost)'''
+        if not self.isOrderingUsed:
+            return list(range(len(grasping_configs)))
+        stage_attempts = [stat for key, stat in self.stats.items() if key[0] == stage]
+        num_attempts = sum([stat[0] for stat in stage_attempts])
+        default_time = sum([stat[2] for stat in stage_attempts]) / num_attempts if num_attempts != 0 else 1.0
+        expected_costs = []
+        for grasping_config in grasping_configs:
+            num_attempts, num_successes, total_time = \
+                self.stats.get((stage, self.getGraspKey(grasping_config)), [0, 0, 0.0])
+            mean_time = (total_time + default_time) / (num_attempts + 1)
+            success_rate = (num_successes + 1) / (num_attempts + 2)
+            expected_costs.append(mean_time / success_rate)
+        return sorted(range(len(grasping_configs)), key=lambda config_id : expected_costs[config_id])
+
+    def startAttempt(self, stage, grasping_config, isSaved=True):
+        '''start an attempt of a grasp (the attempt in progress, if any, has failed)
+           isSaved=False: the attempt is not saved to the file (e.g., a grasp of a start position)'''
+        if self.curr_attempt != None:
+            self.finishAttempt(False)
+        self.curr_attempt = (stage, self.getGraspKey(grasping_config), time.time(), isSaved)
+
+    def finishAttempt(self, isSuccess):
+        '''finish the attempt in progress (if any) as a success or a failure'''
+        if self.curr_attempt == None:
+            return
+        stage, grasp_key, start_time, isSaved = self.curr_attempt
+        self.curr_attempt = None
+        for stats in [self.stats, self.new_stats] if isSaved else [self.stats]:
+            stat = stats.setdefault((stage, grasp_key), [0, 0, 0.0])
+            stat[0] += 1
+            stat[1] += int(isSuccess)
+            stat[2] += time.time() - start_time
+        if not isSaved:
+            return
+        self.num_new_attempts += 1
+        if (self.save_interval > 0) and (self.num_new_attempts >= self.save_interval):
+            self.save()
+
+    def save(self):
+        '''merge the new attempts into the statistics file'''
+        if self.num_new_attempts == 0:
+            return
+        ### the read-merge-write is not atomic, the processes saving the same file take turns
+        f_lock = open(self.statsFile + ".lock", 'w')
+        fcntl.flock(f_lock, fcntl.LOCK_EX)
+        try:
+            stats = self.loadStats()
+            for key, new_stat in self.new_stats.items():
+                stat = stats.setdefault(key, [0, 0, 0.0])
+                stat[0] += new_stat[0]
+                stat[1] += new_stat[1]
+                stat[2] += new_stat[2]
+            temp_statsFile = self.statsFile + "." + str(os.getpid())
+            f_stats = open(temp_statsFile, 'wb')
+            pickle.dump(stats, f_stats)
+            f_stats.close()
+            os.rename(temp_statsFile, self.statsFile)
+        finally:
+            fcntl.flock(f_lock, fcntl.LOCK_UN)
+            f_lock.close()
+        ### the statistics of the start positions (not saved) are kept in memory
+        for key, stat in self.stats.items():
+            if key not in stats:
+                stats[key] = stat
+        self.stats = stats
+        self.new_stats = {}
+        self.num_new_attempts = 0
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import numpy as np
+
+############################### description ###########################################
+### This module defines an IKSeedDataset class which keeps IK solutions (configs) of
+### an arm together with the poses of the end effector they reach.
+### The IK of a new pose is warm started from the stored solutions nearest to the pose
+### (see Planner.calculateSeededIK), and the dataset learns each new IK solution
+### which passes the checks, so that the IK of nearby poses succeeds at the first trial.
+### The dataset starts from the IK dataset in roadmaps (ik_dataset_<armType>.txt) whose
+### end-effector poses are computed once (batched forward kinematics, see ForwardKinematics.py)
+### before the first query.
+#######################################################################################
+
+
+class IKSeedDataset(object):
+    def __init__(self, configs, max_size=5000, orientation_weight=1.0, min_distance=0.001):
+        self.configs = [list(config) for config in configs]
+        ### the end-effector poses (#configs x 7, position + quaternion) of the configs
+        ### the poses of the loaded configs are computed later (computeEEPoses)
+        self.ee_poses = np.zeros((0, 7))
+        self.max_size = max_size
+        ### distance between poses = position distance (m) + orientation_weight * (1 - |<q1, q2>|)
+        self.orientation_weight = orientation_weight
+        ### a new solution is not learned if a stored pose is within min_distance
+        self.min_distance = min_distance
+
+    def isReady(self):
+        return len(self.ee_poses) == len(self.configs)
+
+    def computeEEPoses(self, getEEPoses):
+        '''compute the end-effector poses of the configs without one
+           getEEPoses: a function which returns the end-effector positions (#configs x 3)
+           and quaternions (#configs x 4, [x,y,z,w]) of a list of configs'''
+        new_configs = self.configs[len(self.ee_poses):]
+        if len(new_configs) == 0:
+            return
+        positions, quaternions = getEEPoses(new_configs)
+        self.ee_poses = np.vstack([self.ee_poses, np.hstack([positions, quaternions])])
+
+    def getPoseDistances(self, pose):
+        position_distances = np.linalg.norm(self.ee_poses[:, :3] - np.array(pose[0], dtype=float), axis=1)
+        quaternion_distances = 1.0 - np.abs(np.dot(self.ee_poses[:, 3:], np.array(pose[1], dtype=float)))
+        return position_distances + self.orientation_weight * quaternion_distances
+
+    def getNearestConfigs(self, pose, k=1):
+        '''the configs of the k stored solutions nearest to the pose (nearest first)'''
+        if len(self.ee_poses) == 0:
+            return []
+        nearest_indices = np.argsort(self.getPoseDistances(pose))[:k]
+        return [self.configs[i] for i in nearest_indices]
+
+    def addSolution(self, config, pose):
+        '''learn an IK solution (config) which reaches the pose'''
+        if (len(self.configs) >= self.max_size) or (not self.isReady()):
+            return False
+        if (len(self.ee_poses) != 0) and (np.min(self.getPoseDistances(pose)) < self.min_distance):
+            return False
+        self.configs.append(list(config))
+        self.ee_poses = np.vstack([self.ee_poses, np.array(list(pose[0]) + list(pose[1]), dtype=float).reshape(1, 7)])
+        return True
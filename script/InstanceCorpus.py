@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import os
+import pickle
+import numpy as np
+
+from uniform_object_rearrangement.msg import CylinderObj
+
+############################### description ###########################################
+### This module defines the instance corpus: all the benchmark instances of a number of
+### objects in a single file (corpora/<num_objects>.obj), together with what the setup of
+### an instance otherwise recomputes each time it is loaded
+### (1) the start positions of the objects, the initial/final arrangement
+### (2) the monotonicity class (True: monotone, False: non-monotone, None: not classified)
+### (3) the config poses of the start positions (Planner.getAllConfigPoses_startPositions)
+### The file is a stream of pickled records (a header, then one record per instance), so
+### the experiments read one instance at a time (streamInstances) and the plan scene reads
+### the config poses of the requested instance forward from the previous one
+### (InstanceCorpusReader). The header keeps the position candidates the corpus is built
+### for, so that a corpus which no longer matches the workspace parameters is detected.
+### A corpus is built from the instance folders with build_instance_corpus.py.
+#######################################################################################
+
+
+def getCorpusFile(rosPackagePath, num_objects):
+    return os.path.join(rosPackagePath, "corpora", str(num_objects) + ".obj")
+
+
+class CorpusInstance(object):
+    def __init__(self, instance_id, positions, initial_arrangement=None, final_arrangement=None,
+                 isMonotone=None, config_poses=None, source=""):
+        self.instance_id = instance_id
+        self.positions = positions ### the start position [x,y,z] of each object (obj_idx)
+        self.initial_arrangement = initial_arrangement
+        self.final_arrangement = final_arrangement
+        self.isMonotone = isMonotone
+        ### obj_idx (key): (approaching_configs, grasping_configs,
+        ###                 approaching_labels, grasping_labels, total_labels) (value)
+        self.config_poses = config_poses
+        self.source = source ### the instance folder the instance comes from
+
+    def getCylinderObjects(self, cylinder_radius, cylinder_height):
+        '''the objects of the instance as the pose estimator outputs them (CylinderObj[])'''
+        cylinder_objects = []
+        for obj_idx, position in enumerate(self.positions):
+            cylinder_object = CylinderObj()
+            cylinder_object.obj_idx = obj_idx
+            cylinder_object.curr_position.x = position[0]
+            cylinder_object.curr_position.y = position[1]
+            cylinder_object.curr_position.z = position[2]
+            cylinder_object.radius = cylinder_radius
+            cylinder_object.height = cylinder_height
+            cylinder_objects.append(cylinder_object)
+        return cylinder_objects
+
+
+class InstanceCorpusWriter(object):
+    def __init__(self, corpusFile, num_objects, candidate_positions, cylinder_radius, cylinder_height):
+        if not os.path.exists(os.path.dirname(corpusFile)):
+            os.makedirs(os.path.dirname(corpusFile))
+        ### the corpus is written to a temporary file first so that a corpus being (re)built
+        ### is never read by the experiments
+        self.corpusFile = corpusFile
+        self.temp_corpusFile = corpusFile + "." + str(os.getpid())
+        self.f_corpus = open(self.temp_corpusFile, 'wb')
+        pickle.dump({"num_objects": num_objects,
+                     "candidate_positions": np.array(candidate_positions, dtype=float).reshape(-1, 3),
+                     "cylinder_radius": cylinder_radius, "cylinder_height": cylinder_height}, self.f_corpus)
+        self.num_instances = 0
+
+    def addInstance(self, corpus_instance):
+        pickle.dump(corpus_instance.__dict__, self.f_corpus)
+        self.num_instances += 1
+
+    def close(self):
+        self.f_corpus.close()
+        os.rename(self.temp_corpusFile, self.corpusFile)
+
+
+def readCorpusHeader(corpusFile):
+    f_corpus = open(corpusFile, 'rb')
+    header = pickle.load(f_corpus)
+    f_corpus.close()
+    return header
+
+
+def isCorpusConsistent(header, candidate_positions, tolerance=1e-6):
+    '''whether the corpus is built for these position candidates'''
+    candidate_positions = np.array(candidate_positions, dtype=float).reshape(-1, 3)
+    if candidate_positions.shape != header["candidate_positions"].shape:
+        return False
+    return bool(np.all(np.abs(candidate_positions - header["candidate_positions"]) <= tolerance))
+
+
+def streamInstances(corpusFile):
+    '''yield the instances (CorpusInstance) of the corpus one by one'''
+    f_corpus = open(corpusFile, 'rb')
+    pickle.load(f_corpus) ### skip the header
+    try:
+        while True:
+            try:
+                record = pickle.load(f_corpus)
+            except EOFError:
+                break
+            yield CorpusInstance(**record)
+    finally:
+        f_corpus.close()
+
+
+class InstanceCorpusReader(object):
+    def __init__(self, corpusFile):
+        self.corpusFile = corpusFile
+        ### the version of the file which is read (a rebuilt corpus replaces the file)
+        self.mtime = os.path.getmtime(self.corpusFile)
+        self.f_corpus = open(self.corpusFile, 'rb')
+        self.header = pickle.load(self.f_corpus)
+
+    def isOutdated(self):
+        return (not os.path.exists(self.corpusFile)) or (os.path.getmtime(self.corpusFile) != self.mtime)
+
+    def rewind(self):
+        self.f_corpus.seek(0)
+        self.header = pickle.load(self.f_corpus)
+
+    def getInstance(self, instance_id):
+        '''the instance (CorpusInstance) of the instance id or None if the corpus does not have it
+           (read forward from the last instance read, so a sweep in order reads the file once)'''
+        for pass_i in range(2):
+            while True:
+                try:
+                    record = pickle.load(self.f_corpus)
+                except EOFError:
+                    break
+                if record["instance_id"] == instance_id:
+                    return CorpusInstance(**record)
+            self.rewind()
+        return None
+
+    def close(self):
+        self.f_corpus.close()
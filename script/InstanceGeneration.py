@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import os
+import numpy as np
+
+############################### description ###########################################
+### This module samples the start positions of the cylinder objects of a random instance
+### analytically (no physics server): the objects are disks of the same radius in a
+### rectangular area of the table, and two objects are valid if their centers are more
+### than min_distance apart (WorkspaceTable.getInstanceSamplingArea).
+### (1) random sequential placement, which gives the same distribution as placing the
+###     objects one by one uniformly at random with rejection (the original generator),
+###     but checks a whole batch of random positions against the placed objects at once
+###     and restarts from scratch if an object cannot be placed
+### (2) if that fails (a dense instance), a random subset of a Poisson-disk sampling of
+###     the area (Bridson) and at last of a jittered hexagonal packing, so the instance is
+###     only reported infeasible if the objects do not even fit in the densest packing
+### It also writes sets of instances in the examples/ layout
+### (examples/<#objects>/<instance_id>/instance_info.txt).
+#######################################################################################
+
+
+def placeSequentially(num_objects, x_limit, y_limit, min_distance, rng, batch_size=256, max_batches=8):
+    '''place the disks one by one uniformly at random with rejection
+       return the positions (num_objects x 2) or None if a disk cannot be placed'''
+    positions = np.zeros((0, 2))
+    low = np.array([x_limit[0], y_limit[0]])
+    high = np.array([x_limit[1], y_limit[1]])
+    for obj_i in range(num_objects):
+        isPlaced = False
+        for batch_i in range(max_batches):
+            trials = rng.uniform(low, high, size=(batch_size, 2))
+            if len(positions) != 0:
+                distances = np.linalg.norm(trials[:, np.newaxis, :] - positions[np.newaxis, :, :], axis=2)
+                valid_trials = np.nonzero(np.min(distances, axis=1) > min_distance)[0]
+            else:
+                valid_trials = np.arange(batch_size)
+            if len(valid_trials) != 0:
+                ### the first valid trial, as if the trials were made one by one
+                positions = np.vstack([positions, trials[valid_trials[0]]])
+                isPlaced = True
+                break
+        if not isPlaced:
+            return None
+    return positions
+
+
+def samplePoissonDisk(x_limit, y_limit, min_distance, rng, k=30):
+    '''a Poisson-disk sampling of the area (Bridson's algorithm): no two samples are
+       within min_distance and no more sample fits (up to k trials around each sample)
+       return the samples (#samples x 2)'''
+    cell_size = min_distance / np.sqrt(2)
+    n_cells_x = int(np.ceil((x_limit[1] - x_limit[0]) / cell_size)) + 1
+    n_cells_y = int(np.ceil((y_limit[1] - y_limit[0]) / cell_size)) + 1
+    ### the sample in each cell of the grid (-1: empty)
+    grid = np.full((n_cells_x, n_cells_y), -1, dtype=int)
+    origin = np.array([x_limit[0], y_limit[0]])
+
+    def getCell(point):
+        return tuple(((point - origin) / cell_size).astype(int))
+
+    samples = [rng.uniform([x_limit[0], y_limit[0]], [x_limit[1], y_limit[1]])]
+    grid[getCell(samples[0])] = 0
+    active = [0]
+    while len(active) != 0:
+        active_i = rng.integers(len(active)) if hasattr(rng, "integers") else rng.randint(len(active))
+        center = samples[active[active_i]]
+        ### k random points in the annulus [min_distance, 2*min_distance] around the sample
+        radii = min_distance * (1 + rng.uniform(0, 1, size=k))
+        angles = rng.uniform(0, 2*np.pi, size=k)
+        trials = center + np.stack([radii * np.cos(angles), radii * np.sin(angles)], axis=1)
+        isNewSample = False
+        for trial in trials:
+            if (trial[0] < x_limit[0]) or (trial[0] > x_limit[1]) or (trial[1] < y_limit[0]) or (trial[1] > y_limit[1]):
+                continue
+            cell = getCell(trial)
+            neighbors = grid[max(cell[0]-2, 0):cell[0]+3, max(cell[1]-2, 0):cell[1]+3]
+            neighbors = neighbors[neighbors != -1]
+            if (len(neighbors) != 0) and (np.min(np.linalg.norm(
+                    np.array([samples[i] for i in neighbors]) - trial, axis=1)) <= min_distance):
+                continue
+            samples.append(trial)
+            grid[cell] = len(samples) - 1
+            active.append(len(samples) - 1)
+            isNewSample = True
+            break
+        if not isNewSample:
+            active.pop(active_i)
+    return np.array(samples)
+
+
+def sampleHexagonalPacking(x_limit, y_limit, min_distance, rng):
+    '''the centers of a hexagonal packing of the area with a random offset and a small jitter
+       (the densest packing of disks)'''
+    spacing = min_distance * 1.001
+    row_height = spacing * np.sqrt(3) / 2
+    offset = rng.uniform(0, 1, size=2) * np.array([spacing, row_height])
+    samples = []
+    row_i = 0
+    y = y_limit[0] + offset[1] % row_height
+    while y <= y_limit[1]:
+        x = x_limit[0] + (offset[0] + (row_i % 2) * spacing / 2) % spacing
+        while x <= x_limit[1]:
+            samples.append([x, y])
+            x += spacing
+        y += row_height
+        row_i += 1
+    samples = np.array(samples).reshape(-1, 2)
+    if len(samples) == 0:
+        ### the area is smaller than a cell of the packing
+        return np.array([[(x_limit[0]+x_limit[1]) / 2, (y_limit[0]+y_limit[1]) / 2]])
+    jitter = (spacing - min_distance) / 4
+    samples += rng.uniform(-jitter, jitter, size=samples.shape)
+    samples[:, 0] = np.clip(samples[:, 0], x_limit[0], x_limit[1])
+    samples[:, 1] = np.clip(samples[:, 1], y_limit[0], y_limit[1])
+    return samples
+
+
+def sampleInstancePositions(num_objects, x_limit, y_limit, min_distance, rng=None, max_restarts=5):
+    '''the (x,y) start positions (num_objects x 2) of the objects of a random instance
+       or None if num_objects disks do not fit in the area'''
+    if rng == None:
+        rng = np.random.RandomState()
+    if num_objects == 0:
+        return np.zeros((0, 2))
+    for restart_i in range(max_restarts):
+        positions = placeSequentially(num_objects, x_limit, y_limit, min_distance, rng)
+        if positions is not None:
+            return positions
+    ### dense instance: a random subset of a (maximal) Poisson-disk sampling or of the densest packing
+    for samples in [samplePoissonDisk(x_limit, y_limit, min_distance, rng), \
+                    sampleHexagonalPacking(x_limit, y_limit, min_distance, rng)]:
+        if len(samples) >= num_objects:
+            return samples[rng.permutation(len(samples))[:num_objects]]
+    return None
+
+
+def saveInstancePositions(positions, instanceFolder):
+    '''save the start positions (#objects x 3) of an instance
+       (same format as utils2.saveInstance: object index, then the position, line by line)'''
+    if not os.path.exists(instanceFolder):
+        os.makedirs(instanceFolder)
+    f_instance = open(os.path.join(instanceFolder, "instance_info.txt"), "w")
+    for obj_idx, position in enumerate(positions):
+        f_instance.write(str(obj_idx) + "\n")
+        f_instance.write(" ".join([str(coord) for coord in position]) + "\n")
+    f_instance.close()
+
+
+def loadInstancePositions(instanceFolder):
+    '''the start positions (#objects x 3) of an instance saved in instanceFolder, ordered by object index'''
+    positions = {}
+    f_instance = open(os.path.join(instanceFolder, "instance_info.txt"), "r")
+    lines = [line.split() for line in f_instance if line.strip() != ""]
+    f_instance.close()
+    for line_i in range(0, len(lines) - 1, 2):
+        positions[int(lines[line_i][0])] = [float(coord) for coord in lines[line_i + 1]]
+    return [positions[obj_idx] for obj_idx in sorted(positions.keys())]
+
+
+def getNextInstanceId(examplesFolder, num_objects):
+    '''the instance id following the existing instances of num_objects objects (starting from 1)'''
+    numObjectsFolder = os.path.join(examplesFolder, str(num_objects))
+    if not os.path.exists(numObjectsFolder):
+        return 1
+    instance_ids = [int(name) for name in os.listdir(numObjectsFolder) if name.isdigit()]
+    return max(instance_ids + [0]) + 1
+
+
+def generateInstanceSet(examplesFolder, num_objects, num_instances, sampling_area, seed=None, start_id=None):
+    '''generate num_instances random instances of num_objects objects and write them
+       to examplesFolder/<num_objects>/<instance_id>/instance_info.txt
+       sampling_area: (x_limit, y_limit, z, min_distance), see WorkspaceTable.getInstanceSamplingArea
+       return the ids of the instances written'''
+    x_limit, y_limit, z, min_distance = sampling_area
+    rng = np.random.RandomState(seed)
+    if start_id == None:
+        start_id = getNextInstanceId(examplesFolder, num_objects)
+    instance_ids = []
+    for instance_id in range(start_id, start_id + num_instances):
+        positions_xy = sampleInstancePositions(num_objects, x_limit, y_limit, min_distance, rng)
+        if positions_xy is None:
+            raise ValueError("{} objects do not fit in the workspace".format(num_objects))
+        positions = [[round(x, 3), round(y, 3), z] for x, y in positions_xy.tolist()]
+        saveInstancePositions(positions, os.path.join(examplesFolder, str(num_objects), str(instance_id)))
+        instance_ids.append(instance_id)
+    return instance_ids
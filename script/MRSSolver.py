@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 from __future__ import division
 
-import time
 import sys
 import os
 import copy
@@ -25,13 +24,17 @@ def enablePrint():
 
 
 class MRSSolver(MonotoneLocalSolver):
-    def __init__(self, startArrNode, target_arrangement, time_allowed, isLabeledRoadmapUsed=True):
+    def __init__(self, startArrNode, target_arrangement, time_allowed, isLabeledRoadmapUsed=True,
+                    plan_scene_ns="", stop_event=None):
         MonotoneLocalSolver.__init__(
-            self, startArrNode, target_arrangement, time_allowed, isLabeledRoadmapUsed)
+            self, startArrNode, target_arrangement, time_allowed, isLabeledRoadmapUsed,
+            plan_scene_ns, stop_event)
         rospy.logwarn("a MRSSolver start to work")
         
     def mrs_solve(self):
         LOCAL_TASK_SUCCESS = self.DFS()
+        self.releaseSceneSnapshots()
+        self.reportPlansAvoided()
         return LOCAL_TASK_SUCCESS, self.tree
 
     def DFS(self):
@@ -46,35 +49,34 @@ class MRSSolver(MonotoneLocalSolver):
             ### the problem is solved
             return True
         ### otherwise it's not solved yet. Check if time exceeds
-        if time.time() - self.local_planning_startTime >= self.time_threshold:
+        if self.isTerminated():
             return False
 
         FLAG = False
         remaining_objects = [i for i in range(len(current_arrangement)) \
                             if current_arrangement[i] != self.target_arrangement[i]] 
-        for obj_idx in remaining_objects:
-            ### let's check this object by rearranging it
+        objects_to_try = self.getObjectsToTry(current_arrangement, remaining_objects)
+        while len(objects_to_try) != 0:
+            ### try to rearrange the objects (in order) until one of them succeeds
+            ### (the scene is restored by the plan scene after each failed attempt)
+            obj_position, transition_path, snapshot_id = self.rearrangeFirstFeasibleObject(objects_to_try)
+            if obj_position == None:
+                ### none of the objects can be rearranged, the scene stays at the current arrangement
+                break
+            obj_idx = objects_to_try[obj_position]
             obj_curr_position_idx = current_arrangement[obj_idx]
-            obj_target_position_idx = self.target_arrangement[obj_idx]
-            rearrange_success, transition_path = self.serviceCall_rearrangeCylinderObject(
-                obj_idx, obj_target_position_idx, "Right_torso", isLabeledRoadmapUsed=self.isLabeledRoadmapUsed)
-            if rearrange_success:
-                self.generateLocalNode(current_node_id, obj_idx, transition_path)
-                ### recursive call
-                FLAG = self.DFS()
-                if FLAG: 
-                    return FLAG
-                else:
-                    ### first check if FLAG == False is due to timeout, if it is, just return
-                    if time.time() - self.local_planning_startTime >= self.time_threshold:
-                        return FLAG
-                    ### put the object and robot back to the configuration they belong to
-                    ### at the beginning of the function call
-                    self.revertBackToParentNode(current_node_id, obj_idx, obj_curr_position_idx, "Right_torso")
-            else:
-                ### put the object and robot back to the configuration they belong to
-                ### at the beginning of the function call
-                self.revertBackToParentNode(current_node_id, obj_idx, obj_curr_position_idx, "Right_torso")
+            self.generateLocalNode(current_node_id, obj_idx, transition_path)
+            ### recursive call
+            FLAG = self.DFS()
+            if FLAG:
+                return FLAG
+            ### first check if FLAG == False is due to timeout, if it is, just return
+            if self.isTerminated():
+                return FLAG
+            ### put the scene back to the snapshot taken at the beginning of the function call
+            self.revertBackToSnapshot(snapshot_id, current_node_id, obj_idx, obj_curr_position_idx, "Right_torso")
+            ### move on to the objects after obj_idx
+            objects_to_try = self.getObjectsToTry(current_arrangement, objects_to_try[obj_position+1:])
 
         ### the problem is not solved but there is no option
         return FLAG
\ No newline at end of file
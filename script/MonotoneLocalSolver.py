@@ -13,7 +13,13 @@ import rospkg
 
 from sensor_msgs.msg import JointState
 
+from ServiceProxyRegistry import service_proxy_registry
+
 from uniform_object_rearrangement.srv import RearrangeCylinderObject, RearrangeCylinderObjectRequest
+from uniform_object_rearrangement.srv import CheckRearrangementFeasibility, CheckRearrangementFeasibilityRequest
+from uniform_object_rearrangement.srv import BatchRearrangeCylinderObjects, BatchRearrangeCylinderObjectsRequest
+from uniform_object_rearrangement.srv import RestoreSceneSnapshot, RestoreSceneSnapshotRequest
+from uniform_object_rearrangement.srv import ReleaseSceneSnapshots, ReleaseSceneSnapshotsRequest
 from uniform_object_rearrangement.srv import GetCurrRobotConfig, GetCurrRobotConfigRequest
 from uniform_object_rearrangement.srv import UpdateCertainObjectPose, UpdateCertainObjectPoseRequest
 from uniform_object_rearrangement.srv import ResetRobotCurrConfig, ResetRobotCurrConfigRequest
@@ -30,7 +36,8 @@ def enablePrint():
 
 
 class MonotoneLocalSolver(object):
-    def __init__(self, startArrNode, target_arrangement, time_allowed, isLabeledRoadmapUsed=True):
+    def __init__(self, startArrNode, target_arrangement, time_allowed, isLabeledRoadmapUsed=True,
+                    plan_scene_ns="", stop_event=None):
 
         ### understand the local arrangement task
         self.start_arrangement = startArrNode.arrangement
@@ -50,6 +57,76 @@ class MonotoneLocalSolver(object):
         self.time_threshold = time_allowed
         self.local_planning_startTime = time.time()
 
+        ### the plan scene the solver talks to (e.g., "plan_worker_1/" for a worker plan scene)
+        ### "" refers to the default plan scene
+        self.plan_scene_ns = plan_scene_ns
+        ### an optional threading.Event which terminates the search early once set
+        ### (e.g., another worker has already found a solution)
+        self.stop_event = stop_event
+
+        ### cache of the label-only feasibility precheck before rearranging an object
+        ### key: (obj_idx, target_position_idx, arrangement), value: feasible or not
+        self.label_feasibility_cache = {}
+        self.num_plans_avoided = 0 ### number of distinct (object, arrangement) found infeasible by the precheck
+        ### the snapshots (ids) kept in the plan scene for backtracking
+        self.scene_snapshot_ids = []
+
+    def isTerminated(self):
+        '''check if the local search should stop (time exceeds or stop requested)'''
+        if time.time() - self.local_planning_startTime >= self.time_threshold:
+            return True
+        if (self.stop_event != None) and self.stop_event.is_set():
+            return True
+        return False
+
+
+    def isRearrangementLabelFeasible(self, current_arrangement, obj_idx):
+        '''check (only with labels) if the object can be rearranged to its target position
+           before running the full motion planning (rearrange_cylinder_object)'''
+        key = (obj_idx, self.target_arrangement[obj_idx], tuple(current_arrangement))
+        if key not in self.label_feasibility_cache:
+            self.label_feasibility_cache[key] = self.serviceCall_checkRearrangementFeasibility(
+                                                    obj_idx, self.target_arrangement[obj_idx])
+            ### counted once per (object, arrangement): a cache hit re-queried after a backtrack
+            ### does not avoid another plan
+            if not self.label_feasibility_cache[key]:
+                self.num_plans_avoided += 1
+        return self.label_feasibility_cache[key]
+
+    def getObjectsToTry(self, current_arrangement, objects):
+        '''get the objects (in order) worth rearranging at the current arrangement
+           (those passing the label-only feasibility precheck)'''
+        return [obj_idx for obj_idx in objects if self.isRearrangementLabelFeasible(current_arrangement, obj_idx)]
+
+    def rearrangeFirstFeasibleObject(self, objects_to_try):
+        '''try to rearrange the objects (in order) until one of them succeeds in a single service call.
+           The plan scene restores the scene after each failed attempt and stays at the state
+           after the successful rearrangement.
+           return the position of the successful object in objects_to_try (None if all fail), its path
+           and the id of the scene snapshot before the rearrangement (-1 if not available)'''
+        success_list, paths, snapshot_id = self.serviceCall_batchRearrangeCylinderObjects(objects_to_try, "Right_torso")
+        if (len(success_list) != 0) and success_list[-1]:
+            if snapshot_id != -1:
+                self.scene_snapshot_ids.append(snapshot_id)
+            return len(success_list) - 1, paths[-1], snapshot_id
+        return None, None, -1
+
+    def revertBackToSnapshot(self, snapshot_id, parent_node_id, obj_idx, obj_parent_position_idx, armType):
+        '''revert back to the parent node (pop out operation in DFS) by
+        restoring the scene snapshot taken before the rearrangement of obj_idx'''
+        if (snapshot_id == -1) or (not self.serviceCall_restoreSceneSnapshot(snapshot_id, release=True)):
+            self.revertBackToParentNode(parent_node_id, obj_idx, obj_parent_position_idx, armType)
+        if snapshot_id in self.scene_snapshot_ids:
+            self.scene_snapshot_ids.remove(snapshot_id)
+
+    def releaseSceneSnapshots(self):
+        '''release the snapshots which are not restored (e.g., on the branch of the solution)'''
+        if len(self.scene_snapshot_ids) != 0:
+            self.serviceCall_releaseSceneSnapshots(self.scene_snapshot_ids)
+            self.scene_snapshot_ids = []
+
+    def reportPlansAvoided(self):
+        rospy.logwarn("the label feasibility precheck avoided %s full motion plans" % str(self.num_plans_avoided))
 
     def generateLocalNode(self, current_node_id, obj_idx, transition_path):
         '''generate a local node which has parent node id == current_node_id,
@@ -89,28 +166,79 @@ class MonotoneLocalSolver(object):
 
 
     def serviceCall_rearrangeCylinderObject(self, obj_idx, target_position_idx, armType, isLabeledRoadmapUsed=True):
-        rospy.wait_for_service("rearrange_cylinder_object")
         request = RearrangeCylinderObjectRequest()
         request.object_idx = obj_idx
         request.target_position_idx = target_position_idx
         request.armType = armType
         request.isLabeledRoadmapUsed = isLabeledRoadmapUsed
         try:
-            rearrangeCylinderObject_proxy = rospy.ServiceProxy(
-                "rearrange_cylinder_object", RearrangeCylinderObject)
-            rearrange_cylinder_object_response = rearrangeCylinderObject_proxy(request)
+            rearrange_cylinder_object_response = service_proxy_registry.call(
+                self.plan_scene_ns + "rearrange_cylinder_object", RearrangeCylinderObject, request)
             return rearrange_cylinder_object_response.success, rearrange_cylinder_object_response.path
         except rospy.ServiceException as e:
             print("rearrange_cylinder_object service call failed: %s" % e)
 
+    def serviceCall_batchRearrangeCylinderObjects(self, objects_to_try, armType, stopAtFirstSuccess=True):
+        request = BatchRearrangeCylinderObjectsRequest()
+        request.object_indices = objects_to_try
+        request.target_position_indices = [self.target_arrangement[obj_idx] for obj_idx in objects_to_try]
+        request.armType = armType
+        request.isLabeledRoadmapUsed = self.isLabeledRoadmapUsed
+        request.stopAtFirstSuccess = stopAtFirstSuccess
+        request.returnPaths = True
+        request.time_allowed = self.time_threshold - (time.time() - self.local_planning_startTime)
+        request.keepSnapshot = True
+        try:
+            batch_rearrange_cylinder_objects_response = service_proxy_registry.call(
+                self.plan_scene_ns + "batch_rearrange_cylinder_objects", BatchRearrangeCylinderObjects, request)
+            return list(batch_rearrange_cylinder_objects_response.success), \
+                list(batch_rearrange_cylinder_objects_response.paths), batch_rearrange_cylinder_objects_response.snapshot_id
+        except rospy.ServiceException as e:
+            print("batch_rearrange_cylinder_objects service call failed: %s" % e)
+            return [], [], -1
+
+    def serviceCall_restoreSceneSnapshot(self, snapshot_id, release):
+        request = RestoreSceneSnapshotRequest()
+        request.snapshot_id = snapshot_id
+        request.release = release
+        try:
+            restore_scene_snapshot_response = service_proxy_registry.call(
+                self.plan_scene_ns + "restore_scene_snapshot", RestoreSceneSnapshot, request)
+            return restore_scene_snapshot_response.success
+        except rospy.ServiceException as e:
+            print("restore_scene_snapshot service call failed: %s" % e)
+            return False
+
+    def serviceCall_releaseSceneSnapshots(self, snapshot_ids):
+        request = ReleaseSceneSnapshotsRequest()
+        request.snapshot_ids = snapshot_ids
+        try:
+            release_scene_snapshots_response = service_proxy_registry.call(
+                self.plan_scene_ns + "release_scene_snapshots", ReleaseSceneSnapshots, request)
+            return release_scene_snapshots_response.success
+        except rospy.ServiceException as e:
+            print("release_scene_snapshots service call failed: %s" % e)
+
+    def serviceCall_checkRearrangementFeasibility(self, obj_idx, target_position_idx):
+        request = CheckRearrangementFeasibilityRequest()
+        request.object_idx = obj_idx
+        request.target_position_idx = target_position_idx
+        try:
+            check_rearrangement_feasibility_response = service_proxy_registry.call(
+                self.plan_scene_ns + "check_rearrangement_feasibility", CheckRearrangementFeasibility, request)
+            return check_rearrangement_feasibility_response.feasible
+        except rospy.ServiceException as e:
+            ### fall back to the full motion planning (a broken precheck must be visible, as it prunes nothing)
+            rospy.logwarn("check_rearrangement_feasibility service call failed, the label precheck is skipped: %s" % e)
+            return True
+
     def serviceCall_getCurrRobotConfig(self):
         '''call the GetCurrRobotConfig service to get the robot current config from planning
            expect output: configuration of all controllable joints (1 + 7 + 7 + 6) '''
-        rospy.wait_for_service("get_curr_robot_config")
         request = GetCurrRobotConfigRequest()
         try:
-            getCurrRobotConfig_proxy = rospy.ServiceProxy("get_curr_robot_config", GetCurrRobotConfig)
-            getCurrRobotConfig_response = getCurrRobotConfig_proxy(request)
+            getCurrRobotConfig_response = service_proxy_registry.call(
+                self.plan_scene_ns + "get_curr_robot_config", GetCurrRobotConfig, request)
             return getCurrRobotConfig_response.robot_config.position
         except rospy.ServiceException as e:
             print("get_curr_robot_config service call failed: %s" % e)
@@ -118,15 +246,12 @@ class MonotoneLocalSolver(object):
     def serviceCall_updateCertainObjectPose(self, obj_idx, target_position_idx):
         '''call the UpdateCertainObjectPose service to update the object
            to the specified target_position_idx'''
-        rospy.wait_for_service("update_certain_object_pose")
         request = UpdateCertainObjectPoseRequest()
         request.object_idx = obj_idx
         request.object_position_idx = target_position_idx
         try:
-            updateCertainObjectPose_proxy = rospy.ServiceProxy(
-                    "update_certain_object_pose", UpdateCertainObjectPose)
-            updateCertainObjectPose_response = updateCertainObjectPose_proxy(
-                                request.object_idx, request.object_position_idx)
+            updateCertainObjectPose_response = service_proxy_registry.call(
+                self.plan_scene_ns + "update_certain_object_pose", UpdateCertainObjectPose, request)
             return updateCertainObjectPose_response.success
         except rospy.ServiceException as e:
             print("update_certain_object_pose service call failed: %s" % e)
@@ -134,13 +259,12 @@ class MonotoneLocalSolver(object):
     def serviceCall_resetRobotCurrConfig(self, robot_curr_config):
         '''call the ResetRobotCurrConfig service to reset the robot
            to the specified configuration'''
-        rospy.wait_for_service("reset_robot_curr_config")
         request = ResetRobotCurrConfigRequest()
         request.robot_config = JointState()
         request.robot_config.position = robot_curr_config
         try:
-            resetRobotCurrConfig_proxy = rospy.ServiceProxy("reset_robot_curr_config", ResetRobotCurrConfig)
-            resetRobotCurrConfig_response = resetRobotCurrConfig_proxy(request.robot_config)
+            resetRobotCurrConfig_response = service_proxy_registry.call(
+                self.plan_scene_ns + "reset_robot_curr_config", ResetRobotCurrConfig, request)
             return resetRobotCurrConfig_response.success
         except rospy.ServiceException as e:
             print("reset_robot_curr_config service call failed: %s" % e)
@@ -148,12 +272,11 @@ class MonotoneLocalSolver(object):
     def serviceCall_updateManipulationStatus(self, armType):
         '''call the UpdateManipulationStatus service to disable
            any relationship between the robot and the object'''
-        rospy.wait_for_service("update_manipulation_status")
         request = UpdateManipulationStatusRequest()
         request.armType = armType
         try:
-            updateManipulationStatus_proxy = rospy.ServiceProxy("update_manipulation_status", UpdateManipulationStatus)
-            updateManipulationStatus_response = updateManipulationStatus_proxy(request.armType)
+            updateManipulationStatus_response = service_proxy_registry.call(
+                self.plan_scene_ns + "update_manipulation_status", UpdateManipulationStatus, request)
             return updateManipulationStatus_response.success
         except rospy.ServiceException as e:
             print("update_manipulation_status service call failed: %s" % e)
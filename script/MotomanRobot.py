@@ -8,8 +8,11 @@ import time
 import copy
 import math
 from collections import OrderedDict
+import numpy as np
 import IPython
 
+from ForwardKinematics import KinematicChain, getTransformFromPose
+
 ### This file defines the motoman robot of type sda10f ###
 
 class MotomanRobot(object):
@@ -85,6 +88,42 @@ class MotomanRobot(object):
         self.updateRightHandConfig(self.rightHandHomeConfiguration)
         self.resetArmConfig(self.leftArmCurrConfiguration + self.rightArmCurrConfiguration)
 
+        ### the forward kinematics (numpy, batched) of the torso + the right arm
+        ### up to the right end effector (a config is [torso] + right arm config)
+        self.right_torso_fk = KinematicChain(self.urdf_filepath, "motoman_right_ee")
+        self.calibrateForwardKinematics()
+
+    def calibrateForwardKinematics(self):
+        '''set the pose of the root link of the forward kinematics so that the end effector pose
+           matches the physics server at the current config (the base of the loaded urdf is placed
+           at its inertial frame and the basePosition/baseOrientation may be anything)'''
+        self.right_torso_fk.calibrateBaseTransform(
+            [self.torsoCurrConfiguration] + self.rightArmCurrConfiguration, getTransformFromPose(self.right_ee_pose))
+
+    def getEEPoses_batch(self, configs, armType):
+        '''the end effector poses of a batch of configs without moving the robot
+           (a config is [torso] + the arm config for "Left_torso"/"Right_torso", otherwise the arm config)
+           return the positions (#configs x 3) and quaternions (#configs x 4)'''
+        configs = np.atleast_2d(np.array(configs, dtype=float))
+        if armType == "Right":
+            configs = np.hstack([np.full((len(configs), 1), self.torsoCurrConfiguration), configs])
+        if armType in ["Right", "Right_torso"]:
+            return self.right_torso_fk.computeTipPoses(configs)
+        ### no forward kinematics for the left arm, use the physics server
+        torso_config = self.torsoCurrConfiguration
+        left_arm_config = copy.deepcopy(self.leftArmCurrConfiguration)
+        positions = []
+        quaternions = []
+        for config in configs.tolist():
+            if armType == "Left":
+                self.setSingleArmToConfig(config, "Left")
+            else:
+                self.setSingleArmToConfig_torso(config[1:8], config[0], "Left_torso")
+            positions.append(self.left_ee_pose[0])
+            quaternions.append(self.left_ee_pose[1])
+        self.setSingleArmToConfig_torso(left_arm_config, torso_config, "Left_torso")
+        return np.array(positions), np.array(quaternions)
+
     def setRestPoses(self, torsoConfiguration, leftArmConfiguration, rightArmConfiguration, rightHandConfiguration):
         self.rp = [torsoConfiguration] + list(leftArmConfiguration) + list(rightArmConfiguration) + list(rightHandConfiguration)
 
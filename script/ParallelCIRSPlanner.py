@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import time
+import sys
+import os
+import copy
+import threading
+
+import rospy
+
+from RearrangementTaskPlanner import RearrangementTaskPlanner
+from RearrangementTaskPlanner import ArrNode
+from UnidirCIRSPlanner import UnidirCIRSPlanner
+from CIRSSolver import CIRSSolver
+
+############################### description ###########################################
+### This class defines a ParallelCIRSPlanner class which
+### runs the same search as UnidirCIRSPlanner, but after the first subTree is grown
+### from the root, K workers perturb and grow subTrees concurrently.
+### Each worker owns a worker plan scene (a PybulletPlanScene launched in DIRECT mode
+### under its own namespace, e.g., "plan_worker_1/", with its own main_planner_node)
+### and expands a node which is not being expanded by other workers.
+### The subTrees are engrafted to the shared left tree (treeL) one at a time.
+### The search stops at the first solution or when the time budget runs out.
+### A worker backs off after a failed perturbation and stops if its plan scene cannot be set.
+#######################################################################################
+
+
+# Disable
+def blockPrint():
+    sys.stdout = open(os.devnull, 'w')
+
+# Restore
+def enablePrint():
+    sys.stdout = sys.__stdout__
+
+
+class ParallelCIRSPlanner(UnidirCIRSPlanner):
+    def __init__(
+        self, initial_arrangement, final_arrangement, time_allowed, isLabeledRoadmapUsed=True,
+        plan_scene_namespaces=None, heuristic_level=0):
+        ### UnidirCIRSPlanner.__init__ runs the serial search, so only the base is initialized here
+        ### and the only field UnidirCIRSPlanner adds (heuristic_level) is set below
+        RearrangementTaskPlanner.__init__(
+            self, initial_arrangement, final_arrangement, time_allowed, isLabeledRoadmapUsed)
+        ### read-only once the workers start (as final_arrangement, isLabeledRoadmapUsed and time_threshold)
+        self.heuristic_level = heuristic_level
+        if plan_scene_namespaces == None:
+            plan_scene_namespaces = ["plan_worker_1/", "plan_worker_2/"]
+        self.plan_scene_namespaces = plan_scene_namespaces
+        rospy.logwarn("initialize a parallel CIRS planner with %s workers" % str(len(self.plan_scene_namespaces)))
+        ### the lock guards all the fields the workers write: the left tree (treeL, left_idx),
+        ### its registries, isSolved, nodesInPerturbation and perturbation_failures
+        ### (pickNodeToPerturb and recordPerturbationFailure are only called with the lock held)
+        self.tree_lock = threading.Lock()
+        ### set as soon as a solution is found, to terminate the other workers
+        self.stop_event = threading.Event()
+        self.nodesInPerturbation = [] ### node ids currently perturbed by workers
+
+        ### the first subTree is grown from the root in the main plan scene
+        remaining_time_allowed = self.time_threshold - (time.time() - self.planning_startTime)
+        self.growSubTree(self.treeL["L0"], self.final_arrangement, remaining_time_allowed, self.isLabeledRoadmapUsed)
+        if (self.isSolved == False) and (len(self.plan_scene_namespaces) != 0):
+            workers = []
+            for plan_scene_ns in self.plan_scene_namespaces:
+                worker = threading.Thread(target=self.perturbAndGrow, args=(plan_scene_ns,))
+                worker.daemon = True
+                workers.append(worker)
+                worker.start()
+            for worker in workers:
+                worker.join()
+
+        if self.isSolved:
+            self.harvestSolution()
+
+
+    def perturbAndGrow(self, plan_scene_ns):
+        '''the loop of a single worker: keep perturbing a node and growing a subTree
+           from it in the worker plan scene until solved or time is out'''
+        num_consecutive_failures = 0
+        while not self.stop_event.is_set():
+            remaining_time_allowed = self.time_threshold - (time.time() - self.planning_startTime)
+            if (remaining_time_allowed <= 0):
+                break
+            set_scene_success, perturb_success, perturb_node = self.perturbNodeInWorker(plan_scene_ns)
+            if not set_scene_success:
+                rospy.logerr("[%s] fail to set the worker plan scene, stop the worker" % plan_scene_ns)
+                break
+            if not perturb_success:
+                ### back off (up to 1s) so that a worker which cannot perturb any node
+                ### does not spin on the service calls until the time is out
+                num_consecutive_failures += 1
+                self.stop_event.wait(min(0.05 * 2 ** min(num_consecutive_failures, 5), 1.0))
+                continue
+            num_consecutive_failures = 0
+            remaining_time_allowed = self.time_threshold - (time.time() - self.planning_startTime)
+            set_scene_success = self.growSubTreeInWorker(
+                perturb_node, self.final_arrangement, remaining_time_allowed, self.isLabeledRoadmapUsed, plan_scene_ns)
+            if not set_scene_success:
+                rospy.logerr("[%s] fail to set the worker plan scene, stop the worker" % plan_scene_ns)
+                break
+
+
+    def selectNodeToPerturb(self):
+        '''select a node (randomly) which is not being perturbed by other workers
+           if every node is taken, any node in the left tree can be selected'''
+        with self.tree_lock:
+            free_node_ids = [
+                node_id for node_id in self.idLeftRegistr if node_id not in self.nodesInPerturbation]
+            if len(free_node_ids) == 0:
+                free_node_ids = self.idLeftRegistr
+            temp_node_id = self.pickNodeToPerturb(free_node_ids)
+            self.nodesInPerturbation.append(temp_node_id)
+        return temp_node_id
+
+
+    def perturbNodeInWorker(self, plan_scene_ns):
+        '''this function selects a node to perturb by
+           choosing an object to put on a buffer in the worker plan scene
+           output: set_scene_success, perturb_success, perturbation_node'''
+        ### (i) first select a node
+        temp_node_id = self.selectNodeToPerturb()
+        temp_node = self.treeL[temp_node_id]
+        set_scene_success = self.serviceCall_setSceneBasedOnArrangementNode(
+            temp_node.arrangement, temp_node.robotConfig, "Right_torso", plan_scene_ns)
+        if not set_scene_success:
+            with self.tree_lock:
+                self.nodesInPerturbation.remove(temp_node_id)
+            return False, False, None
+        ### (ii) randomly select an object and then buffer
+        objects_yet_to_move = [
+            i for i in range(len(self.final_arrangement)) if temp_node.arrangement[i] != self.final_arrangement[i]]
+        success, object_idx, buffer_idx, object_path = self.serviceCall_selectObjectAndBuffer(
+            objects_yet_to_move, self.final_arrangement, "Right_torso",
+            self.heuristic_level, self.isLabeledRoadmapUsed, plan_scene_ns)
+        robot_config = self.serviceCall_getCurrRobotConfig(plan_scene_ns)
+        with self.tree_lock:
+            self.nodesInPerturbation.remove(temp_node_id)
+            if success == False:
+                ### the perturbation process fails either due to failure to select an object or the failure to select a buffer
+                self.recordPerturbationFailure(temp_node_id)
+                return True, False, None
+            ### the perturbation is a success, generate a tree node for this perturbation
+            perturbed_arrangement = copy.deepcopy(temp_node.arrangement)
+            perturbed_arrangement[object_idx] = buffer_idx
+            node_id = 0 ### temporarily set to 0
+            if temp_node.objectTransferred_idx == None:
+                ### in case perturbation happens from the very initial node
+                transit_from_info = None
+            else:
+                transit_from_info = [temp_node.objectTransferred_idx, temp_node.obj_transfer_position_indices[1]]
+            obj_transfer_position_indices = [temp_node.arrangement[object_idx], buffer_idx]
+            perturbed_object_ordering = copy.deepcopy(temp_node.object_ordering) + [object_idx]
+            perturbation_node = ArrNode(
+                perturbed_arrangement, robot_config, node_id, transit_from_info,
+                obj_transfer_position_indices, object_idx, object_path,
+                temp_node.cost_to_come + 1, temp_node.node_id, perturbed_object_ordering
+            )
+            ### before add this node to the tree, check it this resulting node is already in the tree
+            isSameNodeInTheTree, same_nodeID = self.checkSameArrangementNodeInTheLeftTree(perturbation_node)
+            if isSameNodeInTheTree:
+                return True, False, None
+            ### then add this node in the tree
+            self.left_idx += 1
+            perturbation_node.updateNodeID("L"+str(self.left_idx))
+            self.treeL["L"+str(self.left_idx)] = perturbation_node
+            return True, True, perturbation_node
+
+
+    def growSubTreeInWorker(self, rootNode, target_arrangement, time_allowed, isLabeledRoadmapUsed, plan_scene_ns):
+        '''output: whether the worker plan scene is set to the rootNode arrangement'''
+        rospy.logwarn("[%s] grow a subTree at root arrangement: %s" % (plan_scene_ns, str(rootNode.arrangement)))
+        ### (i) set the worker plan scene to the rootNode arrangement
+        set_scene_success = self.serviceCall_setSceneBasedOnArrangementNode(
+            rootNode.arrangement, rootNode.robotConfig, "Right_torso", plan_scene_ns)
+        if not set_scene_success:
+            return False
+        ### (ii) generate the subTree in the worker plan scene
+        cirs_solver = CIRSSolver(
+            rootNode, target_arrangement, time_allowed, isLabeledRoadmapUsed,
+            plan_scene_ns=plan_scene_ns, stop_event=self.stop_event)
+        local_task_success, subTree = cirs_solver.cirs_solve()
+        ### (iii) engraft the subTree to the global search tree (one worker at a time)
+        with self.tree_lock:
+            if self.isSolved:
+                ### another worker has already found a solution
+                return True
+            num_nodes = len(self.treeL)
+            self.engraftingLeftTree(rootNode, subTree)
+            if len(self.treeL) == num_nodes:
+                ### nothing grows from the perturbation
+                self.recordPerturbationFailure(rootNode.parent_id)
+            if self.isSolved:
+                rospy.logwarn("[%s] found the solution, stop other workers" % plan_scene_ns)
+                self.stop_event.set()
+        return True
@@ -20,12 +20,17 @@ from collections import OrderedDict
 
 import utils
 from CollisionChecker import CollisionChecker
+from TrajectoryInterpolation import interpolateConfigs, getStraightLineCorners
+from IKSeeding import IKSeedDataset
+import RoadmapSampling
+from ReachabilityMap import ReachabilityMap, getCandidatePositions
 
 import rospy
 from rospkg import RosPack
 from uniform_object_rearrangement.srv import AstarPathFindingNonLabeled, AstarPathFindingNonLabeledRequest
 from uniform_object_rearrangement.srv import AstarPathFindingLabeled, AstarPathFindingLabeledRequest
 from uniform_object_rearrangement.msg import Edge
+from ServiceProxyRegistry import service_proxy_registry
 
 class Planner(object):
     def __init__(self, rosPackagePath, server,
@@ -46,8 +51,21 @@ class Planner(object):
         self.leftLocalPose = [[-1, -1, -1], [-1, -1, -1, -1]]
         self.rightLocalPose = [[-1, -1, -1], [-1, -1, -1, -1]]
         self.query_idx = 1 ### record the current planning query index
+        ### debug option: drive the robot (and the object in hand) through every waypoint
+        ### when generating a trajectory, so as to visualize the trajectory in the plan scene
+        self.isTrajectoryVisualized = False
+        ### the IK of a pose is warm started from the nearest IK solutions (see IKSeeding.py)
+        ### and the new IK solutions are learned online unless isIKSeedLearned is False
+        self.isIKSeedLearned = True
+        ### roadmap sampling: #configs drawn at once and #processes for the collision checks
+        ### (see samplingNodes_batch, set by generateSamples)
+        self.sampling_batch_size = 2000
+        self.sampling_num_processes = 0
         self.loadIKdataset()
         self.deserializeCandidatesConfigPoses()
+        ### the reachability map of the position candidates (see ReachabilityMap.py)
+        ### which is loaded once the workspace is set up (see loadReachabilityMap)
+        self.reachability_map = None
 
 
     def resetPlannerParams(self):
@@ -61,6 +79,16 @@ class Planner(object):
         self.rightLocalPose = [[-1, -1, -1], [-1, -1, -1, -1]]
         self.query_idx = 1 ### record the current planning query index        
 
+    def getManipulationStatus(self):
+        ### the attach state of both hands
+        return [self.isObjectInLeftHand, self.objectInLeftHand, self.objectInLeftHand_idx, copy.deepcopy(self.leftLocalPose), \
+            self.isObjectInRightHand, self.objectInRightHand, self.objectInRightHand_idx, copy.deepcopy(self.rightLocalPose)]
+
+    def setManipulationStatus(self, manipulation_status):
+        self.isObjectInLeftHand, self.objectInLeftHand, self.objectInLeftHand_idx, self.leftLocalPose, \
+            self.isObjectInRightHand, self.objectInRightHand, self.objectInRightHand_idx, self.rightLocalPose = \
+                copy.deepcopy(manipulation_status)
+
     def setRobotToConfig(self, ik_config, robot, armType):
         ### this function set the robot to certain config (with stepSimulation)
         ### this function must be called in the following situation
@@ -81,6 +109,8 @@ class Planner(object):
             line = [float(e) for e in line]
             self.IK_dataset_Right_torso.append(line)
         f_ikdataset.close()
+        self.ik_seeds = {}
+        self.ik_seeds[armType] = IKSeedDataset(self.IK_dataset_Right_torso)
 
     def loadSamples(self):
         arms = ["Right_torso"]
@@ -104,14 +134,19 @@ class Planner(object):
         print("nsamples: ", self.nsamples)
         print("num_neighbors: ", self.num_neighbors)
 
-    def generateSamples(self, nsamples, robot, workspace, mode="configuration_space"):
+    def generateSamples(self, nsamples, robot, workspace, mode="configuration_space",
+                                        batch_size=2000, num_processes=0):
         ### mode: decide which space do you sample from
         ### (1) configuration_space
         ### (2) cartesian_space
         ### (3) hybrid_space
+        ### batch_size: #configs drawn at once in the configuration space (see samplingNodes_batch)
+        ### num_processes: #worker processes for the collision checks (<= 1: no process pool)
         if not os.path.exists(self.roadmapFolder):
             os.makedirs(self.roadmapFolder)
         self.nsamples = nsamples
+        self.sampling_batch_size = batch_size
+        self.sampling_num_processes = num_processes
         ### specify the needed parameters
         self.neighbors_const = 3.5 * math.e * (1 + 1.0/8)
         ### use k_n to decide the number of neighbors: #neighbors = k_n * log(#samples)
@@ -133,30 +168,17 @@ class Planner(object):
         ##########################################
 
     def samplingNodes_hybridSpace(self, robot, workspace, armType):
-        temp_counter = 0
-        ###### (i) let's first generate 1000 random samples in the configuration space ######
-        while temp_counter < int(self.nsamples * 0.5):
-            ### sample an IK configuration
-            ikSolution = self.singleSampling_CSpace(robot, armType) ### this is for a single arm
-            ########## move the robot to that configuration and then check ##########
-            self.setRobotToConfig(ikSolution, robot, armType)
-            isIKFallIntoRightRegion = self.sampleRegionCheck(robot, workspace, armType)
-            if not isIKFallIntoRightRegion:
-                continue
-            isValid, FLAG = self.checkConfig_CollisionWithRobotAndKnownGEO(robot, workspace)
-            if isValid:
-                self.nodes[armType].append(ikSolution)
-                temp_counter += 1
-                print("finish the %s node" % str(temp_counter))
-                # input("I want to see these points")
+        ###### (i) let's first generate half of the samples in the configuration space ######
+        self.nodes[armType] += self.samplingNodes_batch(int(self.nsamples * 0.5), robot, workspace, armType)
+        temp_counter = len(self.nodes[armType])
         ##########################################################################
 
-        ###### (ii) then generate 1000 random cartesian poses of interest ######
+        ###### (ii) then generate the rest as random cartesian poses of interest ######
         while temp_counter < self.nsamples:
             ### sample an workspace pose
             sample_pose = self.singleSampling_workspace(robot, workspace, armType)
             ### assign a rest_pose
-            rest_pose = self.randomRestPose(robot, armType)
+            rest_pose = self.seededRestPose(sample_pose, robot, armType)
             isIKValid, FLAG, ikSolution = self.generateConfigBasedOnSamplePose(
                                 sample_pose, rest_pose, robot, workspace, armType)
             if isIKValid:
@@ -167,23 +189,67 @@ class Planner(object):
         ##########################################################################
 
     def samplingNodes_configurationSpace(self, robot, workspace, armType):
-        temp_counter = 0
-        ### Let's start
-        while temp_counter < self.nsamples:
-            ### sample an IK configuration
-            ikSolution = self.singleSampling_CSpace(robot, armType) ### this is for a single arm
-            ########## move the robot to that configuration and then check ##########
-            self.setRobotToConfig(ikSolution, robot, armType)
-            isIKFallIntoRightRegion = self.sampleRegionCheck(robot, workspace, armType)
-            if not isIKFallIntoRightRegion:
-                continue
+        self.nodes[armType] += self.samplingNodes_batch(self.nsamples, robot, workspace, armType)
+
+    def samplingNodes_batch(self, nsamples, robot, workspace, armType):
+        ### This function samples nsamples valid nodes in the configuration space in batches
+        ### (1) draw a batch of configs (self.sampling_batch_size) uniformly within the joint limits
+        ### (2) keep the configs whose end effector falls into the right region (forward kinematics)
+        ### (3) only then check the collisions of the remaining configs with pybullet
+        ###     (in a process pool if self.sampling_num_processes > 1, see RoadmapSampling.py)
+        ### output: a list of nsamples configs
+        batch_size = self.sampling_batch_size
+        num_processes = self.sampling_num_processes
+        pool = None
+        if num_processes > 1:
+            pool = RoadmapSampling.createSamplingPool(num_processes)
+        nodes = []
+        num_drawn = 0
+        num_in_region = 0
+        start_time = time.time()
+        while len(nodes) < nsamples:
+            configs = self.batchSampling_CSpace(robot, armType, batch_size)
+            num_drawn += len(configs)
+            configs = configs[self.sampleRegionCheck_batch(configs, robot, workspace, armType)].tolist()
+            num_in_region += len(configs)
+            if pool != None:
+                isConfigsValid = RoadmapSampling.checkConfigsInPool(pool, num_processes, configs, armType)
+            else:
+                isConfigsValid = self.checkConfigs_CollisionWithRobotAndKnownGEO(configs, robot, workspace, armType)
+            nodes += [config for config, isValid in zip(configs, isConfigsValid) if isValid]
+            print("[{}/{}] nodes: {} configs drawn, {} in the region, {:.1f}s elapsed".format(
+                min(len(nodes), nsamples), nsamples, num_drawn, num_in_region, time.time() - start_time))
+        if pool != None:
+            pool.close()
+            pool.join()
+        return nodes[:nsamples]
+
+    def batchSampling_CSpace(self, robot, armType, batch_size):
+        ### the batch version of singleSampling_CSpace
+        ### output: the configs (batch_size x #joints) uniformly sampled within the joint limits
+        ### (drawn from np.random, not random as singleSampling_CSpace: seed np.random to reproduce a roadmap)
+        if armType == "Left" or armType == "Left_torso":
+            first_joint_index = 1
+        else:
+            first_joint_index = 8
+        nArmJoints = int(len(robot.rightArmHomeConfiguration))
+        joint_indices = list(range(first_joint_index, first_joint_index + nArmJoints))
+        ### first consider if you have torso to handle
+        if armType == "Left_torso" or armType == "Right_torso":
+            joint_indices = [0] + joint_indices
+        lower_limits = np.array([robot.ll[i] for i in joint_indices])
+        upper_limits = np.array([robot.ul[i] for i in joint_indices])
+        return np.random.uniform(lower_limits, upper_limits, size=(batch_size, len(joint_indices)))
+
+    def checkConfigs_CollisionWithRobotAndKnownGEO(self, configs, robot, workspace, armType):
+        ### the collision check (robot self-collision + robot-known geometries) of a list of configs
+        ### output: a list of bool (whether each config is collision free)
+        isConfigsValid = []
+        for config in configs:
+            self.setRobotToConfig(config, robot, armType)
             isValid, FLAG = self.checkConfig_CollisionWithRobotAndKnownGEO(robot, workspace)
-            if isValid:
-                self.nodes[armType].append(ikSolution)
-                temp_counter += 1
-                # input("I want to see these points")
-                print("finish the %s node" % str(temp_counter))
-            ##########################################################################
+            isConfigsValid.append(isValid)
+        return isConfigsValid
 
     def singleSampling_CSpace(self, robot, armType):
         if armType == "Left" or "Left_torso":
@@ -243,6 +309,12 @@ class Planner(object):
         #         return isIKFallIntoRightRegion
         return True
 
+    def sampleRegionCheck_batch(self, configs, robot, workspace, armType):
+        ### the batch version of sampleRegionCheck with the forward kinematics (no need to set the robot)
+        ### output: a boolean array (#configs) indicating whether each config falls into the right region
+        ee_positions, ee_quaternions = robot.getEEPoses_batch(configs, armType)
+        return ee_positions[:, 2] <= workspace.tablePosition[2] + workspace.table_dim[2] / 2 + workspace.ceiling_height
+
     def saveSamplesToFile(self, samplesFile, armType):
         f_samples = open(samplesFile, "w")
         for node_idx in range(len(self.nodes[armType])):
@@ -360,6 +432,63 @@ class Planner(object):
         #     rp.append(joint_value)
         # return rp
 
+    def getIKSeeds(self, pose, robot, armType, k=1):
+        ### the configs of the k stored IK solutions nearest to the pose (by the end-effector pose)
+        if armType not in self.ik_seeds:
+            return []
+        if not self.ik_seeds[armType].isReady():
+            ### forward kinematics of the IK dataset (only once)
+            self.ik_seeds[armType].computeEEPoses(lambda configs: robot.getEEPoses_batch(configs, armType))
+        return self.ik_seeds[armType].getNearestConfigs(pose, k)
+
+    def learnIKSolution(self, config, pose, armType):
+        ### a valid IK solution (config) of the pose becomes a seed of the nearby poses
+        if self.isIKSeedLearned and (armType in self.ik_seeds):
+            self.ik_seeds[armType].addSolution(config, pose)
+
+    def seededRestPose(self, pose, robot, armType, trial=0):
+        ### the rest pose for the IK of a pose: the (trial+1)-th nearest IK solution of the pose
+        ### (a random rest pose if there are not enough IK solutions or the arm has no IK dataset)
+        seeds = self.getIKSeeds(pose, robot, armType, trial+1)
+        if (armType != "Right_torso") or (len(seeds) <= trial):
+            return self.randomRestPose(robot, armType)
+        right_torso_rp = seeds[trial]
+        return [right_torso_rp[0]] + robot.leftArmCurrConfiguration + right_torso_rp[1:8] + robot.rightHandCurrConfiguration
+
+    def calculateSeededIK(self, pose, robot, armType, trial=0, seed_config=None):
+        ### This function calculates the IK of a pose warm started from a seed config
+        ### which is both the initial guess (the robot is set to it) and the rest pose of the IK
+        ### the seed config is the (trial+1)-th nearest IK solution of the pose if not specified
+        ### output: the config (a list of 7 or 8 joint values)
+        if armType == "Left" or armType == "Left_torso":
+            ee_idx = robot.left_ee_idx
+            first_joint_index = 1
+        if armType == "Right" or armType == "Right_torso":
+            ee_idx = robot.right_ee_idx
+            first_joint_index = 8
+        if seed_config == None:
+            seeds = self.getIKSeeds(pose, robot, armType, trial+1)
+            if len(seeds) > trial:
+                seed_config = seeds[trial]
+        if (seed_config != None) and (armType == "Right_torso"):
+            self.setRobotToConfig(seed_config, robot, armType)
+            rest_pose = [seed_config[0]] + robot.leftArmCurrConfiguration + list(seed_config[1:8]) + robot.rightHandCurrConfiguration
+        else:
+            rest_pose = self.randomRestPose(robot, armType)
+        config_IK = p.calculateInverseKinematics(bodyUniqueId=robot.motomanGEO,
+                                endEffectorLinkIndex=ee_idx,
+                                targetPosition=pose[0],
+                                targetOrientation=pose[1],
+                                lowerLimits=robot.ll, upperLimits=robot.ul, 
+                                jointRanges=robot.jr, restPoses=rest_pose,
+                                maxNumIterations=2000, residualThreshold=0.0000001,
+                                physicsClientId=robot.server)
+        if armType == "Left" or armType == "Right":
+            singleArmConfig_IK = list(config_IK[first_joint_index:first_joint_index+7])
+        if armType == "Left_torso" or armType == "Right_torso":
+            singleArmConfig_IK = [config_IK[0]] + list(config_IK[first_joint_index:first_joint_index+7])
+        return singleArmConfig_IK
+
     def obtainCurrObjectConfigPoses(self, workspace, object_idx):
         ### This function feteches the current object's configPoses specified by object_idx
         curr_obj_position_idx = workspace.object_geometries[object_idx].curr_position_idx
@@ -371,6 +500,32 @@ class Planner(object):
             curr_object_configPoses = self.position_candidates_configPoses[curr_obj_position_idx]
         return curr_object_configPoses
     
+    def obtainTargetObjectConfigPoses(self, workspace, object_idx, target_position_idx):
+        ### This function feteches the configPoses of the object specified by object_idx
+        ### at the target position (a position candidate or the object's initial position)
+        if target_position_idx >= workspace.num_candidates:
+            ### the target is the object's initial position (e.g., a reversed rearrangement action)
+            target_object_configPoses = self.object_initial_configPoses[object_idx]
+        else:
+            target_object_configPoses = self.position_candidates_configPoses[target_position_idx]
+        return target_object_configPoses
+
+    def checkLabelFeasibility(self, configPoses, occupied_labels, manipulation_mode):
+        '''This function checks (only with the labels stored in the configPoses)
+        if at least one picking/placing config is free of collision
+        with the objects at the occupied_labels'''
+        ### configPoses: a PositionCandidateConfigs object
+        ### occupied_labels: a set of collision position indices occupied by other objects
+        ### manipulation_mode: "picking" or "placing"
+        if manipulation_mode == "picking":
+            all_pose_labels = configPoses.total_labels
+        if manipulation_mode == "placing":
+            all_pose_labels = configPoses.grasping_labels
+        for pose_labels in all_pose_labels:
+            if set(pose_labels).isdisjoint(occupied_labels):
+                return True
+        return False
+
     def getConstraintsFromLabels(self, configPoses, obj_idx, target_arrangement, manipulation_mode):
         '''This function gets all objects target constraints from labels
         stored in the configPoses'''
@@ -459,7 +614,7 @@ class Planner(object):
         while (not isIKValid) and (trials < 1):
             ### try another IK (not specify rest pose)
             ### try another IK given curernt rest pose with random noise
-            rest_pose = self.randomRestPose(robot, armType)
+            rest_pose = self.seededRestPose(new_pose, robot, armType)
             q_newPoseIK = p.calculateInverseKinematics(bodyUniqueId=robot.motomanGEO,
                                     endEffectorLinkIndex=ee_idx,
                                     targetPosition=new_pose[0],
@@ -527,7 +682,7 @@ class Planner(object):
         while (not isIKValid) and (trials < 1):
             ### try another IK (not specify rest pose)
             ### try another IK given curernt rest pose with random noise
-            rest_pose = self.randomRestPose(robot, armType)
+            rest_pose = self.seededRestPose(pose, robot, armType)
             config_IK = p.calculateInverseKinematics(bodyUniqueId=robot.motomanGEO,
                                     endEffectorLinkIndex=ee_idx,
                                     targetPosition=pose[0],
@@ -930,82 +1085,86 @@ class Planner(object):
             return isEdgeValid, FLAG
 
 
-    def generateTrajectory_DirectConfigPath(self, n1, n2, robot, armType, workspace):
+    def moveRobotToWaypoint(self, config, robot, workspace, armType):
+        ### set the robot (and the object in hand) to the config of a waypoint
+        ### so that the scene ends up as if the dense trajectory were generated
+        self.setRobotToConfig(config, robot, armType)
+        if (self.isObjectInLeftHand and (armType == "Left" or armType == "Left_torso")) or \
+                    (self.isObjectInRightHand and (armType == "Right" or armType == "Right_torso")):
+            self.updateMeshBasedonLocalPose(robot, workspace, armType)
+
+    def generateTrajectory_DirectConfigPath(self, n1, n2, robot, armType, workspace, isSparse=False):
         ### This function generates a trajectory based on two configs (which has been proved to be valid transition)
         ### Input: n1, n2: node (a list of 7 or 8 joint values)
+        ###        isSparse: only return the endtail as the waypoint (the segment is densified later)
         ### output: an edge trajectory (config_edge_traj) which includes the endtail but not the head
         ###         format: a list of list(7 or 8 joint values)
+        ### The waypoints are interpolated in numpy without touching the physics server,
+        ### the robot (and the object in hand) is only set to the endtail at last
 
-        config_edge_traj = []
-        # nseg = 5
-        min_degree = math.pi / 180 * 1 ### want more waypoint to move more naturally
+        if isSparse:
+            self.moveRobotToWaypoint(n2, robot, workspace, armType)
+            return [n2]
 
-        if armType == "Left" or armType == "Right":
-            nseg = int(max(
-                abs(n1[0]-n2[0]), abs(n1[1]-n2[1]), abs(n1[2]-n2[2]), abs(n1[3]-n2[3]),
-                abs(n1[4]-n2[4]), abs(n1[5]-n2[5]), abs(n1[6]-n2[6])) / min_degree)
-            if nseg == 0: nseg += 1
-            # print("nseg: " + str(nseg))
-            ### we don't include the head (i=0)
-            for i in range(1, nseg+1):
-                interm_j0 = n1[0] + (n2[0]-n1[0]) / nseg * i
-                interm_j1 = n1[1] + (n2[1]-n1[1]) / nseg * i
-                interm_j2 = n1[2] + (n2[2]-n1[2]) / nseg * i
-                interm_j3 = n1[3] + (n2[3]-n1[3]) / nseg * i
-                interm_j4 = n1[4] + (n2[4]-n1[4]) / nseg * i
-                interm_j5 = n1[5] + (n2[5]-n1[5]) / nseg * i
-                interm_j6 = n1[6] + (n2[6]-n1[6]) / nseg * i
-                intermNode = [interm_j0, interm_j1, interm_j2, interm_j3, interm_j4, interm_j5, interm_j6]
-                robot.setSingleArmToConfig(intermNode, armType)
-                ########## temporarily add here for visualization ##########
-                if (self.isObjectInLeftHand and (armType == "Left" or armType == "Left_torso")) or \
-                            (self.isObjectInRightHand and (armType == "Right" or armType == "Right_torso")):
-                    self.updateMeshBasedonLocalPose(robot, workspace, armType)
-                ############################################################
-                # time.sleep(0.1)
-                config_edge_traj.append(intermNode)
-        
-        if armType == "Left_torso" or armType == "Right_torso":
-            nseg = int(max(
-                abs(n1[0]-n2[0]), abs(n1[1]-n2[1]), abs(n1[2]-n2[2]), abs(n1[3]-n2[3]),
-                abs(n1[4]-n2[4]), abs(n1[5]-n2[5]), abs(n1[6]-n2[6]), abs(n1[7]-n2[7])) / min_degree)
-            if nseg == 0: nseg += 1
-            # print("nseg: " + str(nseg))            
-            for i in range(1, nseg+1):
-                interm_j0 = n1[0] + (n2[0]-n1[0]) / nseg * i
-                interm_j1 = n1[1] + (n2[1]-n1[1]) / nseg * i
-                interm_j2 = n1[2] + (n2[2]-n1[2]) / nseg * i
-                interm_j3 = n1[3] + (n2[3]-n1[3]) / nseg * i
-                interm_j4 = n1[4] + (n2[4]-n1[4]) / nseg * i
-                interm_j5 = n1[5] + (n2[5]-n1[5]) / nseg * i
-                interm_j6 = n1[6] + (n2[6]-n1[6]) / nseg * i
-                interm_j7 = n1[7] + (n2[7]-n1[7]) / nseg * i
-                intermNode = [interm_j0, interm_j1, interm_j2, interm_j3, interm_j4, interm_j5, interm_j6, interm_j7]
-                robot.setSingleArmToConfig_torso(intermNode[1:8], intermNode[0], armType)
-                ########## temporarily add here for visualization ##########
-                if (self.isObjectInLeftHand and (armType == "Left" or armType == "Left_torso")) or \
-                            (self.isObjectInRightHand and (armType == "Right" or armType == "Right_torso")):
-                    self.updateMeshBasedonLocalPose(robot, workspace, armType)
-                ############################################################
-                # time.sleep(0.1)
-                config_edge_traj.append(intermNode)
+        ### want more waypoint (1 degree resolution) to move more naturally
+        config_edge_traj = interpolateConfigs(n1, n2)
+        self.moveRobotAlongTrajectory(config_edge_traj, robot, workspace, armType)
 
         return config_edge_traj
-    
+
+    def moveRobotAlongTrajectory(self, traj, robot, workspace, armType):
+        ### set the robot (and the object in hand) to the end of the trajectory
+        ### (every waypoint of the trajectory if the trajectory is visualized)
+        if len(traj) == 0:
+            return
+        if self.isTrajectoryVisualized:
+            for config in traj:
+                self.moveRobotToWaypoint(config, robot, workspace, armType)
+                # time.sleep(0.1)
+        else:
+            self.moveRobotToWaypoint(traj[-1], robot, workspace, armType)
+
+    def generateTrajectory_SmoothedPath(self, smoothed_path, initialConfig, targetConfig, robot, workspace, armType, isSparse=False):
+        ### This function generates a trajectory based on the smoothed path (a list of node idx)
+        ### output: a trajectory which includes the targetConfig but not the initialConfig
+        ###         (isSparse: only the waypoints, i.e., the configs of the nodes and the targetConfig)
+        result_traj = []
+        if isSparse:
+            result_traj = [self.nodes[armType][node_idx] for node_idx in smoothed_path[1:-1]] + [targetConfig]
+            self.moveRobotToWaypoint(targetConfig, robot, workspace, armType)
+            return result_traj
+        ### directly generate trajectory based on the new path
+        for i in range(0, len(smoothed_path)-1):
+            if i == 0:
+                config1 = initialConfig
+            else:
+                config1 = self.nodes[armType][smoothed_path[i]]
+            if i == (len(smoothed_path)-2):
+                config2 = targetConfig
+            else:
+                config2 = self.nodes[armType][smoothed_path[i+1]]
+            ### get edge trajectory
+            config_edge_traj = interpolateConfigs(config1, config2)
+            # result_traj.append(config_edge_traj)
+            result_traj += config_edge_traj
+        ### the robot only needs to be set once at the end of the whole path
+        self.moveRobotAlongTrajectory(result_traj, robot, workspace, armType)
+        return result_traj
+
     def AstarPathFinding(self, initialConfig, targetConfig,
                 start_neighbors_idx, start_neighbors_cost, 
                 goal_neighbors_idx, goal_neighbors_cost,
-                robot, workspace, armType, isLabeledRoadmapUsed):
+                robot, workspace, armType, isLabeledRoadmapUsed, isSparse=False):
         if isLabeledRoadmapUsed:
             traj = self.AstarPathFinding_labeledVersion(initialConfig, targetConfig,
                 start_neighbors_idx, start_neighbors_cost, 
                 goal_neighbors_idx, goal_neighbors_cost,
-                robot, workspace, armType)
+                robot, workspace, armType, isSparse)
         else:
             traj = self.AstarPathFinding_nonLabeledVersion(initialConfig, targetConfig,
                 start_neighbors_idx, start_neighbors_cost, 
                 goal_neighbors_idx, goal_neighbors_cost,
-                robot, workspace, armType)
+                robot, workspace, armType, isSparse)
         return traj
 
     def serviceCall_astarPathFinding_nonLabeledVersion(self, 
@@ -1014,7 +1173,6 @@ class Planner(object):
             robot, workspace, armType):
         ### violated_edges: [Edge(), Edge(), ...]
         ### prepare the AstarPathFindingNonLabeledRequest
-        rospy.wait_for_service("astar_path_finding_nonlabeled")
         request = AstarPathFindingNonLabeledRequest()
         request.query_idx = self.query_idx
         request.start_idx = self.nsamples
@@ -1029,13 +1187,7 @@ class Planner(object):
         request.goal_neighbors_cost = goal_neighbors_cost
 
         try:
-            astarSearchNonLabeled = rospy.ServiceProxy("astar_path_finding_nonlabeled", AstarPathFindingNonLabeled)
-            response = astarSearchNonLabeled(request.query_idx, 
-                request.start_idx, request.goal_idx,
-                request.start_config, request.goal_config,
-                request.start_neighbors_idx, request.goal_neighbors_idx,
-                request.start_neighbors_cost, request.goal_neighbors_cost,
-                request.violated_edges, request.armType)
+            response = service_proxy_registry.call("astar_path_finding_nonlabeled", AstarPathFindingNonLabeled, request)
             return response.searchSuccess, list(response.path)
         except rospy.ServiceException as e:
             print("Service call failed: %s" % e)
@@ -1044,9 +1196,10 @@ class Planner(object):
     def AstarPathFinding_nonLabeledVersion(self, initialConfig, targetConfig,
                 start_neighbors_idx, start_neighbors_cost, 
                 goal_neighbors_idx, goal_neighbors_cost,
-                robot, workspace, armType):
+                robot, workspace, armType, isSparse=False):
         ### Input: initialConfig, targetConfig [q1, q2, ..., q7]
         ###        neighbors_idx as well as neighbors_cost should not be empty when entering in this function
+        ###        isSparse: only return the waypoints of the smoothed path (see generateTrajectory_SmoothedPath)
         ### Output: traj (format: [joint_state1, joint_state2, ...])
         ###         and joint_state is a list of joint values
 
@@ -1080,20 +1233,8 @@ class Planner(object):
         ### congrats, the path is valid and finally smoothed, let's generate trajectory
         print("smoothed path: ", smoothed_path)
         print("\n")
-        ### directly generate trajectory based on the new path
-        for i in range(0, len(smoothed_path)-1):
-            if i == 0:
-                config1 = initialConfig
-            else:
-                config1 = self.nodes[armType][smoothed_path[i]]
-            if i == (len(smoothed_path)-2):
-                config2 = targetConfig
-            else:
-                config2 = self.nodes[armType][smoothed_path[i+1]]
-            ### get edge trajectory
-            config_edge_traj = self.generateTrajectory_DirectConfigPath(config1, config2, robot, armType, workspace)
-            # result_traj.append(config_edge_traj)
-            result_traj += config_edge_traj
+        result_traj = self.generateTrajectory_SmoothedPath(
+            smoothed_path, initialConfig, targetConfig, robot, workspace, armType, isSparse)
 
         ### before you claim the victory of this query, increment the planning query
         ### so as to tell people this query is over, next time is a new query
@@ -1160,6 +1301,44 @@ class Planner(object):
         return smoothed_path, True, violated_edges
 
 
+    def shortcutPath(self, waypoints, robot, workspace, armType, time_allowed,
+                        isFirstSegmentFixed=False, isLastSegmentFixed=False):
+        ### This function shortcuts a (harvested) path within a time budget
+        ### by randomized shortcutting: pick two random points on the path and
+        ### replace the path between them with the straight line if the line is collision-free
+        ### Input: waypoints: the path (a list of configs) which starts with the start config
+        ###        isFirst(Last)SegmentFixed: keep the first (last) straight-line segment,
+        ###        e.g., the cartesian moves to pick or place an object
+        ### output: the shortcut path (a list of configs, the corners of the path) and #shortcuts
+        waypoints = np.array(waypoints, dtype=float)
+        vertices = waypoints[getStraightLineCorners(waypoints)]
+        head = vertices[:1] if isFirstSegmentFixed else vertices[:0]
+        tail = vertices[-1:] if isLastSegmentFixed else vertices[:0]
+        vertices = vertices[len(head):len(vertices)-len(tail)]
+        num_shortcuts = 0
+        start_time = time.time()
+        while (time.time() - start_time < time_allowed) and (len(vertices) >= 3):
+            segment_lengths = np.linalg.norm(np.diff(vertices, axis=0), axis=1)
+            cumulative_lengths = np.concatenate([[0.0], np.cumsum(segment_lengths)])
+            if cumulative_lengths[-1] == 0.0:
+                break
+            s1, s2 = np.sort(np.random.uniform(0.0, cumulative_lengths[-1], 2))
+            ### the segments where the two points are
+            k1, k2 = np.minimum(np.searchsorted(cumulative_lengths, [s1, s2], side="right") - 1, len(vertices)-2)
+            if (k1 == k2) or (segment_lengths[k1] == 0.0) or (segment_lengths[k2] == 0.0):
+                ### two points on the same straight line can not be shortcut
+                continue
+            q1 = vertices[k1] + (vertices[k1+1] - vertices[k1]) * ((s1 - cumulative_lengths[k1]) / segment_lengths[k1])
+            q2 = vertices[k2] + (vertices[k2+1] - vertices[k2]) * ((s2 - cumulative_lengths[k2]) / segment_lengths[k2])
+            isEdgeValid, FLAG = self.checkEdgeValidity_AllCollisions(
+                                        q1.tolist(), q2.tolist(), robot, workspace, armType)
+            if isEdgeValid:
+                vertices = np.vstack([vertices[:k1+1], q1, q2, vertices[k2+1:]])
+                num_shortcuts += 1
+        vertices = np.vstack([head, vertices, tail])
+        return vertices.tolist(), num_shortcuts
+
+
     def connectToNeighbors(self, config, robot, workspace, armType):
         ### This function makes connections 
         ### between the specified config to neighboring nodes in the roadmap
@@ -1535,13 +1714,13 @@ class Planner(object):
         
         ################ then check potential collision with objects not in hand ####################
         ### first get all the objects which are not in hand (here objects are really candidates)
-        static_object_geometries = { obj_info.position_idx : obj_info.geo \
+        static_candidates = { obj_info.position_idx : obj_info \
             for obj_info in workspace.candidate_geometries.values() \
             if (obj_info.position_idx != self.objectInLeftHand_idx) and \
                 (obj_info.position_idx != self.objectInRightHand_idx) }
         ### FLAG: 4
         isConfigValid, FLAG, objectCollided = \
-            self.checkConfig_CollisionBetweenRobotAndStaticObjects_labeled(robot, static_object_geometries)
+            self.checkConfig_CollisionBetweenRobotAndCandidates_labeled(robot, static_candidates)
         #############################################################################################
 
         ############ then check potential collisions for in-hand manipulation #######################
@@ -1566,8 +1745,8 @@ class Planner(object):
         ### (iv) check the potential collision between the moving object and other static objects
         ### FLAG: 7
         isConfigValid, FLAG, objectCollided_inHand = \
-            self.checkConfig_CollisionMovingObjectAndStaticObjects_labeled(
-                                            manipulation_objectGEO, static_object_geometries)
+            self.checkConfig_CollisionMovingObjectAndCandidates_labeled(
+                                            manipulation_objectGEO, static_candidates)
         #############################################################################################
         ### reach here since you finish all the check
         ### (v) delete an object out of the specified hand
@@ -1613,6 +1792,27 @@ class Planner(object):
             FLAG = 0
             return isConfigValid, FLAG, objectCollided_inHand
 
+    def checkConfig_CollisionBetweenRobotAndCandidates_labeled(self, robot, candidates):
+        ######## before calling this function, don't forget to call API: setRobotToConfig ########
+        ### the version of checkConfig_CollisionBetweenRobotAndStaticObjects_labeled for the position candidates
+        ### candidates is a dictionary {position_idx : CylinderCandidate}, only the meshes of
+        ### the candidates near the robot are created and checked
+        isCollision, objectCollided = self.collisionAgent_p.collisionCheck_robot_candidates_labeled(
+                                                                        robot.motomanGEO, candidates)
+        if isCollision == True:
+            return False, 4, objectCollided
+        return True, 0, objectCollided
+
+    def checkConfig_CollisionMovingObjectAndCandidates_labeled(self, movingObjectGEO, candidates):
+        ######## before calling this function, don't forget to call API: setRobotToConfig ########
+        ### the version of checkConfig_CollisionMovingObjectAndStaticObjects_labeled for the position candidates
+        ### candidates is a dictionary {position_idx : CylinderCandidate}
+        isCollision, objectCollided_inHand = self.collisionAgent_p.collisionCheck_object_candidates_labeled(
+                                                                            movingObjectGEO, candidates)
+        if isCollision == True:
+            return False, 7, objectCollided_inHand
+        return True, 0, objectCollided_inHand
+
 
     def generateConfigBasedOnSamplePose(self, pose, rest_config, robot, workspace, armType):
         ### This function checks the validity of a pose by checking its corresponding config (IK)
@@ -1657,7 +1857,7 @@ class Planner(object):
         while (not isIKValid) and (trials < 1):
             ### try another IK (not specify rest pose)
             ### try another IK given curernt rest pose with random noise
-            rest_pose = self.randomRestPose(robot, armType)
+            rest_pose = self.seededRestPose(pose, robot, armType)
             config_IK = p.calculateInverseKinematics(bodyUniqueId=robot.motomanGEO,
                                     endEffectorLinkIndex=ee_idx,
                                     targetPosition=pose[0],
@@ -1707,9 +1907,10 @@ class Planner(object):
     def AstarPathFinding_labeledVersion(self, initialConfig, targetConfig,
                 start_neighbors_idx, start_neighbors_cost, 
                 goal_neighbors_idx, goal_neighbors_cost,
-                robot, workspace, armType):
+                robot, workspace, armType, isSparse=False):
         ### Input: initialConfig, targetConfig [q1, q2, ..., q7]
         ###        neighbors_idx as well as neighbors_cost should not be empty when entering in this function
+        ###        isSparse: only return the waypoints of the smoothed path (see generateTrajectory_SmoothedPath)
         ### Output: traj (format: [joint_state1, joint_state2, ...])
         ###         and joint_state is a list of joint values
 
@@ -1756,20 +1957,8 @@ class Planner(object):
         ### congrats, the path is valid and finally smoothed, let's generate trajectory
         print("smoothed path: ", smoothed_path)
         print("\n")
-        ### directly generate trajectory based on the new path
-        for i in range(0, len(smoothed_path)-1):
-            if i == 0:
-                config1 = initialConfig
-            else:
-                config1 = self.nodes[armType][smoothed_path[i]]
-            if i == (len(smoothed_path)-2):
-                config2 = targetConfig
-            else:
-                config2 = self.nodes[armType][smoothed_path[i+1]]
-            ### get edge trajectory
-            config_edge_traj = self.generateTrajectory_DirectConfigPath(config1, config2, robot, armType, workspace)
-            # result_traj.append(config_edge_traj)
-            result_traj += config_edge_traj
+        result_traj = self.generateTrajectory_SmoothedPath(
+            smoothed_path, initialConfig, targetConfig, robot, workspace, armType, isSparse)
 
         ### before you claim the victory of this query, increment the planning query
         ### so as to tell people this query is over, next time is a new query
@@ -1784,7 +1973,6 @@ class Planner(object):
             robot, workspace, armType):
         ### violated_edges: [Edge(), Edge(), ...]
         ### prepare the AstarPathFindingLabeledRequest
-        rospy.wait_for_service("astar_path_finding_labeled")
         request = AstarPathFindingLabeledRequest()
         request.query_idx = self.query_idx
         request.start_idx = self.nsamples
@@ -1801,21 +1989,14 @@ class Planner(object):
         request.isInHandManipulation = isInHandManipulation
 
         try:
-            astarSearchLabeled = rospy.ServiceProxy("astar_path_finding_labeled", AstarPathFindingLabeled)
-            response = astarSearchLabeled(request.query_idx, 
-                request.start_idx, request.goal_idx,
-                request.start_config, request.goal_config,
-                request.start_neighbors_idx, request.goal_neighbors_idx,
-                request.start_neighbors_cost, request.goal_neighbors_cost,
-                request.occupied_labels, request.isInHandManipulation, 
-                request.violated_edges, request.armType)
+            response = service_proxy_registry.call("astar_path_finding_labeled", AstarPathFindingLabeled, request)
             return response.searchSuccess, list(response.path)
         except rospy.ServiceException as e:
             print("Service call failed: %s" % e)
 
     ###################################################################################################################
     ###################################################################################################################
-    def generateConfigBasedOnPose_candidates(self, pose, robot, workspace, armType, cylinder_positions_geometries):
+    def generateConfigBasedOnPose_candidates(self, pose, robot, workspace, armType, cylinder_position_candidates):
         ### This function generates IK for a pose and check the IK
         ### in term of reachablity, essential collisions, as well as labels
         ### Input: pose: [[x,y,z],[x,y,z,w]]
@@ -1861,7 +2042,7 @@ class Planner(object):
                 continue 
             ### check labels
             isConfigValid, FLAG, objectCollided_grasping = \
-                self.checkConfig_CollisionBetweenRobotAndStaticObjects_labeled(robot, cylinder_positions_geometries)
+                self.checkConfig_CollisionBetweenRobotAndCandidates_labeled(robot, cylinder_position_candidates)
             print("Labels for grasping pose: ", objectCollided_grasping)
 
             ############################### check approaching pose #############################
@@ -1891,7 +2072,7 @@ class Planner(object):
                 continue
             ### check labels
             isConfigValid, FLAG, objectCollided_approaching = \
-                self.checkConfig_CollisionBetweenRobotAndStaticObjects_labeled(robot, cylinder_positions_geometries)
+                self.checkConfig_CollisionBetweenRobotAndCandidates_labeled(robot, cylinder_position_candidates)
             print("Labels for approaching pose: ", objectCollided_approaching)
 
             ############### congrats! temporarily save this pose ###############
@@ -1928,90 +2109,104 @@ class Planner(object):
     ###################################################################################################################
     
     ###################################################################################################################
-    def generateConfigBasedOnPose_initialPositions(self, pose, robot, workspace, armType, cylinder_positions_geometries):
+    def generateConfigBasedOnPose_initialPositions(self, pose, robot, workspace, armType, cylinder_position_candidates,
+                                                        max_trials=10, first_trial=0):
         ### This function generates IK for a pose and check the IK
         ### in term of reachablity, essential collisions, as well as labels
         ### Input: pose: [[x,y,z],[x,y,z,w]]
         ###        armType: "Left(torso)" or "Right(torso)"
+        ###        max_trials: #IK trials before giving up, trial i is warm started from
+        ###                    the (first_trial+i+1)-th nearest IK solution of the pose
         ### Output: approaching_config, grasping_config, approaching_label, grasping_label, total_label
 
-        if armType == "Left" or armType == "Left_torso":
-            ee_idx = robot.left_ee_idx
-            first_joint_index = 1
-        if armType == "Right" or armType == "Right_torso":
-            ee_idx = robot.right_ee_idx
-            first_joint_index = 8
-
-        max_trials = 10
-        num_trials = 0
-        isIKValid = False
-        while (not isIKValid) and (num_trials < max_trials):
-            ### initialization
+        isIKValid, singleArmConfig_IK_grasping, singleArmConfig_IK_approaching, grasping_FLAG, approaching_FLAG = \
+            self.calculateValidIK_graspingAndApproaching(pose, robot, workspace, armType, max_trials, first_trial)
+        if not isIKValid:
+            return [],[],set(), set(), set()
+        ### check labels
+        self.setRobotToConfig(singleArmConfig_IK_grasping, robot, armType)
+        isConfigValid, FLAG, objectCollided_grasping = \
+            self.checkConfig_CollisionBetweenRobotAndCandidates_labeled(robot, cylinder_position_candidates)
+        # print("Labels for grasping pose: ", objectCollided_grasping)
+        self.setRobotToConfig(singleArmConfig_IK_approaching, robot, armType)
+        isConfigValid, FLAG, objectCollided_approaching = \
+            self.checkConfig_CollisionBetweenRobotAndCandidates_labeled(robot, cylinder_position_candidates)
+        # print("Labels for approaching pose: ", objectCollided_approaching)
+        self.learnIKSolution(singleArmConfig_IK_grasping, pose, armType)
+        self.learnIKSolution(singleArmConfig_IK_approaching, self.getApproachingPose(pose), armType)
+        return singleArmConfig_IK_approaching, singleArmConfig_IK_grasping, \
+            set(objectCollided_approaching), set(objectCollided_grasping), set(objectCollided_approaching+objectCollided_grasping)
+
+    def calculateValidIK_graspingAndApproaching(self, pose, robot, workspace, armType, max_trials=10, first_trial=0):
+        ### This function tries IKs for a grasping pose and its approaching pose until both are valid
+        ### (reachability + collision with the robot itself and the known geometries, see checkSamplePoseIK)
+        ### trial i is warm started from the (first_trial+i+1)-th nearest IK solution of the grasping pose
+        ### and the approaching IK is warm started from the grasping IK
+        ### Output: isIKValid (bool), grasping_config, approaching_config,
+        ###         the grasping and the approaching FLAG of the last trial (-1 if the approaching pose is not checked)
+        approaching_pose = self.getApproachingPose(pose)
+        grasping_FLAG = -1
+        approaching_FLAG = -1
+        for num_trials in range(max_trials):
             ############################### check grasping pose #############################
-            rest_pose = self.randomRestPose(robot, armType)
-            ### we add rest pose in the IK solver to get as high-quality IK as possible
-            config_IK = p.calculateInverseKinematics(bodyUniqueId=robot.motomanGEO,
-                                    endEffectorLinkIndex=ee_idx,
-                                    targetPosition=pose[0],
-                                    targetOrientation=pose[1],
-                                    lowerLimits=robot.ll, upperLimits=robot.ul, 
-                                    jointRanges=robot.jr, restPoses=rest_pose,
-                                    maxNumIterations=2000, residualThreshold=0.0000001,
-                                    physicsClientId=robot.server)
-            if armType == "Left" or armType == "Right":
-                singleArmConfig_IK_grasping = list(config_IK[first_joint_index:first_joint_index+7])
-            if armType == "Left_torso" or armType == "Right_torso":
-                singleArmConfig_IK_grasping = [config_IK[0]] + list(config_IK[first_joint_index:first_joint_index+7])
+            singleArmConfig_IK_grasping = self.calculateSeededIK(pose, robot, armType, first_trial+num_trials)
             self.setRobotToConfig(singleArmConfig_IK_grasping, robot, armType)
-            # print("grasp IK: ")
-            # print(singleArmConfig_IK_grasping)
-            isIKValid, FLAG = self.checkSamplePoseIK(pose, robot, workspace, armType)
+            isIKValid, grasping_FLAG = self.checkSamplePoseIK(pose, robot, workspace, armType)
+            approaching_FLAG = -1
             if not isIKValid:
-                # print("grasping pose not valid, FLAG: " + str(FLAG))
-                num_trials += 1
                 continue
-            ### check labels
-            isConfigValid, FLAG, objectCollided_grasping = \
-                self.checkConfig_CollisionBetweenRobotAndStaticObjects_labeled(robot, cylinder_positions_geometries)
-            # print("Labels for grasping pose: ", objectCollided_grasping)
-
             ############################### check approaching pose #############################
-            temp_rot_matrix = p.getMatrixFromQuaternion(pose[1])
-            ### local z-axis of the end effector
-            temp_approaching_direction = [temp_rot_matrix[2], temp_rot_matrix[5], temp_rot_matrix[8]]
-            temp_pos = list(np.array(pose[0]) - 0.05*np.array(temp_approaching_direction))
-            new_pose = [temp_pos, pose[1]] ### the quaternion remains the same as input pose
-            q_newPoseIK = p.calculateInverseKinematics(bodyUniqueId=robot.motomanGEO, 
-                                    endEffectorLinkIndex=ee_idx, 
-                                    targetPosition=new_pose[0], 
-                                    targetOrientation=new_pose[1], 
-                                    lowerLimits=robot.ll, upperLimits=robot.ul, 
-                                    jointRanges=robot.jr, restPoses=rest_pose,
-                                    maxNumIterations=2000, residualThreshold=0.0000001,
-                                    physicsClientId=robot.server)
-            if armType == "Left" or armType == "Right":
-                singleArmConfig_IK_approaching = list(q_newPoseIK[first_joint_index:first_joint_index+7])
-            if armType == "Left_torso" or armType == "Right_torso":
-                singleArmConfig_IK_approaching = [q_newPoseIK[0]] + list(q_newPoseIK[first_joint_index:first_joint_index+7])
+            ### the approaching pose is 5cm away, warm start its IK from the grasping IK
+            singleArmConfig_IK_approaching = self.calculateSeededIK(
+                                approaching_pose, robot, armType, seed_config=singleArmConfig_IK_grasping)
             self.setRobotToConfig(singleArmConfig_IK_approaching, robot, armType)
-            # print("approach IK: ")
-            # print(singleArmConfig_IK_approaching)
-            isIKValid, FLAG = self.checkSamplePoseIK(new_pose, robot, workspace, armType)
+            isIKValid, approaching_FLAG = self.checkSamplePoseIK(approaching_pose, robot, workspace, armType)
             if not isIKValid:
-                # print("approaching pose not valid, FLAG: " + str(FLAG))
-                num_trials += 1
                 continue
-            ### check labels
-            isConfigValid, FLAG, objectCollided_approaching = \
-                self.checkConfig_CollisionBetweenRobotAndStaticObjects_labeled(robot, cylinder_positions_geometries)
-            # print("Labels for approaching pose: ", objectCollided_approaching)
+            return True, singleArmConfig_IK_grasping, singleArmConfig_IK_approaching, grasping_FLAG, approaching_FLAG
+        return False, [], [], grasping_FLAG, approaching_FLAG
 
-        ### out of the loop
+    def getApproachingPose(self, pose):
+        ### the approaching pose is 5cm back from the grasping pose along the local z-axis of the end effector
+        temp_rot_matrix = p.getMatrixFromQuaternion(pose[1])
+        temp_approaching_direction = [temp_rot_matrix[2], temp_rot_matrix[5], temp_rot_matrix[8]]
+        temp_pos = list(np.array(pose[0]) - 0.05*np.array(temp_approaching_direction))
+        return [temp_pos, pose[1]] ### the quaternion remains the same as input pose
+
+    def checkConfigPose_initialPositions(self, pose, approaching_config, grasping_config, robot, workspace, armType):
+        ### This function checks if the (cached) approaching and grasping configs
+        ### are still valid IK for a pose (reachability + collision with robot and known geometries)
+        self.setRobotToConfig(grasping_config, robot, armType)
+        isIKValid, FLAG = self.checkSamplePoseIK(pose, robot, workspace, armType)
         if not isIKValid:
-            return [],[],set(), set(), set()
-        else:
-            return singleArmConfig_IK_approaching, singleArmConfig_IK_grasping, \
-                set(objectCollided_approaching), set(objectCollided_grasping), set(objectCollided_approaching+objectCollided_grasping)
+            return False
+        self.setRobotToConfig(approaching_config, robot, armType)
+        isIKValid, FLAG = self.checkSamplePoseIK(self.getApproachingPose(pose), robot, workspace, armType)
+        return isIKValid
+    ###################################################################################################################
+
+    ###################################################################################################################
+    def generateConfigBasedOnPose_candidatesHeadless(self, pose, robot, workspace, armType, cylinder_position_candidates,
+                                                        num_solutions=3, max_rounds=6, max_trials=10):
+        ### This function is the non-interactive version of generateConfigBasedOnPose_candidates
+        ### retry policy: each round makes up to max_trials IK trials for the pose (warm started from
+        ### the next nearest IK solutions), the rounds go on until num_solutions valid IKs are found
+        ### or max_rounds rounds are used
+        ### the IK with the fewest labels (then the fewest grasping labels) is chosen
+        ### Output: approaching_config, grasping_config, approaching_label, grasping_label, total_label
+        ###         and #rounds used
+        solutions = []
+        num_rounds = 0
+        while (len(solutions) < num_solutions) and (num_rounds < max_rounds):
+            num_rounds += 1
+            solution = self.generateConfigBasedOnPose_initialPositions(
+                pose, robot, workspace, armType, cylinder_position_candidates, max_trials, (num_rounds-1)*max_trials)
+            if solution[0] != []:
+                solutions.append(solution)
+        if solutions == []:
+            return [], [], set(), set(), set(), num_rounds
+        best_solution = min(solutions, key=lambda solution: (len(solution[4]), len(solution[3])))
+        return tuple(best_solution) + (num_rounds,)
     ###################################################################################################################
 
     ###################################################################################################################
@@ -2048,26 +2243,37 @@ class Planner(object):
     ###################################################################################################################
 
     ###################################################################################################################
-    def generateAllConfigPoses_startPositions(self, robot, workspace, armType):
+    def generateAllConfigPoses_startPositions(self, robot, workspace, armType, config_poses_generator=None):
+        ### config_poses_generator: a StartConfigPosesGenerator which reuses the cached config poses
+        ### and generates the rest in a process pool (None: generate all of them here, one by one)
         self.object_initial_configPoses = OrderedDict()
-        cylinder_positions_geometries = {
-            candidate.position_idx : candidate.geo for candidate in workspace.candidate_geometries.values()}
+        ### the meshes of the candidates are only created when a labeled check gets close to them
+        cylinder_position_candidates = {
+            candidate.position_idx : candidate for candidate in workspace.candidate_geometries.values()}
+        ### first generate graspingPose candidates with different orientations for each object
+        pose_tasks = []
         for obj_idx, obj_initial_info in workspace.object_initial_infos.items():
-            ### for each object
             self.object_initial_configPoses[obj_idx] = PositionCandidateConfigs(
                                                             workspace.object_initial_infos[obj_idx].position_idx)
-            ### first generate graspingPose candidates with different orientations
             graspingPose_candidates = self.generate_pose_candidates(obj_initial_info.pos, workspace.cylinder_height)
             for pose_id, graspingPose in enumerate(graspingPose_candidates):
-                approaching_config, grasping_config, approaching_label, grasping_label, total_label = \
-                    self.generateConfigBasedOnPose_initialPositions(
-                        graspingPose, robot, workspace, armType, cylinder_positions_geometries)
-                if approaching_config != []:
-                    self.object_initial_configPoses[obj_idx].approaching_configs.append(approaching_config)
-                    self.object_initial_configPoses[obj_idx].grasping_configs.append(grasping_config)
-                    self.object_initial_configPoses[obj_idx].approaching_labels.append(approaching_label)
-                    self.object_initial_configPoses[obj_idx].grasping_labels.append(grasping_label)
-                    self.object_initial_configPoses[obj_idx].total_labels.append(total_label)
+                pose_tasks.append((obj_idx, obj_initial_info.pos, graspingPose))
+        if config_poses_generator != None:
+            config_poses = config_poses_generator.generateConfigPoses(
+                [(object_position, graspingPose) for (obj_idx, object_position, graspingPose) in pose_tasks],
+                self, robot, workspace, armType)
+        else:
+            config_poses = [self.generateConfigBasedOnPose_initialPositions(
+                                graspingPose, robot, workspace, armType, cylinder_position_candidates) \
+                                    for (obj_idx, object_position, graspingPose) in pose_tasks]
+        for (obj_idx, object_position, graspingPose), config_pose in zip(pose_tasks, config_poses):
+            approaching_config, grasping_config, approaching_label, grasping_label, total_label = config_pose
+            if approaching_config != []:
+                self.object_initial_configPoses[obj_idx].approaching_configs.append(approaching_config)
+                self.object_initial_configPoses[obj_idx].grasping_configs.append(grasping_config)
+                self.object_initial_configPoses[obj_idx].approaching_labels.append(approaching_label)
+                self.object_initial_configPoses[obj_idx].grasping_labels.append(grasping_label)
+                self.object_initial_configPoses[obj_idx].total_labels.append(total_label)
         print("========= finish generate all object_initial_configPoses =========")
         ### put the robot back to home configuration please
         robot.resetRobotToHomeConfiguration()
@@ -2079,14 +2285,39 @@ class Planner(object):
         #     print("approaching_labels: " + str(object_initial_configs.approaching_labels))
         #     print("grasping_labels: " + str(object_initial_configs.grasping_labels))
         #     print("total_labels: " + str(object_initial_configs.total_labels))
-        #     print("\n")        
+        #     print("\n")
+
+    def getAllConfigPoses_startPositions(self):
+        ### the config poses of the start positions as plain lists (e.g., to be stored in an instance corpus)
+        ### obj_idx (key): (approaching_configs, grasping_configs, approaching_labels, grasping_labels, total_labels)
+        config_poses = OrderedDict()
+        for obj_idx, object_initial_configs in self.object_initial_configPoses.items():
+            config_poses[obj_idx] = (
+                object_initial_configs.approaching_configs, object_initial_configs.grasping_configs,
+                object_initial_configs.approaching_labels, object_initial_configs.grasping_labels,
+                object_initial_configs.total_labels)
+        return config_poses
+
+    def setAllConfigPoses_startPositions(self, workspace, config_poses):
+        ### set the config poses of the start positions precomputed for the current instance
+        ### (see getAllConfigPoses_startPositions) instead of generating them
+        self.object_initial_configPoses = OrderedDict()
+        for obj_idx, obj_initial_info in workspace.object_initial_infos.items():
+            self.object_initial_configPoses[obj_idx] = PositionCandidateConfigs(obj_initial_info.position_idx)
+            approaching_configs, grasping_configs, approaching_labels, grasping_labels, total_labels = config_poses[obj_idx]
+            self.object_initial_configPoses[obj_idx].approaching_configs = list(approaching_configs)
+            self.object_initial_configPoses[obj_idx].grasping_configs = list(grasping_configs)
+            self.object_initial_configPoses[obj_idx].approaching_labels = list(approaching_labels)
+            self.object_initial_configPoses[obj_idx].grasping_labels = list(grasping_labels)
+            self.object_initial_configPoses[obj_idx].total_labels = list(total_labels)
     ###################################################################################################################
 
     #########################################################################################
     def generatePosesForAllCandidates(self, robot, workspace, armType):
         self.position_candidates_configPoses = OrderedDict()
-        cylinder_positions_geometries = {
-            candidate.position_idx : candidate.geo for candidate in workspace.candidate_geometries.values()}
+        ### the meshes of the candidates are only created when a labeled check gets close to them
+        cylinder_position_candidates = {
+            candidate.position_idx : candidate for candidate in workspace.candidate_geometries.values()}
         for candidate_idx, cylinder_candidate in workspace.candidate_geometries.items():
             print("++++++++++++++CANDIDATE_IDX: " + str(candidate_idx) + "++++++++++++++")
             self.position_candidates_configPoses[candidate_idx] = PositionCandidateConfigs(candidate_idx)
@@ -2095,7 +2326,7 @@ class Planner(object):
             for pose_id, graspingPose in enumerate(graspingPose_candidates):
                 approaching_config, grasping_config, approaching_label, grasping_label, total_label = \
                     self.generateConfigBasedOnPose_candidates(
-                        graspingPose, robot, workspace, armType, cylinder_positions_geometries)
+                        graspingPose, robot, workspace, armType, cylinder_position_candidates)
                 if approaching_config != []:
                     self.position_candidates_configPoses[candidate_idx].approaching_configs.append(approaching_config)
                     self.position_candidates_configPoses[candidate_idx].grasping_configs.append(grasping_config)
@@ -2123,8 +2354,9 @@ class Planner(object):
 
     #########################################################################################
     def generatePoses_IKdataSet(self, robot, workspace, armType):
-        cylinder_positions_geometries = {
-            candidate.position_idx : candidate.geo for candidate in workspace.candidate_geometries.values()}
+        ### the meshes of the candidates are only created when a labeled check gets close to them
+        cylinder_position_candidates = {
+            candidate.position_idx : candidate for candidate in workspace.candidate_geometries.values()}
         generateMore = True
         while(generateMore):
             candidate_idx = int(input('which candidate_idx are you interested?'))
@@ -2135,7 +2367,7 @@ class Planner(object):
             for pose_id, graspingPose in enumerate(graspingPose_candidates):
                 approaching_config, grasping_config, approaching_label, grasping_label, total_label = \
                     self.generateConfigBasedOnPose_candidates(
-                        graspingPose, robot, workspace, armType, cylinder_positions_geometries)
+                        graspingPose, robot, workspace, armType, cylinder_position_candidates)
 
             generateMore = True if input('generate more? (y/n)') == 'y' else False
     #########################################################################################
@@ -2145,76 +2377,51 @@ class Planner(object):
         pickle.dump(self.position_candidates_configPoses, f_candidate_geometries)
 
     def deserializeCandidatesConfigPoses(self):
+        if not os.path.exists(self.roadmapFolder+"/CandidatesConfigPoses.obj"):
+            ### the database is not built yet (see generate_poses_for_all_candidates.py)
+            rospy.logwarn("CandidatesConfigPoses.obj is not found in %s", self.roadmapFolder)
+            self.position_candidates_configPoses = OrderedDict()
+            return
         f_candidate_geometries = open(self.roadmapFolder+"/CandidatesConfigPoses.obj", 'rb')
         self.position_candidates_configPoses = pickle.load(f_candidate_geometries)
 
     #########################################################################################
-    ### ATTENTION: THE FUNCTION BELOW IS NOT USED AND THUS NOT BEING MAINTAINED AT THIS POINT
-    def calculateReachabilityMap(self, robot, workspace, orientation, placeholder_shape="cylinder"):
-        ### calculate the reachability map for a particular orientation
-        ### mark with the shape of different color specified
-        ### Input: orientation is a format of quaternion (x,y,z,w)
-        ### set up the two dictionaries as the mapping
-        flag_color = {
-            0: [0,1,0,1],
-            1: [1,0,0,1],
-            2: [0,0,1,1],
-            3: [1,1,0,1]
-        }
-        obj_idx = 0
-        for object_pos in workspace.all_goal_positions.values():
-            print("current obj_idx: {}".format(obj_idx))
-            temp_pos = copy.deepcopy(object_pos)
-            temp_pos[2] = object_pos[2] + workspace.cylinder_height/2 - 0.03
-            target_pose = [temp_pos, orientation]
-            ### first check the pose
-            isPoseValid, FLAG, configToPickingPose = self.generateConfigBasedOnPose(
-                        target_pose, obj_idx, robot, workspace, "Right_torso")
-            if not isPoseValid:
-                print("the pose is not valid")
-                if placeholder_shape == "cylinder":
-                    temp_placeholder_v = p.createVisualShape(shapeType=p.GEOM_CYLINDER,
-                        radius=workspace.cylinder_radius, length=workspace.cylinder_height, 
-                        rgbaColor=flag_color[FLAG], physicsClientId=self.planningServer)
-                if placeholder_shape == "sphere":
-                    temp_placeholder_v = p.createVisualShape(shapeType=p.GEOM_SPHERE,
-                        radius=0.005, rgbaColor=flag_color[FLAG], physicsClientId=self.planningServer)
-                temp_placeholderM = p.createMultiBody(
-                    baseVisualShapeIndex=temp_placeholder_v, basePosition=object_pos, physicsClientId=self.planningServer)
-            else:
-                ### then check the pre-grasp pose
-                isPoseValid, FLAG, prePickingPose, configToPrePickingPose = \
-                    self.generatePrePickingPose(
-                        target_pose, obj_idx, robot, workspace, "Right_torso")
-                if not isPoseValid:
-                    print("the pre-picking pose is not valid")
-                    if placeholder_shape == "cylinder":
-                        temp_placeholder_v = p.createVisualShape(shapeType=p.GEOM_CYLINDER,
-                            radius=workspace.cylinder_radius, length=workspace.cylinder_height, 
-                            rgbaColor=flag_color[FLAG], physicsClientId=self.planningServer)
-                    if placeholder_shape == "sphere":
-                        temp_placeholder_v = p.createVisualShape(shapeType=p.GEOM_SPHERE,
-                            radius=0.005, rgbaColor=flag_color[FLAG], physicsClientId=self.planningServer)
-                    temp_placeholderM = p.createMultiBody(
-                        baseVisualShapeIndex=temp_placeholder_v, basePosition=object_pos, physicsClientId=self.planningServer)
-            if isPoseValid:
-                print("both picking and pre-picking poses are valid")
-                if placeholder_shape == "cylinder":
-                    temp_placeholder_v = p.createVisualShape(shapeType=p.GEOM_CYLINDER,
-                        radius=workspace.cylinder_radius, length=workspace.cylinder_height, 
-                        rgbaColor=flag_color[FLAG], physicsClientId=self.planningServer)
-                if placeholder_shape == "sphere":
-                    temp_placeholder_v = p.createVisualShape(shapeType=p.GEOM_SPHERE,
-                        radius=0.005, rgbaColor=flag_color[FLAG], physicsClientId=self.planningServer)
-                temp_placeholderM = p.createMultiBody(
-                    baseVisualShapeIndex=temp_placeholder_v, basePosition=object_pos, physicsClientId=self.planningServer)
-            print("finish the object {}".format(obj_idx))
-            obj_idx += 1
-            input("press to continue")
-        ### out of the loop
-        robot.resetArmConfig_torso(
-            robot.leftArmHomeConfiguration+robot.rightArmHomeConfiguration, robot.torsoHomeConfiguration)
-        time.sleep(10000)
+    def getReachabilityMapFile(self, armType):
+        return self.roadmapFolder + "/ReachabilityMap_" + str(armType) + ".npz"
+
+    def loadReachabilityMap(self, workspace, armType):
+        ### the map is ignored if it is not built yet (see generate_reachability_map.py)
+        ### or built for other position candidates/orientations (e.g., the workspace parameters changed)
+        self.reachability_map = None
+        mapFile = self.getReachabilityMapFile(armType)
+        if not os.path.exists(mapFile):
+            rospy.logwarn("%s is not found, the reachability map is not used", mapFile)
+            return
+        reachability_map = ReachabilityMap.load(mapFile)
+        if not reachability_map.isConsistent(getCandidatePositions(workspace), self.generateOrientations()):
+            rospy.logwarn("%s does not match the current workspace, the reachability map is not used", mapFile)
+            return
+        self.reachability_map = reachability_map
+
+    def checkPoseReachability_candidates(self, pose, robot, workspace, armType, cylinder_position_candidates, max_trials=10):
+        ### This function checks whether a grasping pose (and its approaching pose) has a valid IK
+        ### in terms of reachability and collision with the robot itself and the known geometries
+        ### (the reachability map entry of a position candidate x orientation)
+        ### cylinder_position_candidates: a dictionary {position_idx : CylinderCandidate}
+        ### Output: isReachable (bool), the grasping and the approaching FLAG of the last trial
+        ###         (-1 if the approaching pose is not checked), the labels (a set) of the valid IK
+        isReachable, singleArmConfig_IK_grasping, singleArmConfig_IK_approaching, grasping_FLAG, approaching_FLAG = \
+            self.calculateValidIK_graspingAndApproaching(pose, robot, workspace, armType, max_trials)
+        if not isReachable:
+            return False, grasping_FLAG, approaching_FLAG, set()
+        ### check labels
+        self.setRobotToConfig(singleArmConfig_IK_grasping, robot, armType)
+        isConfigValid, FLAG, objectCollided_grasping = \
+            self.checkConfig_CollisionBetweenRobotAndCandidates_labeled(robot, cylinder_position_candidates)
+        self.setRobotToConfig(singleArmConfig_IK_approaching, robot, armType)
+        isConfigValid, FLAG, objectCollided_approaching = \
+            self.checkConfig_CollisionBetweenRobotAndCandidates_labeled(robot, cylinder_position_candidates)
+        return True, grasping_FLAG, approaching_FLAG, set(objectCollided_approaching + objectCollided_grasping)
     #########################################################################################
 
 
@@ -83,6 +83,12 @@ class PybulletExecutionScene(object):
         self.executor_e = Executor(self.executingClientID,
             isObjectInLeftHand=False, isObjectInRightHand=False,
             objectInLeftHand=None, objectInRightHand=None)
+        ### (optional) time parameterization of the executed trajectories
+        self.executor_e.setTimeParameterization(
+            rospy.get_param('/trajectory_execution/isTimeParameterized', False),
+            rospy.get_param('/trajectory_execution/max_joint_velocity', 1.0),
+            rospy.get_param('/trajectory_execution/max_joint_acceleration', 2.0),
+            rospy.get_param('/trajectory_execution/control_rate', 30.0))
 
 
     def configureMotomanRobot(self, 
@@ -183,7 +189,7 @@ class PybulletExecutionScene(object):
         ### given the request data: an ArmTrajectory object
         ### execute the trajectory on a specified arm
         self.executor_e.executeTrajectory(
-            req.arm_trajectory.trajectory, self.robot_e, req.arm_trajectory.armType)
+            req.arm_trajectory.trajectory, self.robot_e, req.arm_trajectory.armType, req.arm_trajectory.isSparse)
         return ExecuteTrajectoryResponse(True)
 
     def attach_object_callback(self, req):
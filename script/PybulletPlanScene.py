@@ -23,6 +23,11 @@ from MotomanRobot import MotomanRobot
 from WorkspaceTable import WorkspaceTable
 from Planner import Planner
 from Planner import PositionCandidateConfigs
+from StartConfigPoses import StartConfigPosesGenerator
+from InstanceCorpus import InstanceCorpusReader, isCorpusConsistent
+from GraspOrdering import GraspOrderingStats
+from TrajectoryInterpolation import densifyObjectRearrangePath, getArmTrajectoryWaypoints
+from TrajectoryInterpolation import getStraightLineCorners, getPathLength
 import utils
 
 from uniform_object_rearrangement.msg import ArmTrajectory
@@ -32,7 +37,9 @@ from uniform_object_rearrangement.msg import ObjArrStates
 from uniform_object_rearrangement.srv import ReproduceInstanceCylinder, ReproduceInstanceCylinderResponse
 from uniform_object_rearrangement.srv import GenerateConfigsForStartPositions, GenerateConfigsForStartPositionsResponse
 from uniform_object_rearrangement.srv import DetectInvalidArrStates, DetectInvalidArrStatesResponse
-from uniform_object_rearrangement.srv import RearrangeCylinderObject, RearrangeCylinderObjectResponse
+from uniform_object_rearrangement.srv import RearrangeCylinderObject, RearrangeCylinderObjectRequest, RearrangeCylinderObjectResponse
+from uniform_object_rearrangement.srv import BatchRearrangeCylinderObjects, BatchRearrangeCylinderObjectsResponse
+from uniform_object_rearrangement.srv import CheckRearrangementFeasibility, CheckRearrangementFeasibilityResponse
 from uniform_object_rearrangement.srv import GetCurrRobotConfig, GetCurrRobotConfigResponse
 from uniform_object_rearrangement.srv import UpdateCertainObjectPose, UpdateCertainObjectPoseResponse
 from uniform_object_rearrangement.srv import ResetRobotCurrConfig, ResetRobotCurrConfigResponse
@@ -42,6 +49,10 @@ from uniform_object_rearrangement.srv import SelectObjectAndBuffer, SelectObject
 from uniform_object_rearrangement.srv import ResetPlanningInstance, ResetPlanningInstanceResponse
 from uniform_object_rearrangement.srv import ClearPlanningInstance, ClearPlanningInstanceResponse
 from uniform_object_rearrangement.srv import ResetRobotHome, ResetRobotHomeResponse
+from uniform_object_rearrangement.srv import TakeSceneSnapshot, TakeSceneSnapshotResponse
+from uniform_object_rearrangement.srv import RestoreSceneSnapshot, RestoreSceneSnapshotResponse
+from uniform_object_rearrangement.srv import ReleaseSceneSnapshots, ReleaseSceneSnapshotsResponse
+from uniform_object_rearrangement.srv import ShortcutObjectPath, ShortcutObjectPathResponse
 
 ################################## description #####################################
 ### This class defines a PybulletPlanScene class which
@@ -80,8 +91,16 @@ class PybulletPlanScene(object):
         self.rosPackagePath = rospack.get_path("uniform_object_rearrangement")
 	
         ### set the server for the pybullet plan scene
-        # self.planningClientID = p.connect(p.DIRECT)
-        self.planningClientID = p.connect(p.GUI)
+        ### a worker plan scene (e.g., for the parallel planner) is launched
+        ### with the "direct" argument and runs without GUI
+        if "direct" in args[1:]:
+            self.planningClientID = p.connect(p.DIRECT)
+        else:
+            self.planningClientID = p.connect(p.GUI)
+        ### a plan scene launched with the "sparse" argument returns sparse trajectories
+        ### (the waypoints of the smoothed paths) for the object rearrangement during the search,
+        ### which are only densified for the harvested solution (see TrajectoryInterpolation.py)
+        self.isTrajectorySparse = ("sparse" in args[1:])
         # p.setAdditionalSearchPath(pybullet_data.getDataPath())
         # self.egl_plugin = p.loadPlugin(egl.get_filename(), "_eglRendererPlugin")
         # print("plugin=", self.egl_plugin)
@@ -102,6 +121,30 @@ class PybulletPlanScene(object):
             self.rosPackagePath, self.planningClientID,
             isObjectInLeftHand=False, isObjectInRightHand=False,
             objectInLeftHand=None, objectInRightHand=None)
+        ### debug: with the "visualize_trajectory" argument, the robot is driven through
+        ### every waypoint of the generated trajectories in the plan scene
+        self.planner_p.isTrajectoryVisualized = ("visualize_trajectory" in args[1:])
+        ### the reachability map of the position candidates prunes the unreachable buffers
+        self.planner_p.loadReachabilityMap(self.workspace_p, "Right_torso")
+
+        ### the snapshots of the plan scene which can be restored in one call
+        ### key: snapshot_id, value: [pybullet state id, robot config, objects state, manipulation status]
+        self.scene_snapshots = OrderedDict()
+        self.snapshot_idx = 0
+
+        ### the generator of the config poses of the start positions (cached + process pool),
+        ### which is set up when the config poses are generated for the first time
+        self.start_config_poses_generator = None
+        ### the readers of the instance corpora keyed by the corpus files, which hold the
+        ### config poses of the start positions precomputed for the benchmark instances
+        self.corpus_readers = {}
+
+        ### the candidate grasps of a position are tried in the order of their expected costs
+        ### learned from the past attempts (see GraspOrdering.py)
+        self.grasp_ordering = GraspOrderingStats(
+            os.path.join(self.planner_p.roadmapFolder, "GraspOrderingStats.obj"),
+            rospy.get_param("/grasp_ordering/save_interval", 20),
+            rospy.get_param("/grasp_ordering/isOrderingUsed", False))
 
 
     def configureMotomanRobot(self, 
@@ -135,6 +178,14 @@ class PybulletPlanScene(object):
             "rearrange_cylinder_object", RearrangeCylinderObject,
             self.rearrange_cylinder_object_callback)
 
+        self.batch_rearrange_cylinder_objects_server = rospy.Service(
+            "batch_rearrange_cylinder_objects", BatchRearrangeCylinderObjects,
+            self.batch_rearrange_cylinder_objects_callback)
+
+        self.check_rearrangement_feasibility_server = rospy.Service(
+            "check_rearrangement_feasibility", CheckRearrangementFeasibility,
+            self.check_rearrangement_feasibility_callback)
+
         self.generate_configs_for_start_positions_server = rospy.Service(
             "generate_configs_for_start_positions", GenerateConfigsForStartPositions,
             self.generate_configs_for_start_positions_callback)
@@ -179,6 +230,22 @@ class PybulletPlanScene(object):
             "reset_robot_home", ResetRobotHome,
             self.reset_robot_home_callback)
 
+        self.take_scene_snapshot_server = rospy.Service(
+            "take_scene_snapshot", TakeSceneSnapshot,
+            self.take_scene_snapshot_callback)
+
+        self.restore_scene_snapshot_server = rospy.Service(
+            "restore_scene_snapshot", RestoreSceneSnapshot,
+            self.restore_scene_snapshot_callback)
+
+        self.release_scene_snapshots_server = rospy.Service(
+            "release_scene_snapshots", ReleaseSceneSnapshots,
+            self.release_scene_snapshots_callback)
+
+        self.shortcut_object_path_server = rospy.Service(
+            "shortcut_object_path", ShortcutObjectPath,
+            self.shortcut_object_path_callback)
+
         rospy.init_node("pybullet_plan_scene", anonymous=True)
 
 
@@ -195,9 +262,43 @@ class PybulletPlanScene(object):
 
     def generate_configs_for_start_positions_callback(self, req):
         rospy.logwarn("GENERATE CONFIGS FOR START POSITIONS OF ALL OBJECTS")
-        self.planner_p.generateAllConfigPoses_startPositions(self.robot_p, self.workspace_p, req.armType)
+        if (req.corpus_file != "") and self.loadConfigPosesFromCorpus(req.corpus_file, req.instance_id):
+            return GenerateConfigsForStartPositionsResponse(True)
+        if self.start_config_poses_generator == None:
+            self.start_config_poses_generator = StartConfigPosesGenerator(
+                os.path.join(self.planner_p.roadmapFolder, "StartConfigPosesCache.obj"),
+                rospy.get_param("/start_config_poses/num_processes", 0),
+                rospy.get_param("/start_config_poses/cache_resolution", 0.005))
+        self.planner_p.generateAllConfigPoses_startPositions(
+            self.robot_p, self.workspace_p, req.armType, self.start_config_poses_generator)
         return GenerateConfigsForStartPositionsResponse(True)
 
+    def loadConfigPosesFromCorpus(self, corpusFile, instance_id):
+        ### set the config poses of the start positions precomputed in the instance corpus
+        ### return False if the corpus does not have them for the current instance
+        ### (the corpus is built for other workspace parameters or other start positions)
+        if (corpusFile in self.corpus_readers) and self.corpus_readers[corpusFile].isOutdated():
+            self.corpus_readers.pop(corpusFile).close()
+        if corpusFile not in self.corpus_readers:
+            if not os.path.exists(corpusFile):
+                rospy.logwarn("the instance corpus {} does not exist".format(corpusFile))
+                return False
+            self.corpus_readers[corpusFile] = InstanceCorpusReader(corpusFile)
+        corpus_reader = self.corpus_readers[corpusFile]
+        if not isCorpusConsistent(corpus_reader.header, self.workspace_p.candidate_positions):
+            rospy.logwarn("the instance corpus {} is built for other workspace parameters".format(corpusFile))
+            return False
+        corpus_instance = corpus_reader.getInstance(instance_id)
+        if (corpus_instance == None) or (corpus_instance.config_poses == None) or \
+                (len(corpus_instance.positions) != len(self.workspace_p.object_initial_infos)) or \
+                any([np.max(np.abs(np.array(corpus_instance.positions[obj_idx]) - np.array(obj_initial_info.pos))) > 1e-6 \
+                        for obj_idx, obj_initial_info in self.workspace_p.object_initial_infos.items()]):
+            rospy.logwarn("no config poses of the instance {} in the instance corpus {}".format(instance_id, corpusFile))
+            return False
+        self.planner_p.setAllConfigPoses_startPositions(self.workspace_p, corpus_instance.config_poses)
+        print("config poses of the start positions loaded from the instance corpus")
+        return True
+
     def detect_invalid_arr_states_callback(self, req):
         rospy.logwarn("DETECT INVALID ARR STATES")
         ### data initialization
@@ -222,8 +323,8 @@ class PybulletPlanScene(object):
             ##################################################################################
             ##################################################################################
             ### get the object's all placing configPoses
-            target_object_configPoses = \
-                self.planner_p.position_candidates_configPoses[req.target_arrangement[obj_idx]]
+            target_object_configPoses = self.planner_p.obtainTargetObjectConfigPoses(
+                self.workspace_p, obj_idx, req.target_arrangement[obj_idx])
             ### get placing_configPoses_constraints (a list of list of objects) for this object
             placing_configPoses_constraints = self.planner_p.getConstraintsFromLabels(
                 target_object_configPoses, obj_idx, req.target_arrangement, "placing")
@@ -302,12 +403,52 @@ class PybulletPlanScene(object):
         self.planner_p.detachObject(self.workspace_p, self.robot_p, req.armType)
         return SetSceneBasedOnArrangementResponse(True)
 
+    def shortcut_object_path_callback(self, req):
+        ### shortcut the transit (nothing in hand) and the transfer (the object in hand)
+        ### trajectories of an object path within req.time_allowed,
+        ### the finish trajectory (post-placing) is a cartesian move which is kept as it is
+        start_time = time.time()
+        snapshot_id = self.takeSceneSnapshot()
+        self.set_scene_basedOn_arrangement_callback(req)
+        path = densifyObjectRearrangePath(req.path)
+        ### (i) transit: the last segment (the move to pick the object) is kept
+        currConfig = self.robot_p.getRobotCurrSingleArmConfig(req.armType)
+        transit_waypoints = getArmTrajectoryWaypoints(path.transit_trajectory, currConfig)
+        shortcut_transit, num_transit_shortcuts = self.planner_p.shortcutPath(
+            transit_waypoints, self.robot_p, self.workspace_p, req.armType,
+            req.time_allowed / 2, isLastSegmentFixed=True)
+        ### (ii) transfer: attach the object at the picking config,
+        ### the first and the last segments (the moves to lift and place the object) are kept
+        self.planner_p.setRobotToConfig(transit_waypoints[-1], self.robot_p, req.armType)
+        self.planner_p.attachObject(path.object_idx, self.workspace_p, self.robot_p, req.armType)
+        transfer_waypoints = getArmTrajectoryWaypoints(path.transfer_trajectory, transit_waypoints[-1])
+        shortcut_transfer, num_transfer_shortcuts = self.planner_p.shortcutPath(
+            transfer_waypoints, self.robot_p, self.workspace_p, req.armType,
+            req.time_allowed - (time.time() - start_time), isFirstSegmentFixed=True, isLastSegmentFixed=True)
+        self.planner_p.detachObject(self.workspace_p, self.robot_p, req.armType)
+        finish_waypoints = getArmTrajectoryWaypoints(path.finish_trajectory, transfer_waypoints[-1])
+        finish_waypoints = [finish_waypoints[i] for i in getStraightLineCorners(finish_waypoints)]
+        self.restoreSceneSnapshot(snapshot_id, release=True)
+
+        object_path = ObjectRearrangePath()
+        object_path.transit_trajectory = self.generateArmTrajectory(
+                    shortcut_transit, req.armType, self.robot_p.motomanRJointNames, isSparse=True)
+        object_path.transfer_trajectory = self.generateArmTrajectory(
+                    shortcut_transfer, req.armType, self.robot_p.motomanRJointNames, isSparse=True)
+        object_path.finish_trajectory = self.generateArmTrajectory(
+                    finish_waypoints, req.armType, self.robot_p.motomanRJointNames, isSparse=True)
+        object_path.object_idx = path.object_idx
+        length_before = getPathLength(transit_waypoints) + getPathLength(transfer_waypoints) + getPathLength(finish_waypoints)
+        length_after = getPathLength(shortcut_transit) + getPathLength(shortcut_transfer) + getPathLength(finish_waypoints)
+        return ShortcutObjectPathResponse(True, object_path, length_before, length_after)
+
     def select_object_and_buffer_callback(self, req):
         ############################## first select an object ##############################
         object_path = ObjectRearrangePath()
-        if req.heuristic_level == 0:
+        ### heuristic_level 0/2: random object, 1/3: the most constrained object
+        if req.heuristic_level == 0 or req.heuristic_level == 2:
             object_idx = random.choice(list(req.objects_to_move))
-        if req.heuristic_level == 1:
+        if req.heuristic_level == 1 or req.heuristic_level == 3:
             object_ranking = self.workspace_p.getObjectConstraintRanking(req.objects_to_move, req.final_arrangement)
             object_idx = object_ranking[0]
         ### Once select the object, check if it can be reached based on current arrangement
@@ -319,11 +460,15 @@ class PybulletPlanScene(object):
             return SelectObjectAndBufferResponse(transit_success, -1, -1, object_path)
         ####################################################################################
 
-        ### before move on to selecting and putting on a buffer, do some book keeping
-        obj_position_idx_transit = self.workspace_p.object_geometries[object_idx].curr_position_idx
-        robot_config_transit = self.robot_p.getRobotCurrConfig()
+        ### before move on to selecting and putting on a buffer, snapshot the scene at the end of transit
+        transit_snapshot_id = self.takeSceneSnapshot()
 
         ############################### then select a buffer ###############################
+        ### heuristic_level 2/3: the buffers are tried in an order sampled in proportion to their (analytic) scores
+        if req.heuristic_level >= 2:
+            buffer_ranking = self.workspace_p.getBufferRanking(
+                object_idx, req.final_arrangement[object_idx], req.final_arrangement,
+                self.planner_p.position_candidates_configPoses, self.planner_p.reachability_map, isSampled=True)
         ### 3 chances are given for selecting a buffer
         max_trials = 3
         current_trials = 1
@@ -332,8 +477,13 @@ class PybulletPlanScene(object):
             ### select a buffer, which 
             ### (1) is not the current/target position of the selected object
             ### (2) should not collide with any objects other than itself
-            buffer_select_success, buffer_idx = self.workspace_p.selectNoCollisionBuffer(
-                                            object_idx, req.final_arrangement[object_idx])
+            if req.heuristic_level >= 2:
+                buffer_select_success = (len(buffer_ranking) >= current_trials)
+                buffer_idx = buffer_ranking[current_trials-1] if buffer_select_success else -1
+            else:
+                buffer_select_success, buffer_idx = self.workspace_p.selectNoCollisionBuffer(
+                                                object_idx, req.final_arrangement[object_idx],
+                                                self.planner_p.reachability_map, self.planner_p.position_candidates_configPoses)
             if buffer_select_success:
                 ### check the transfer path to the buffer location for that object
                 transfer_success, transfer_traj, finish_traj = \
@@ -344,28 +494,22 @@ class PybulletPlanScene(object):
                     buffer_success = True
                     break
                 else:
-                    ### it does not work, put it back to the end of transit stage
-                    ### (i) put the object back to the end of transit
-                    self.workspace_p.updateObjectMesh(object_idx, obj_position_idx_transit)
-                    ### (ii) put the arm back to the end of transit
-                    self.robot_p.resetArmConfig_torso(robot_config_transit[1:15], robot_config_transit[0])
-                    ### update the hand as well (I doubt it is a redundant step at this point)
-                    self.robot_p.resetRightHandConfig(robot_config_transit[15:21])
-                    ### (iii) update manipulation status
-                    self.planner_p.detachObject(self.workspace_p, self.robot_p, req.armType)
+                    ### it does not work, put the scene back to the end of transit stage
+                    self.restoreSceneSnapshot(transit_snapshot_id)
                     current_trials += 1
                     continue
             else:
                 current_trials += 1
                 continue
         ### reach here either success or not
+        self.releaseSceneSnapshot(transit_snapshot_id)
         if buffer_success == True:
             object_path.transit_trajectory = self.generateArmTrajectory(
-                                transit_traj, req.armType, self.robot_p.motomanRJointNames)
+                                transit_traj, req.armType, self.robot_p.motomanRJointNames, self.isTrajectorySparse)
             object_path.transfer_trajectory = self.generateArmTrajectory(
-                                transfer_traj, req.armType, self.robot_p.motomanRJointNames)
+                                transfer_traj, req.armType, self.robot_p.motomanRJointNames, self.isTrajectorySparse)
             object_path.finish_trajectory = self.generateArmTrajectory(
-                                finish_traj, req.armType, self.robot_p.motomanRJointNames)
+                                finish_traj, req.armType, self.robot_p.motomanRJointNames, self.isTrajectorySparse)
             object_path.object_idx = object_idx
             return SelectObjectAndBufferResponse(buffer_success, object_idx, buffer_idx, object_path)
         else:
@@ -381,6 +525,10 @@ class PybulletPlanScene(object):
         self.planner_p.resetPlannerParams()
         ### (iii) reset the robot back to the home configuration
         self.robot_p.resetRobotToHomeConfiguration()
+        ### (iv) the snapshots of the previous instance are no longer valid
+        self.releaseAllSceneSnapshots()
+        ### (v) save the statistics of the grasps tried in the previous instance
+        self.grasp_ordering.save()
         return ResetPlanningInstanceResponse(True)
 
     def clear_planning_instance_callback(self, req):
@@ -391,6 +539,10 @@ class PybulletPlanScene(object):
         self.planner_p.resetPlannerParams()
         ### (iii) reset the robot back to the home configuration
         self.robot_p.resetRobotToHomeConfiguration()
+        ### (iv) the snapshots of the previous instance are no longer valid
+        self.releaseAllSceneSnapshots()
+        ### (v) save the statistics of the grasps tried in the previous instance
+        self.grasp_ordering.save()
         return ClearPlanningInstanceResponse(True)
 
     def reset_robot_home_callback(self, req):
@@ -432,6 +584,103 @@ class PybulletPlanScene(object):
         ##############################################################################################
         
 
+    def check_rearrangement_feasibility_callback(self, req):
+        ### a cheap precheck of rearrange_cylinder_object: the object can not be rearranged
+        ### if all its picking configs or all placing configs at the target position
+        ### collide with other objects (according to the labels)
+        occupied_labels = set()
+        for obj_idx, object_geometry in self.workspace_p.object_geometries.items():
+            if obj_idx == req.object_idx: continue
+            occupied_labels.add(object_geometry.collision_position_idx)
+        curr_object_configPoses = self.planner_p.obtainCurrObjectConfigPoses(self.workspace_p, req.object_idx)
+        if not self.planner_p.checkLabelFeasibility(curr_object_configPoses, occupied_labels, "picking"):
+            return CheckRearrangementFeasibilityResponse(False)
+        target_object_configPoses = self.planner_p.obtainTargetObjectConfigPoses(
+                                    self.workspace_p, req.object_idx, req.target_position_idx)
+        if not self.planner_p.checkLabelFeasibility(target_object_configPoses, occupied_labels, "placing"):
+            return CheckRearrangementFeasibilityResponse(False)
+        return CheckRearrangementFeasibilityResponse(True)
+
+    def batch_rearrange_cylinder_objects_callback(self, req):
+        ### try to rearrange the objects one at a time (in order) from the current scene
+        ### the scene is snapshotted before each attempt and restored after a failed attempt
+        ### (or after every attempt if stopAtFirstSuccess is false)
+        start_time = time.time()
+        success_list = []
+        paths = []
+        kept_snapshot_id = -1
+        for object_idx, target_position_idx in zip(req.object_indices, req.target_position_indices):
+            if (len(success_list) != 0) and (time.time() - start_time >= req.time_allowed):
+                break
+            snapshot_id = self.takeSceneSnapshot()
+            rearrange_req = RearrangeCylinderObjectRequest()
+            rearrange_req.object_idx = object_idx
+            rearrange_req.target_position_idx = target_position_idx
+            rearrange_req.armType = req.armType
+            rearrange_req.isLabeledRoadmapUsed = req.isLabeledRoadmapUsed
+            rearrange_success, object_path = self.rearrange_cylinder_object(rearrange_req)
+            enablePrint()
+            success_list.append(rearrange_success)
+            if rearrange_success and req.returnPaths:
+                paths.append(object_path)
+            else:
+                paths.append(ObjectRearrangePath())
+            if rearrange_success and req.stopAtFirstSuccess:
+                if req.keepSnapshot:
+                    kept_snapshot_id = snapshot_id
+                else:
+                    self.releaseSceneSnapshot(snapshot_id)
+                break
+            self.restoreSceneSnapshot(snapshot_id, release=True)
+        return BatchRearrangeCylinderObjectsResponse(success_list, paths, kept_snapshot_id)
+
+    def takeSceneSnapshot(self):
+        ### snapshot the physics state (p.saveState) as well as the states kept outside pybullet
+        ### (the robot config, the object positions and the attach state of the planner)
+        ### the candidate meshes are created lazily, the snapshot records which ones exist
+        ### since the saved state only matches the bodies existing when it is saved
+        state_id = p.saveState(physicsClientId=self.planningClientID)
+        self.snapshot_idx += 1
+        self.scene_snapshots[self.snapshot_idx] = [state_id, self.robot_p.getRobotCurrConfig(), \
+            self.workspace_p.getObjectsState(), self.planner_p.getManipulationStatus(), \
+            self.workspace_p.getCandidatesWithMesh()]
+        return self.snapshot_idx
+
+    def restoreSceneSnapshot(self, snapshot_id, release=False):
+        if snapshot_id not in self.scene_snapshots:
+            return False
+        state_id, robot_config, objects_state, manipulation_status, candidates_with_mesh = \
+                                                                    self.scene_snapshots[snapshot_id]
+        self.workspace_p.setCandidatesWithMesh(candidates_with_mesh)
+        p.restoreState(state_id, physicsClientId=self.planningClientID)
+        self.robot_p.resetArmConfig_torso(robot_config[1:15], robot_config[0])
+        self.robot_p.resetRightHandConfig(robot_config[15:21])
+        self.workspace_p.setObjectsState(objects_state)
+        self.planner_p.setManipulationStatus(manipulation_status)
+        if release:
+            self.releaseSceneSnapshot(snapshot_id)
+        return True
+
+    def releaseSceneSnapshot(self, snapshot_id):
+        if snapshot_id in self.scene_snapshots:
+            p.removeState(self.scene_snapshots[snapshot_id][0], physicsClientId=self.planningClientID)
+            del self.scene_snapshots[snapshot_id]
+
+    def releaseAllSceneSnapshots(self):
+        for snapshot_id in list(self.scene_snapshots.keys()):
+            self.releaseSceneSnapshot(snapshot_id)
+
+    def take_scene_snapshot_callback(self, req):
+        return TakeSceneSnapshotResponse(self.takeSceneSnapshot())
+
+    def restore_scene_snapshot_callback(self, req):
+        return RestoreSceneSnapshotResponse(self.restoreSceneSnapshot(req.snapshot_id, req.release))
+
+    def release_scene_snapshots_callback(self, req):
+        for snapshot_id in req.snapshot_ids:
+            self.releaseSceneSnapshot(snapshot_id)
+        return ReleaseSceneSnapshotsResponse(True)
+
     def rearrange_cylinder_object_callback(self, req):
         rearrange_success, object_manipulation_path = self.rearrange_cylinder_object(req)
         return RearrangeCylinderObjectResponse(rearrange_success, object_manipulation_path)
@@ -450,8 +699,10 @@ class PybulletPlanScene(object):
         currConfig = self.robot_p.getRobotCurrSingleArmConfig(req.armType)
         ############################# select the right picking pose until it works #############################
         transit_success = False
-        for config_id in range(len(curr_object_configPoses.grasping_configs)):
+        for config_id in self.grasp_ordering.getOrder("pick", curr_object_configPoses.grasping_configs):
             configToPickingPose = curr_object_configPoses.grasping_configs[config_id]
+            self.grasp_ordering.startAttempt("pick", configToPickingPose,
+                isSaved=(curr_object_configPoses.position_idx < self.workspace_p.num_candidates))
             ############## check the collision of the selected configToPickingPose ##############
             self.planner_p.setRobotToConfig(configToPickingPose, self.robot_p, req.armType)
             # isConfigValid, FLAG = self.planner_p.checkConfig_AllCollisions(self.robot_p, self.workspace_p, req.armType)
@@ -511,17 +762,17 @@ class PybulletPlanScene(object):
             prePicking_traj = self.planner_p.AstarPathFinding(currConfig, configToPrePickingPose, 
                                 currConfig_neighbors_idx, currConfig_neighbors_cost, 
                                 prePickingPose_neighbors_idx, prePickingPose_neighbors_cost, 
-                                self.robot_p, self.workspace_p, req.armType, req.isLabeledRoadmapUsed)   
+                                self.robot_p, self.workspace_p, req.armType, req.isLabeledRoadmapUsed, self.isTrajectorySparse)
             ### the planning has been finished, either success or failure
             if prePicking_traj != []:
                 print("The transit (pre-picking) path for %s arm is successfully found" % req.armType)
-                transit_traj += prePicking_traj
+                transit_traj = self.initTrajectory(currConfig) + prePicking_traj
                 ################# cartesian path from pre-picking to picking configuration #####################
                 currConfig = self.robot_p.getRobotCurrSingleArmConfig(req.armType)
                 ### you are reaching here since pre-picking has been reached, 
                 ### now get the path from pre-picking to picking
                 prePickToPickTraj = self.planner_p.generateTrajectory_DirectConfigPath(
-                    currConfig, configToPickingPose, self.robot_p, req.armType, self.workspace_p)
+                    currConfig, configToPickingPose, self.robot_p, req.armType, self.workspace_p, self.isTrajectorySparse)
                 transit_traj += prePickToPickTraj
                 #################################################################################################
                 transit_success = True
@@ -532,6 +783,7 @@ class PybulletPlanScene(object):
                 continue
             ###########################################################################################
 
+        self.grasp_ordering.finishAttempt(transit_success)
         if not transit_success:
             print("No picking pose is qualified, either failed (1) picking pose (2) pre-picking pose (3) planning to pre-picking")
             return False, object_path
@@ -542,12 +794,20 @@ class PybulletPlanScene(object):
         self.planner_p.attachObject(req.object_idx, self.workspace_p, self.robot_p, req.armType)
         #######################################################################################################        
 
-        target_object_configPoses = self.planner_p.position_candidates_configPoses[req.target_position_idx]
+        target_object_configPoses = self.planner_p.obtainTargetObjectConfigPoses(
+                                    self.workspace_p, req.object_idx, req.target_position_idx)
+        if req.target_position_idx >= self.workspace_p.num_candidates:
+            ### the object is placed back to its initial position
+            target_collision_position_idx = self.workspace_p.object_initial_infos[req.object_idx].collision_position_idx
+        else:
+            target_collision_position_idx = req.target_position_idx
         currConfig = self.robot_p.getRobotCurrSingleArmConfig(req.armType)
         ############################# select the right placing pose until it works #############################
         transfer_success = False
-        for config_id in range(len(target_object_configPoses.grasping_configs)):
+        for config_id in self.grasp_ordering.getOrder("place", target_object_configPoses.grasping_configs):
             configToPlacingPose = target_object_configPoses.grasping_configs[config_id]
+            self.grasp_ordering.startAttempt("place", configToPlacingPose,
+                isSaved=(target_object_configPoses.position_idx < self.workspace_p.num_candidates))
             ############## check the collision of the selected configToPlacingPose ##############
             self.planner_p.setRobotToConfig(configToPlacingPose, self.robot_p, req.armType)
             # isConfigValid, FLAG = self.planner_p.checkConfig_AllCollisions(self.robot_p, self.workspace_p, req.armType)
@@ -572,16 +832,16 @@ class PybulletPlanScene(object):
             placing_traj = self.planner_p.AstarPathFinding(currConfig, configToPlacingPose, 
                             pickingPose_neighbors_idx, pickingPose_neighbors_cost, 
                             placingPose_neighbors_idx, placingPose_neighbors_cost,
-                            self.robot_p, self.workspace_p, req.armType, req.isLabeledRoadmapUsed)
+                            self.robot_p, self.workspace_p, req.armType, req.isLabeledRoadmapUsed, self.isTrajectorySparse)
             ### the planning has been finished, either success or failure
             if placing_traj != []:
                 print("The transfer placing path for %s arm is successfully found" % req.armType)
-                transfer_traj += placing_traj
+                transfer_traj = self.initTrajectory(currConfig) + placing_traj
                 transfer_success = True
                 ### after transferring the object, 
                 ### update the object's current position_idx and collision_position_idx
                 self.workspace_p.object_geometries[req.object_idx].setCurrPosition(
-                    req.target_position_idx, req.target_position_idx)
+                    req.target_position_idx, target_collision_position_idx)
                 break
             else:
                 print("The transfer placing path for %s arm is not successfully found" % req.armType)
@@ -589,6 +849,7 @@ class PybulletPlanScene(object):
                 continue
             ############################################################################################
         
+        self.grasp_ordering.finishAttempt(transfer_success)
         if not transfer_success:
             print("No placing pose is qualified, either failed (1) placing pose (2) planning to placing")
             return False, object_path
@@ -607,8 +868,8 @@ class PybulletPlanScene(object):
         isPoseValid, FLAG, configToPostPlacingPose = self.planner_p.generateConfigBasedOnPose(
             postPlacingPose, currConfig, self.robot_p, self.workspace_p, req.armType)
         placeToPostPlaceTraj = self.planner_p.generateTrajectory_DirectConfigPath(
-                currConfig, configToPostPlacingPose, self.robot_p, req.armType, self.workspace_p)
-        finish_traj += placeToPostPlaceTraj
+                currConfig, configToPostPlacingPose, self.robot_p, req.armType, self.workspace_p, self.isTrajectorySparse)
+        finish_traj = self.initTrajectory(currConfig) + placeToPostPlaceTraj
         ########################################################################################################
 
         ################################# prepare the path for the object ######################################
@@ -617,11 +878,11 @@ class PybulletPlanScene(object):
         ### congrat! No problem of rearranging the current object
         ### prepare the object path
         object_path.transit_trajectory = self.generateArmTrajectory(
-                                            transit_traj, req.armType, self.robot_p.motomanRJointNames)
+                                            transit_traj, req.armType, self.robot_p.motomanRJointNames, self.isTrajectorySparse)
         object_path.transfer_trajectory = self.generateArmTrajectory(
-                                            transfer_traj, req.armType, self.robot_p.motomanRJointNames)
+                                            transfer_traj, req.armType, self.robot_p.motomanRJointNames, self.isTrajectorySparse)
         object_path.finish_trajectory = self.generateArmTrajectory(
-                                            finish_traj, req.armType, self.robot_p.motomanRJointNames)
+                                            finish_traj, req.armType, self.robot_p.motomanRJointNames, self.isTrajectorySparse)
         object_path.object_idx = req.object_idx
         enablePrint()
         return True, object_path
@@ -638,8 +899,10 @@ class PybulletPlanScene(object):
         currConfig = self.robot_p.getRobotCurrSingleArmConfig(req.armType)
         ############################# select the right picking pose until it works #############################
         transit_success = False
-        for config_id in range(len(curr_object_configPoses.grasping_configs)):
+        for config_id in self.grasp_ordering.getOrder("pick", curr_object_configPoses.grasping_configs):
             configToPickingPose = curr_object_configPoses.grasping_configs[config_id]
+            self.grasp_ordering.startAttempt("pick", configToPickingPose,
+                isSaved=(curr_object_configPoses.position_idx < self.workspace_p.num_candidates))
             ############## check the collision of the selected configToPickingPose ##############
             self.planner_p.setRobotToConfig(configToPickingPose, self.robot_p, req.armType)
             # isConfigValid, FLAG = self.planner_p.checkConfig_AllCollisions(self.robot_p, self.workspace_p, req.armType)
@@ -699,17 +962,17 @@ class PybulletPlanScene(object):
             prePicking_traj = self.planner_p.AstarPathFinding(currConfig, configToPrePickingPose, 
                                 currConfig_neighbors_idx, currConfig_neighbors_cost, 
                                 prePickingPose_neighbors_idx, prePickingPose_neighbors_cost, 
-                                self.robot_p, self.workspace_p, req.armType, req.isLabeledRoadmapUsed)
+                                self.robot_p, self.workspace_p, req.armType, req.isLabeledRoadmapUsed, self.isTrajectorySparse)
             ### the planning has been finished, either success or failure
             if prePicking_traj != []:
                 print("The transit (pre-picking) path for %s arm is successfully found" % req.armType)
-                transit_traj += prePicking_traj
+                transit_traj = self.initTrajectory(currConfig) + prePicking_traj
                 ################# cartesian path from pre-picking to picking configuration #####################
                 currConfig = self.robot_p.getRobotCurrSingleArmConfig(req.armType)
                 ### you are reaching here since pre-picking has been reached, 
                 ### now get the path from pre-picking to picking
                 prePickToPickTraj = self.planner_p.generateTrajectory_DirectConfigPath(
-                    currConfig, configToPickingPose, self.robot_p, req.armType, self.workspace_p)
+                    currConfig, configToPickingPose, self.robot_p, req.armType, self.workspace_p, self.isTrajectorySparse)
                 transit_traj += prePickToPickTraj
                 #################################################################################################
                 transit_success = True
@@ -721,6 +984,7 @@ class PybulletPlanScene(object):
             ###########################################################################################
         
         ### reach here either transit_success == True or None of the option works
+        self.grasp_ordering.finishAttempt(transit_success)
         if not transit_success:
             print("No picking pose is qualified, either failed (1) picking pose (2) pre-picking pose (3) planning to pre-picking")
             return transit_success, transit_traj, [], []
@@ -745,8 +1009,10 @@ class PybulletPlanScene(object):
         currConfig = self.robot_p.getRobotCurrSingleArmConfig(req.armType)
         ############################# select the right placing pose until it works #############################
         transfer_success = False
-        for config_id in range(len(target_object_configPoses.grasping_configs)):
+        for config_id in self.grasp_ordering.getOrder("place", target_object_configPoses.grasping_configs):
             configToPlacingPose = target_object_configPoses.grasping_configs[config_id]
+            self.grasp_ordering.startAttempt("place", configToPlacingPose,
+                isSaved=(target_object_configPoses.position_idx < self.workspace_p.num_candidates))
             ############## check the collision of the selected configToPlacingPose ##############
             self.planner_p.setRobotToConfig(configToPlacingPose, self.robot_p, req.armType)
             # isConfigValid, FLAG = self.planner_p.checkConfig_AllCollisions(self.robot_p, self.workspace_p, req.armType)
@@ -771,11 +1037,11 @@ class PybulletPlanScene(object):
             placing_traj = self.planner_p.AstarPathFinding(currConfig, configToPlacingPose, 
                             pickingPose_neighbors_idx, pickingPose_neighbors_cost, 
                             placingPose_neighbors_idx, placingPose_neighbors_cost,
-                            self.robot_p, self.workspace_p, req.armType, req.isLabeledRoadmapUsed)
+                            self.robot_p, self.workspace_p, req.armType, req.isLabeledRoadmapUsed, self.isTrajectorySparse)
             ### the planning has been finished, either success or failure
             if placing_traj != []:
                 print("The transfer placing path for %s arm is successfully found" % req.armType)
-                transfer_traj += placing_traj
+                transfer_traj = self.initTrajectory(currConfig) + placing_traj
                 transfer_success = True
                 ### after transferring the object, 
                 ### update the object's current position_idx and collision_position_idx
@@ -787,6 +1053,7 @@ class PybulletPlanScene(object):
                 continue
             ############################################################################################
         
+        self.grasp_ordering.finishAttempt(transfer_success)
         if not transfer_success:
             print("No placing pose is qualified, either failed (1) placing pose (2) planning to placing")
             return transfer_success, transfer_traj, finish_traj
@@ -805,25 +1072,34 @@ class PybulletPlanScene(object):
         isPoseValid, FLAG, configToPostPlacingPose = self.planner_p.generateConfigBasedOnPose(
             postPlacingPose, currConfig, self.robot_p, self.workspace_p, req.armType)
         placeToPostPlaceTraj = self.planner_p.generateTrajectory_DirectConfigPath(
-                currConfig, configToPostPlacingPose, self.robot_p, req.armType, self.workspace_p)
-        finish_traj += placeToPostPlaceTraj
+                currConfig, configToPostPlacingPose, self.robot_p, req.armType, self.workspace_p, self.isTrajectorySparse)
+        finish_traj = self.initTrajectory(currConfig) + placeToPostPlaceTraj
         ########################################################################################################
         return transfer_success, transfer_traj, finish_traj
 
 
-    def generateArmTrajectory(self, traj, armType, motomanRJointNames):
+    def initTrajectory(self, start_config):
+        '''a sparse trajectory starts with its start config (the head),
+        which a dense trajectory does not include'''
+        if self.isTrajectorySparse:
+            return [start_config]
+        return []
+
+    def generateArmTrajectory(self, traj, armType, motomanRJointNames, isSparse=False):
         '''generate arm trajectory (a list of JointState)
         inputs
         ======
             traj (a list of list): a list of joint states [q1, q2, ..., qn]
             armType (string): the arm type (e.g., "Left", "Right_torso)
             motomanRJointNames (a list of strings): the names for controllable joints
+            isSparse (bool): traj only contains the waypoints (see ArmTrajectory.msg)
         outputs
         =======
             result_traj (ArmTrajectory()): the resulting trajectory (ArmTrajectory object)
         '''
         result_traj = ArmTrajectory()
         result_traj.armType = armType
+        result_traj.isSparse = isSparse
         if armType == "Left" or armType == "Left_torso":
             first_joint_index = 1
         if armType == "Right" or armType == "Right_torso":
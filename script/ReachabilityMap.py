@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import time
+import random
+import multiprocessing
+import numpy as np
+
+############################### description ###########################################
+### This module defines the reachability map of the workspace: for each position candidate
+### (WorkspaceTable.candidate_geometries) x each grasp orientation (Planner.generateOrientations)
+### (1) isReachable: whether both the grasping and the approaching pose have a valid IK
+###     (reachability + no collision with the robot itself and the known geometries)
+### (2) flags: the FLAG of the grasping and the approaching IK check of the last trial
+###     (0: valid, see Planner.checkSamplePoseIK for the others, -1: not checked)
+### (3) labels: the position candidates the robot collides with at the valid IK
+### isReachable only means that a valid IK was found within max_trials IK trials, so a
+### candidate is only taken as unreachable if its stored config poses
+### (CandidatesConfigPoses.obj, built with more trials) have no valid IK either
+### It is saved as a compressed numpy file (roadmaps/ReachabilityMap_<armType>.npz) together
+### with the candidate positions and the orientations it was built for, so that a map which
+### no longer matches the workspace parameters is detected and ignored.
+### The planner reads it to prune the unreachable buffers without any IK query.
+### The map is (re)built in a pool of worker processes, each holding a
+### headless plan scene (a PybulletPlanScene in "direct" mode), see generate_reachability_map.py.
+#######################################################################################
+
+### the plan scene of a worker process
+worker_plan_scene = None
+
+
+def initWorkerPlanScene():
+    global worker_plan_scene
+    ### import here since PybulletPlanScene imports Planner which imports this module
+    from PybulletPlanScene import PybulletPlanScene
+    worker_plan_scene = PybulletPlanScene(["PybulletPlanScene.py", "direct"])
+
+
+class ReachabilityMap(object):
+    def __init__(self, candidate_positions, orientations):
+        self.candidate_positions = np.array(candidate_positions, dtype=float).reshape(-1, 3)
+        self.orientations = np.array(orientations, dtype=float).reshape(-1, 4)
+        num_candidates = len(self.candidate_positions)
+        num_orientations = len(self.orientations)
+        self.isReachable = np.zeros((num_candidates, num_orientations), dtype=bool)
+        self.flags = np.full((num_candidates, num_orientations, 2), -1, dtype=np.int8)
+        self.labels = np.zeros((num_candidates, num_orientations, num_candidates), dtype=bool)
+
+    def setEntry(self, candidate_idx, orientation_id, isReachable, grasping_FLAG, approaching_FLAG, labels):
+        self.isReachable[candidate_idx, orientation_id] = isReachable
+        self.flags[candidate_idx, orientation_id] = [grasping_FLAG, approaching_FLAG]
+        self.labels[candidate_idx, orientation_id, :] = False
+        self.labels[candidate_idx, orientation_id, np.array(sorted(labels), dtype=int)] = True
+
+    def isConsistent(self, candidate_positions, orientations, tolerance=1e-6):
+        '''whether the map is built for these candidate positions and orientations'''
+        candidate_positions = np.array(candidate_positions, dtype=float).reshape(-1, 3)
+        orientations = np.array(orientations, dtype=float).reshape(-1, 4)
+        if (candidate_positions.shape != self.candidate_positions.shape) or \
+                (orientations.shape != self.orientations.shape):
+            return False
+        return bool(np.all(np.abs(candidate_positions - self.candidate_positions) <= tolerance)) and \
+               bool(np.all(np.abs(orientations - self.orientations) <= tolerance))
+
+    def isPoseReachable(self, candidate_idx, orientation_id):
+        return bool(self.isReachable[candidate_idx, orientation_id])
+
+    def getReachableOrientations(self, candidate_idx):
+        '''the ids of the reachable grasp orientations of a candidate'''
+        return np.nonzero(self.isReachable[candidate_idx])[0].tolist()
+
+    def isCandidateReachable(self, candidate_idx, candidate_configPoses):
+        '''whether a candidate has at least one reachable grasp orientation in the map
+           or a valid IK in its stored config poses (a PositionCandidateConfigs, None: not stored)'''
+        if np.any(self.isReachable[candidate_idx]) or (candidate_configPoses == None):
+            return True
+        return len(candidate_configPoses.grasping_configs) > 0
+
+    def getReachableCandidates(self):
+        return np.nonzero(np.any(self.isReachable, axis=1))[0].tolist()
+
+    def getLabels(self, candidate_idx, orientation_id):
+        return set(np.nonzero(self.labels[candidate_idx, orientation_id])[0].tolist())
+
+    def save(self, mapFile):
+        np.savez_compressed(mapFile,
+            candidate_positions=self.candidate_positions, orientations=self.orientations,
+            isReachable=self.isReachable, flags=self.flags,
+            labels=np.packbits(self.labels, axis=2))
+
+    @staticmethod
+    def load(mapFile):
+        data = np.load(mapFile)
+        reachability_map = ReachabilityMap(data["candidate_positions"], data["orientations"])
+        reachability_map.isReachable = data["isReachable"].astype(bool)
+        reachability_map.flags = data["flags"].astype(np.int8)
+        if "labels" in data:
+            reachability_map.labels = np.unpackbits(
+                data["labels"], axis=2)[:, :, :len(reachability_map.candidate_positions)].astype(bool)
+        return reachability_map
+
+
+def getCandidatePositions(workspace):
+    return [workspace.candidate_geometries[candidate_idx].pos for candidate_idx in range(workspace.num_candidates)]
+
+
+def computePoseReachability(planner, robot, workspace, pose_task):
+    candidate_idx, orientation_id, pose, armType, seed, max_trials = pose_task
+    ### deterministic: the map does not depend on the number of processes or the order of the poses
+    random.seed((seed * 1000003 + candidate_idx * 101 + orientation_id) % (2**32))
+    np.random.seed((seed * 1000003 + candidate_idx * 101 + orientation_id) % (2**32))
+    robot.resetRobotToHomeConfiguration()
+    planner.isIKSeedLearned = False
+    cylinder_position_candidates = {
+        candidate.position_idx : candidate for candidate in workspace.candidate_geometries.values()}
+    isReachable, grasping_FLAG, approaching_FLAG, labels = planner.checkPoseReachability_candidates(
+                        pose, robot, workspace, armType, cylinder_position_candidates, max_trials)
+    return candidate_idx, orientation_id, isReachable, grasping_FLAG, approaching_FLAG, labels
+
+
+def computePoseReachabilityInWorker(pose_task):
+    return computePoseReachability(
+        worker_plan_scene.planner_p, worker_plan_scene.robot_p, worker_plan_scene.workspace_p, pose_task)
+
+
+def buildReachabilityMap(planner, robot, workspace, armType, num_processes=0, seed=0, max_trials=10):
+    '''build the reachability map of all the position candidates x grasp orientations
+       planner, robot, workspace: the plan scene (which checks the poses if num_processes <= 1)
+       return a ReachabilityMap'''
+    reachability_map = ReachabilityMap(getCandidatePositions(workspace), planner.generateOrientations())
+    pose_tasks = []
+    for candidate_idx in range(workspace.num_candidates):
+        graspingPose_candidates = planner.generate_pose_candidates(
+                        workspace.candidate_geometries[candidate_idx].pos, workspace.cylinder_height)
+        for orientation_id, graspingPose in enumerate(graspingPose_candidates):
+            pose_tasks.append((candidate_idx, orientation_id, graspingPose, armType, seed, max_trials))
+    print("build the reachability map of {} candidates x {} orientations with {} process(es)".format(
+        workspace.num_candidates, len(reachability_map.orientations), max(num_processes, 1)))
+
+    start_time = time.time()
+    pool = None
+    if num_processes > 1:
+        pool = multiprocessing.get_context("spawn").Pool(num_processes, initializer=initWorkerPlanScene)
+        results = pool.imap_unordered(computePoseReachabilityInWorker, pose_tasks)
+    else:
+        results = (computePoseReachability(planner, robot, workspace, pose_task) for pose_task in pose_tasks)
+    num_done = 0
+    for (candidate_idx, orientation_id, isReachable, grasping_FLAG, approaching_FLAG, labels) in results:
+        reachability_map.setEntry(candidate_idx, orientation_id, isReachable, grasping_FLAG, approaching_FLAG, labels)
+        num_done += 1
+        if (num_done % 10 == 0) or (num_done == len(pose_tasks)):
+            elapsed_time = time.time() - start_time
+            print("[{}/{}] poses done, {:.1f}s elapsed, {:.1f}s left".format(
+                num_done, len(pose_tasks), elapsed_time, elapsed_time / num_done * (len(pose_tasks) - num_done)))
+    if pool != None:
+        pool.close()
+        pool.join()
+    robot.resetRobotToHomeConfiguration()
+    print("finish building the reachability map in {:.1f}s: {}/{} poses reachable, unreachable candidates: {}".format(
+        time.time() - start_time, int(np.sum(reachability_map.isReachable)), len(pose_tasks),
+        sorted(set(range(workspace.num_candidates)) - set(reachability_map.getReachableCandidates()))))
+    return reachability_map
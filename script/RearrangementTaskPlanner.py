@@ -6,6 +6,7 @@ import sys
 import os
 import copy
 import numpy as np
+import random
 from collections import OrderedDict
 
 import rospy
@@ -13,6 +14,9 @@ import rospkg
 
 from sensor_msgs.msg import JointState
 
+from ServiceProxyRegistry import service_proxy_registry
+from TrajectoryInterpolation import densifyObjectRearrangePath
+
 from uniform_object_rearrangement.srv import RearrangeCylinderObject, RearrangeCylinderObjectRequest
 from uniform_object_rearrangement.srv import GetCurrRobotConfig, GetCurrRobotConfigRequest
 from uniform_object_rearrangement.srv import UpdateCertainObjectPose, UpdateCertainObjectPoseRequest
@@ -20,6 +24,7 @@ from uniform_object_rearrangement.srv import ResetRobotCurrConfig, ResetRobotCur
 from uniform_object_rearrangement.srv import UpdateManipulationStatus, UpdateManipulationStatusRequest
 from uniform_object_rearrangement.srv import SetSceneBasedOnArrangement, SetSceneBasedOnArrangementRequest
 from uniform_object_rearrangement.srv import SelectObjectAndBuffer, SelectObjectAndBufferRequest
+from uniform_object_rearrangement.srv import ShortcutObjectPath, ShortcutObjectPathRequest
 
 
 # Disable
@@ -33,7 +38,8 @@ def enablePrint():
 
 class RearrangementTaskPlanner(object):
     def __init__(
-        self, initial_arrangement, final_arrangement, time_allowed, isLabeledRoadmapUsed=True):
+        self, initial_arrangement, final_arrangement, time_allowed, isLabeledRoadmapUsed=True, isAnytime=False,
+        streaming_executor=None):
         
         ### understand the arrangement task
         self.initial_arrangement = initial_arrangement
@@ -73,15 +79,33 @@ class RearrangementTaskPlanner(object):
         self.object_ordering = [] ### a list of obj_idx (ordered)
         self.object_paths = [] ### a list of ObjectRearrangePath paths
 
+        ### anytime mode: keep searching after the first solution until time is out
+        ### and keep the solution with the fewest actions
+        self.isAnytime = isAnytime
+        self.finalNodeIDs = [] ### all the nodes in the left tree which reach the final arrangement
+        self.solution_cost_curve = [] ### a list of (time, cost) each time a better solution is found
+
+        ### informed perturbation (heuristic_level >= 2)
+        ### key: node_id, value: #failures when perturbing the node
+        ### (no object/buffer is found or the subTree grown from the perturbation is empty)
+        self.perturbation_failures = {}
+
+        ### streaming execution: a StreamingExecutor which executes the committed prefix
+        ### of the plan while the search continues (None: the plan is executed after planning)
+        ### the search only continues from the committed node (the end of the committed prefix)
+        self.streaming_executor = streaming_executor
+        self.committedNodeID = "L0"
+
 
     def harvestSolution(self):
         '''This function is called when it indicates a solution has been found
         The function harvest the solution (solution data)'''
         nodeID = self.finalNodeID
         ### back track to get the object_ordering and object_path
+        ### the sparse paths from the search are only densified here for the solution
         while (self.treeL[nodeID].parent_id != None):
             self.object_ordering.append(self.treeL[nodeID].objectTransferred_idx)
-            self.object_paths.append(self.treeL[nodeID].transition_path)
+            self.object_paths.append(densifyObjectRearrangePath(self.treeL[nodeID].transition_path))
             nodeID = self.treeL[nodeID].parent_id
         ### reverse the object_ordering and object_paths
         self.object_ordering.reverse()
@@ -89,30 +113,200 @@ class RearrangementTaskPlanner(object):
         self.totalActions = len(self.object_ordering)
         self.best_solution_cost = self.totalActions
 
+    def shortcutSolution(self, time_allowed, armType="Right_torso"):
+        '''This function shortcuts the object paths of the harvested solution
+        within time_allowed (split evenly among the paths) and reports
+        the joint-space path length reduction of each object'''
+        ### the scene (arrangement + robot config) before each object path is the parent node
+        solution_nodeIDs = []
+        nodeID = self.finalNodeID
+        while (self.treeL[nodeID].parent_id != None):
+            solution_nodeIDs.append(nodeID)
+            nodeID = self.treeL[nodeID].parent_id
+        solution_nodeIDs.reverse()
+        if (len(solution_nodeIDs) == 0) or (len(solution_nodeIDs) != len(self.object_paths)):
+            return
+        time_allowed_per_path = time_allowed / len(solution_nodeIDs)
+        total_length_before = 0.0
+        total_length_after = 0.0
+        for path_idx, nodeID in enumerate(solution_nodeIDs):
+            parent_node = self.treeL[self.treeL[nodeID].parent_id]
+            shortcut_success, object_path, length_before, length_after = self.serviceCall_shortcutObjectPath(
+                self.object_paths[path_idx], parent_node.arrangement, parent_node.robotConfig, armType, time_allowed_per_path)
+            if not shortcut_success:
+                continue
+            self.object_paths[path_idx] = densifyObjectRearrangePath(object_path)
+            total_length_before += length_before
+            total_length_after += length_after
+            print("object {}: path length {:.3f} -> {:.3f} (-{:.1f}%)".format(
+                object_path.object_idx, length_before, length_after,
+                100 * (length_before - length_after) / max(length_before, 1e-9)))
+        print("total path length: {:.3f} -> {:.3f} (-{:.1f}%)".format(
+            total_length_before, total_length_after,
+            100 * (total_length_before - total_length_after) / max(total_length_before, 1e-9)))
+
+
+    def getCostToCome(self, nodeID):
+        '''This function computes the cost (#actions) of a node by backtracking
+        to the root, as the cost_to_come of a node can be out of date
+        after one of its ancestors is rewired'''
+        cost = 0
+        while (self.treeL[nodeID].parent_id != None) and (cost < len(self.treeL)):
+            cost += 1
+            nodeID = self.treeL[nodeID].parent_id
+        return cost
+
+    def updateBestSolution(self):
+        '''This function is called in anytime mode after the tree grows
+        It picks the final node with the fewest actions as the solution to harvest'''
+        for nodeID in self.finalNodeIDs:
+            if (self.streaming_executor != None) and (not self.isNodeInCommittedSubTree(nodeID)):
+                continue
+            cost = self.getCostToCome(nodeID)
+            if cost < self.best_solution_cost:
+                self.best_solution_cost = cost
+                self.finalNodeID = nodeID
+                self.solution_cost_curve.append((time.time() - self.planning_startTime, cost))
+                rospy.logwarn("a better solution is found with %s actions" % str(cost))
+
+    def isSolutionImprovable(self):
+        '''a solution can not be improved if it has no more actions
+        than the number of objects to arrange (i.e., a monotone solution)
+        or there is no node left which may lead to a better solution'''
+        if self.best_solution_cost <= self.num_objects:
+            return False
+        return len(self.getNodesToPerturb()) != 0
+
+    def getNodesToPerturb(self):
+        '''In anytime mode, once a solution is found, only the nodes which may lead to 
+        a better solution are worth perturbing: a perturbation costs one action and every
+        object not at its final position still needs at least one action'''
+        node_ids = self.idLeftRegistr
+        if self.streaming_executor != None:
+            ### only the nodes after the committed prefix can be perturbed
+            node_ids = [nodeID for nodeID in node_ids if self.isNodeInCommittedSubTree(nodeID)]
+        if (not self.isAnytime) or (not self.isSolved):
+            return node_ids
+        nodes_to_perturb = []
+        for nodeID in node_ids:
+            arrangement = self.treeL[nodeID].arrangement
+            num_objects_yet_to_move = len(
+                [i for i in range(len(arrangement)) if arrangement[i] != self.final_arrangement[i]])
+            if self.getCostToCome(nodeID) + 1 + num_objects_yet_to_move < self.best_solution_cost:
+                nodes_to_perturb.append(nodeID)
+        return nodes_to_perturb
+
+    def pickNodeToPerturb(self, node_ids, tree=None, target_arrangement=None):
+        '''This function picks a node to perturb among node_ids
+        (of the tree toward the target arrangement, by default the left tree toward the final arrangement)
+        heuristic_level 0/1: uniformly at random
+        heuristic_level 2/3: random, weighted by a score which prefers nodes with
+        fewer objects yet to move and fewer failed perturbations'''
+        if self.heuristic_level < 2:
+            return random.choice(node_ids)
+        if tree == None:
+            tree = self.treeL
+        if target_arrangement == None:
+            target_arrangement = self.final_arrangement
+        node_weights = []
+        for nodeID in node_ids:
+            arrangement = tree[nodeID].arrangement
+            num_objects_yet_to_move = len(
+                [i for i in range(len(arrangement)) if arrangement[i] != target_arrangement[i]])
+            num_failures = self.perturbation_failures.get(nodeID, 0)
+            node_weights.append(1.0 / ((1 + num_objects_yet_to_move) * (1 + num_failures)))
+        node_weights = np.array(node_weights) / sum(node_weights)
+        return node_ids[np.random.choice(len(node_ids), p=node_weights)]
+
+    def recordPerturbationFailure(self, nodeID):
+        if nodeID not in self.perturbation_failures:
+            self.perturbation_failures[nodeID] = 0
+        self.perturbation_failures[nodeID] += 1
+
+    def isNodeInCommittedSubTree(self, nodeID):
+        '''check if a node is the committed node or one of its descendants'''
+        depth = 0
+        while (nodeID != None) and (depth <= len(self.treeL)):
+            if nodeID == self.committedNodeID:
+                return True
+            nodeID = self.treeL[nodeID].parent_id
+            depth += 1
+        return False
+
+    def commitMonotonePrefix(self):
+        '''(streaming execution) commit the actions from the committed node toward
+        the most progressed node (fewest objects yet to move, then fewest actions) after it,
+        as long as each action moves an object to its final position (a monotone prefix)
+        and the executor accepts the path (backpressure)'''
+        if self.streaming_executor == None:
+            return
+        best_nodeID = None
+        best_score = None
+        for nodeID in self.idLeftRegistr:
+            if not self.isNodeInCommittedSubTree(nodeID):
+                continue
+            arrangement = self.treeL[nodeID].arrangement
+            num_objects_yet_to_move = len(
+                [i for i in range(len(arrangement)) if arrangement[i] != self.final_arrangement[i]])
+            score = (num_objects_yet_to_move, self.getCostToCome(nodeID))
+            if (best_score == None) or (score < best_score):
+                best_nodeID = nodeID
+                best_score = score
+        ### the branch from the committed node to the most progressed node
+        branch = []
+        nodeID = best_nodeID
+        while nodeID != self.committedNodeID:
+            branch.append(nodeID)
+            nodeID = self.treeL[nodeID].parent_id
+        branch.reverse()
+        for nodeID in branch:
+            node = self.treeL[nodeID]
+            if node.obj_transfer_position_indices[1] != self.final_arrangement[node.objectTransferred_idx]:
+                ### the object is moved to a buffer, which may be revised later
+                break
+            if not self.streaming_executor.commitPath(node.transition_path):
+                break
+            self.committedNodeID = nodeID
+            rospy.logwarn("COMMIT THE PATH OF OBJECT %s (node %s) FOR EXECUTION" % (str(node.objectTransferred_idx), nodeID))
+
+    def commitRemainingSolution(self):
+        '''(streaming execution) commit the rest of the harvested solution after the committed prefix
+        or abort the streaming execution if the rest of the plan is not found'''
+        if self.streaming_executor == None:
+            return
+        if not self.isSolved:
+            self.streaming_executor.abort()
+            return
+        ### the committed paths are the first paths of the solution
+        for object_path in self.object_paths[self.streaming_executor.num_paths_committed:]:
+            self.streaming_executor.commitPath(object_path, block=True)
+
+    def reportSolutionCostCurve(self):
+        '''print the solution cost (#actions) vs. time curve of the anytime mode'''
+        print("solution cost vs. time: ")
+        for (solution_time, cost) in self.solution_cost_curve:
+            print("  time: {:.3f}s, #actions: {}".format(solution_time, cost))
 
     def serviceCall_rearrangeCylinderObject(self, obj_idx, target_position_idx, armType, isLabeledRoadmapUsed=True):
-        rospy.wait_for_service("rearrange_cylinder_object")
         request = RearrangeCylinderObjectRequest()
         request.object_idx = obj_idx
         request.target_position_idx = target_position_idx
         request.armType = armType
         request.isLabeledRoadmapUsed = isLabeledRoadmapUsed
         try:
-            rearrangeCylinderObject_proxy = rospy.ServiceProxy(
-                "rearrange_cylinder_object", RearrangeCylinderObject)
-            rearrange_cylinder_object_response = rearrangeCylinderObject_proxy(request)
+            rearrange_cylinder_object_response = service_proxy_registry.call(
+                "rearrange_cylinder_object", RearrangeCylinderObject, request)
             return rearrange_cylinder_object_response.success, rearrange_cylinder_object_response.path
         except rospy.ServiceException as e:
             print("rearrange_cylinder_object service call failed: %s" % e)
 
-    def serviceCall_getCurrRobotConfig(self):
+    def serviceCall_getCurrRobotConfig(self, plan_scene_ns=""):
         '''call the GetCurrRobotConfig service to get the robot current config from planning
            expect output: configuration of all controllable joints (1 + 7 + 7 + 6) '''
-        rospy.wait_for_service("get_curr_robot_config")
         request = GetCurrRobotConfigRequest()
         try:
-            getCurrRobotConfig_proxy = rospy.ServiceProxy("get_curr_robot_config", GetCurrRobotConfig)
-            getCurrRobotConfig_response = getCurrRobotConfig_proxy(request)
+            getCurrRobotConfig_response = service_proxy_registry.call(
+                plan_scene_ns + "get_curr_robot_config", GetCurrRobotConfig, request)
             return getCurrRobotConfig_response.robot_config.position
         except rospy.ServiceException as e:
             print("get_curr_robot_config service call failed: %s" % e)
@@ -120,15 +314,12 @@ class RearrangementTaskPlanner(object):
     def serviceCall_updateCertainObjectPose(self, obj_idx, target_position_idx):
         '''call the UpdateCertainObjectPose service to update the object
            to the specified target_position_idx'''
-        rospy.wait_for_service("update_certain_object_pose")
         request = UpdateCertainObjectPoseRequest()
         request.object_idx = obj_idx
         request.object_position_idx = target_position_idx
         try:
-            updateCertainObjectPose_proxy = rospy.ServiceProxy(
-                    "update_certain_object_pose", UpdateCertainObjectPose)
-            updateCertainObjectPose_response = updateCertainObjectPose_proxy(
-                                request.object_idx, request.object_position_idx)
+            updateCertainObjectPose_response = service_proxy_registry.call(
+                "update_certain_object_pose", UpdateCertainObjectPose, request)
             return updateCertainObjectPose_response.success
         except rospy.ServiceException as e:
             print("update_certain_object_pose service call failed: %s" % e)
@@ -136,13 +327,12 @@ class RearrangementTaskPlanner(object):
     def serviceCall_resetRobotCurrConfig(self, robot_curr_config):
         '''call the ResetRobotCurrConfig service to reset the robot
            to the specified configuration'''
-        rospy.wait_for_service("reset_robot_curr_config")
         request = ResetRobotCurrConfigRequest()
         request.robot_config = JointState()
         request.robot_config.position = robot_curr_config
         try:
-            resetRobotCurrConfig_proxy = rospy.ServiceProxy("reset_robot_curr_config", ResetRobotCurrConfig)
-            resetRobotCurrConfig_response = resetRobotCurrConfig_proxy(request.robot_config)
+            resetRobotCurrConfig_response = service_proxy_registry.call(
+                "reset_robot_curr_config", ResetRobotCurrConfig, request)
             return resetRobotCurrConfig_response.success
         except rospy.ServiceException as e:
             print("reset_robot_curr_config service call failed: %s" % e)
@@ -150,35 +340,50 @@ class RearrangementTaskPlanner(object):
     def serviceCall_updateManipulationStatus(self, armType):
         '''call the UpdateManipulationStatus service to disable
            any relationship between the robot and the object'''
-        rospy.wait_for_service("update_manipulation_status")
         request = UpdateManipulationStatusRequest()
         request.armType = armType
         try:
-            updateManipulationStatus_proxy = rospy.ServiceProxy("update_manipulation_status", UpdateManipulationStatus)
-            updateManipulationStatus_response = updateManipulationStatus_proxy(request.armType)
+            updateManipulationStatus_response = service_proxy_registry.call(
+                "update_manipulation_status", UpdateManipulationStatus, request)
             return updateManipulationStatus_response.success
         except rospy.ServiceException as e:
             print("update_manipulation_status service call failed: %s" % e)
 
-    def serviceCall_setSceneBasedOnArrangementNode(self, arrangement, robotConfig, armType):
+    def serviceCall_setSceneBasedOnArrangementNode(self, arrangement, robotConfig, armType, plan_scene_ns=""):
         '''call the SetSceneBasedOnArrangement service to
            set scene based on arrangement node'''
-        rospy.wait_for_service("set_scene_based_on_arrangement")
         request = SetSceneBasedOnArrangementRequest()
         request.arrangement = arrangement
         request.robot_config.position = robotConfig
         request.armType = armType
         try:
-            setSceneBasedOnArrangement_proxy = rospy.ServiceProxy("set_scene_based_on_arrangement", SetSceneBasedOnArrangement)
-            setSceneBasedOnArrangement_response = setSceneBasedOnArrangement_proxy(request)
+            setSceneBasedOnArrangement_response = service_proxy_registry.call(
+                plan_scene_ns + "set_scene_based_on_arrangement", SetSceneBasedOnArrangement, request)
             return setSceneBasedOnArrangement_response.success
         except rospy.ServiceException as e:
             print("set_scene_based_on_arrangement service call failed: %s" % e)
 
-    def serviceCall_selectObjectAndBuffer(self, objects_to_move, final_arrangement, armType, heuristic_level, isLabeledRoadmapUsed):
+    def serviceCall_shortcutObjectPath(self, object_path, arrangement, robotConfig, armType, time_allowed, plan_scene_ns=""):
+        '''call the ShortcutObjectPath service to
+           shortcut an object path from the scene (arrangement + robot config) before the path'''
+        request = ShortcutObjectPathRequest()
+        request.path = object_path
+        request.arrangement = arrangement
+        request.robot_config.position = robotConfig
+        request.armType = armType
+        request.time_allowed = time_allowed
+        try:
+            shortcutObjectPath_response = service_proxy_registry.call(
+                plan_scene_ns + "shortcut_object_path", ShortcutObjectPath, request)
+            return shortcutObjectPath_response.success, shortcutObjectPath_response.path, \
+                shortcutObjectPath_response.length_before, shortcutObjectPath_response.length_after
+        except rospy.ServiceException as e:
+            print("shortcut_object_path service call failed: %s" % e)
+            return False, None, 0.0, 0.0
+
+    def serviceCall_selectObjectAndBuffer(self, objects_to_move, final_arrangement, armType, heuristic_level, isLabeledRoadmapUsed, plan_scene_ns=""):
         '''call the SelectObjectAndBuffer service to
            select object and buffer'''
-        rospy.wait_for_service("select_object_and_buffer")
         request = SelectObjectAndBufferRequest()
         request.objects_to_move = objects_to_move
         request.final_arrangement = final_arrangement
@@ -186,8 +391,8 @@ class RearrangementTaskPlanner(object):
         request.heuristic_level = heuristic_level
         request.isLabeledRoadmapUsed = isLabeledRoadmapUsed
         try:
-            selectObjectAndBuffer_proxy = rospy.ServiceProxy("select_object_and_buffer", SelectObjectAndBuffer)
-            selectObjectAndBuffer_response = selectObjectAndBuffer_proxy(request)
+            selectObjectAndBuffer_response = service_proxy_registry.call(
+                plan_scene_ns + "select_object_and_buffer", SelectObjectAndBuffer, request)
             return selectObjectAndBuffer_response.success, selectObjectAndBuffer_response.object_idx, \
                 selectObjectAndBuffer_response.buffer_idx, selectObjectAndBuffer_response.path
         except rospy.ServiceException as e:
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import multiprocessing
+import numpy as np
+
+############################### description ###########################################
+### This module checks batches of sampled roadmap nodes (configs) for collisions
+### (robot self-collision + robot-known geometries) in a pool of worker processes,
+### each holding a headless plan scene (a PybulletPlanScene in "direct" mode).
+### The batches are drawn and filtered by the end-effector region with the forward
+### kinematics beforehand (see Planner.samplingNodes_batch), so only the configs in
+### the region are sent to the workers.
+#######################################################################################
+
+### the plan scene of a worker process
+worker_plan_scene = None
+
+
+def initWorkerPlanScene():
+    global worker_plan_scene
+    ### import here since PybulletPlanScene imports Planner which imports this module
+    from PybulletPlanScene import PybulletPlanScene
+    worker_plan_scene = PybulletPlanScene(["PybulletPlanScene.py", "direct"])
+
+
+def checkConfigsInWorker(config_task):
+    configs, armType = config_task
+    return worker_plan_scene.planner_p.checkConfigs_CollisionWithRobotAndKnownGEO(
+        configs, worker_plan_scene.robot_p, worker_plan_scene.workspace_p, armType)
+
+
+def createSamplingPool(num_processes):
+    return multiprocessing.get_context("spawn").Pool(num_processes, initializer=initWorkerPlanScene)
+
+
+def checkConfigsInPool(pool, num_processes, configs, armType):
+    '''check a batch of configs (#configs x #joints) split evenly over the worker processes
+       return a list of bool (whether each config is collision free)'''
+    if len(configs) == 0:
+        return []
+    chunks = np.array_split(np.array(configs), min(num_processes, len(configs)))
+    results = pool.map(checkConfigsInWorker, [(chunk.tolist(), armType) for chunk in chunks])
+    return [isValid for chunk_result in results for isValid in chunk_result]
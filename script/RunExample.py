@@ -7,6 +7,7 @@ import os
 import numpy as np
 
 import utils2
+from ServiceProxyRegistry import service_proxy_registry
 
 import rospy
 import rospkg
@@ -14,6 +15,9 @@ import rospkg
 from UnidirMRSPlanner import UnidirMRSPlanner
 from UnidirDFSDPPlanner import UnidirDFSDPPlanner
 from UnidirCIRSPlanner import UnidirCIRSPlanner
+from ParallelCIRSPlanner import ParallelCIRSPlanner
+from BidirCIRSPlanner import BidirCIRSPlanner
+from StreamingExecutor import StreamingExecutor
 
 ############################### description #########################################
 ### This class defines a ExampleRunner class which
@@ -63,6 +67,16 @@ def main(args):
                 utils2.serviceCall_reproduceInstanceCylinder(cylinder_objects)
         ### generate IK config for start positions for all objects
         ik_generate_success = utils2.serviceCall_generateConfigsForStartPositions("Right_torso")
+        ### the parallel planner also needs the instance in each worker plan scene
+        if example_runner.method_name == "CIRS_parallel":
+            plan_scene_namespaces = rospy.get_param(
+                "/parallel_planning/plan_scene_namespaces", ["plan_worker_1/", "plan_worker_2/"])
+            setup_workers_success = utils2.setupWorkerPlanScenes(
+                cylinder_objects, "Right_torso", plan_scene_namespaces)
+            if not setup_workers_success:
+                rospy.logerr("fail to set up the worker plan scenes %s, the parallel planner is not started",
+                             str(plan_scene_namespaces))
+                return
 
         ###### run an example given the method specified ######
         ### (i) CIRS
@@ -76,6 +90,36 @@ def main(args):
             the_chosen_planner = UnidirCIRSPlanner(
                 initial_arrangement, final_arrangement, example_runner.time_allowed, \
                 isLabeledRoadmapUsed=False)
+        ### (i') CIRS_anytime (keep improving the solution until time is out)
+        if example_runner.method_name == "CIRS_anytime":
+            start_time = time.time()
+            the_chosen_planner = UnidirCIRSPlanner(
+                initial_arrangement, final_arrangement, example_runner.time_allowed, \
+                isAnytime=True)
+        ### (i'') CIRS_informed (scored node/buffer selection in perturbation)
+        if example_runner.method_name == "CIRS_informed":
+            start_time = time.time()
+            the_chosen_planner = UnidirCIRSPlanner(
+                initial_arrangement, final_arrangement, example_runner.time_allowed, \
+                heuristic_level=2)
+        ### (i''') CIRS_streaming (the committed prefix of the plan is executed while planning)
+        if example_runner.method_name == "CIRS_streaming":
+            start_time = time.time()
+            streaming_executor = StreamingExecutor()
+            the_chosen_planner = UnidirCIRSPlanner(
+                initial_arrangement, final_arrangement, example_runner.time_allowed, \
+                streaming_executor=streaming_executor)
+        ### (ii') CIRS_parallel
+        if example_runner.method_name == "CIRS_parallel":
+            start_time = time.time()
+            the_chosen_planner = ParallelCIRSPlanner(
+                initial_arrangement, final_arrangement, example_runner.time_allowed, \
+                plan_scene_namespaces=plan_scene_namespaces)
+        ### (ii'') CIRS_bidirectional
+        if example_runner.method_name == "CIRS_bidirectional":
+            start_time = time.time()
+            the_chosen_planner = BidirCIRSPlanner(
+                initial_arrangement, final_arrangement, example_runner.time_allowed)
         ### (iii) DFS_DP
         if example_runner.method_name == "DFSDP":
             start_time = time.time()
@@ -104,21 +148,42 @@ def main(args):
         nActions = the_chosen_planner.best_solution_cost
         if nActions == np.inf: nActions = 5000
         object_ordering = the_chosen_planner.object_ordering
+
+        ### shortcut the solution paths before execution (the streaming plan is already executed)
+        shortcut_time_allowed = rospy.get_param("/path_shortcutting/time_allowed", 0.0)
+        if isSolved and (shortcut_time_allowed > 0) and (example_runner.method_name != "CIRS_streaming"):
+            shortcut_start_time = time.time()
+            the_chosen_planner.shortcutSolution(shortcut_time_allowed)
+            print("Time for shortcutting the solution paths is: {}".format(time.time() - shortcut_start_time))
         object_paths = the_chosen_planner.object_paths        
 
         print("\n")
         print("Time for {} planning is: {}".format(example_runner.method_name, planning_time))
         print("Number of actions for {} planning is: {}".format(example_runner.method_name, nActions))
         print("Object ordering for {} planning is: {}".format(example_runner.method_name, object_ordering))
+        service_proxy_registry.reportLatencyStats()
 
         ### move the robot back to home configuration (optional)
         if (example_runner.method_name == "CIRS") or (example_runner.method_name == "DFSDP") \
-            or (example_runner.method_name == "mRS"):
+            or (example_runner.method_name == "mRS") or (example_runner.method_name == "CIRS_parallel") \
+            or (example_runner.method_name == "CIRS_anytime") or (example_runner.method_name == "CIRS_informed") \
+            or (example_runner.method_name == "CIRS_bidirectional") or (example_runner.method_name == "CIRS_streaming"):
             resetHome_success, resetHome_trajectory = utils2.serviceCall_reset_robot_home("Right_torso")
         if (example_runner.method_name == "CIRS_nonlabeled") or (example_runner.method_name == "DFSDP_nonlabeled") \
             or (example_runner.method_name == "mRS_nonlabeled"):
             resetHome_success, resetHome_trajectory = utils2.serviceCall_reset_robot_home("Right_torso", False)
 
+        if example_runner.method_name == "CIRS_streaming":
+            ### the plan has been executed while planning, wait for the rest of the execution
+            if resetHome_success:
+                execute_success = streaming_executor.finish(resetHome_trajectory)
+            else:
+                execute_success = streaming_executor.finish()
+            streaming_executor.reportExecutionStats()
+            print("Streaming execution success: {}".format(execute_success))
+            print("End-to-end time (planning + execution) for {} is: {}".format(
+                example_runner.method_name, time.time() - start_time))
+
         if example_runner.isNewInstance:
             ### only keep the option to save instance when it is a new instance
             saveInstance = True if input("save instance? (y/n)") == 'y' else False
@@ -127,8 +192,12 @@ def main(args):
                 utils2.saveInstance(cylinder_objects, example_runner.instanceFolder)
         
         if isSolved:
-            executePath = True if input("Solution found. Execute the solution? (y/n)") == 'y' else False
-            print("execute solution: " + str(executePath))
+            if example_runner.method_name == "CIRS_streaming":
+                ### the solution has been executed
+                executePath = False
+            else:
+                executePath = True if input("Solution found. Execute the solution? (y/n)") == 'y' else False
+                print("execute solution: " + str(executePath))
             if executePath:
                 if resetHome_success:
                     utils2.executeWholePlan(object_paths, resetHome_trajectory)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import time
+import threading
+
+import rospy
+
+############################### description ###########################################
+### This module defines a ServiceProxyRegistry class which
+### keeps one persistent rospy.ServiceProxy per service (name), so the
+### service lookup and the TCP handshake happen once instead of on every call.
+### If the connection fails (e.g., the connection is broken as the server restarts),
+### the proxy is re-created and the call is tried once more, but only when the request
+### cannot have reached the server (no connection) or the service is idempotent
+### (IDEMPOTENT_SERVICES), so that a call changing the scene/robot is never run twice.
+### Otherwise (e.g., the handler of the server fails) the proxy is closed and the error is raised.
+### The registry also counts the calls and the call latency per service.
+### All serviceCall_* helpers share the module-level registry (service_proxy_registry).
+#######################################################################################
+
+
+### the services (names without namespace) which can be called again with the same request
+### without changing the result: queries, or setting the scene/robot to a given state
+IDEMPOTENT_SERVICES = set([
+    "get_curr_robot_config", "check_rearrangement_feasibility", "detect_invalid_arr_states",
+    "set_scene_based_on_arrangement", "reset_robot_curr_config", "update_certain_object_pose",
+    "cylinder_position_estimate",
+])
+
+
+def isRetrySafe(service_name, error):
+    '''whether a failed call can be sent again after reconnection'''
+    ### rospy raises "unable to connect to service" when the connection fails before the request is sent
+    if str(error).startswith("unable to connect to service"):
+        return True
+    ### e.g., "transport error completing service call": the request may have been handled
+    if str(error).startswith("transport error") and (service_name.split("/")[-1] in IDEMPOTENT_SERVICES):
+        return True
+    return False
+
+
+class ServiceProxyRegistry(object):
+    def __init__(self):
+        self.proxies = {} ### key: service name, value: a persistent rospy.ServiceProxy
+        ### a persistent proxy is not thread-safe, calls to the same service are serialized
+        self.proxy_locks = {} ### key: service name, value: threading.Lock
+        self.registry_lock = threading.Lock()
+        ### key: service name, value: [#calls, total latency (s), max latency (s), #reconnections]
+        self.latency_stats = {}
+
+    def getProxyLock(self, service_name):
+        with self.registry_lock:
+            if service_name not in self.proxy_locks:
+                self.proxy_locks[service_name] = threading.Lock()
+                self.latency_stats[service_name] = [0, 0.0, 0.0, 0]
+        return self.proxy_locks[service_name]
+
+    def getProxy(self, service_name, service_class):
+        '''get the persistent proxy of the service (create it at the first call)
+           the caller holds the lock of the service'''
+        if service_name not in self.proxies:
+            rospy.wait_for_service(service_name)
+            self.proxies[service_name] = rospy.ServiceProxy(service_name, service_class, persistent=True)
+        return self.proxies[service_name]
+
+    def closeProxy(self, service_name):
+        if service_name in self.proxies:
+            self.proxies[service_name].close()
+            del self.proxies[service_name]
+
+    def call(self, service_name, service_class, request):
+        '''call the service with the request and return the response
+           raise rospy.ServiceException if the call fails and cannot be retried safely
+           (see isRetrySafe) or fails again after reconnection'''
+        with self.getProxyLock(service_name):
+            start_time = time.time()
+            try:
+                response = self.getProxy(service_name, service_class)(request)
+            except rospy.ServiceException as e:
+                ### the persistent connection may be broken, do not reuse it
+                self.closeProxy(service_name)
+                if not isRetrySafe(service_name, e):
+                    raise
+                ### reconnect and try again
+                self.latency_stats[service_name][3] += 1
+                response = self.getProxy(service_name, service_class)(request)
+            latency = time.time() - start_time
+            stats = self.latency_stats[service_name]
+            stats[0] += 1
+            stats[1] += latency
+            stats[2] = max(stats[2], latency)
+        return response
+
+    def getLatencyStats(self, service_name):
+        '''return (#calls, average latency (s), max latency (s), #reconnections) of the service'''
+        if service_name not in self.latency_stats:
+            return 0, 0.0, 0.0, 0
+        num_calls, total_latency, max_latency, num_reconnections = self.latency_stats[service_name]
+        average_latency = total_latency / num_calls if num_calls != 0 else 0.0
+        return num_calls, average_latency, max_latency, num_reconnections
+
+    def reportLatencyStats(self):
+        print("service call latency: ")
+        for service_name in sorted(self.latency_stats.keys()):
+            num_calls, average_latency, max_latency, num_reconnections = self.getLatencyStats(service_name)
+            print("  {}: #calls: {}, avg: {:.3f}ms, max: {:.3f}ms, #reconnections: {}".format(
+                service_name, num_calls, average_latency * 1000, max_latency * 1000, num_reconnections))
+
+    def shutdown(self):
+        '''close all the persistent connections'''
+        for service_name in list(self.proxies.keys()):
+            with self.getProxyLock(service_name):
+                self.closeProxy(service_name)
+
+
+### the registry shared by all serviceCall_* helpers in a process
+service_proxy_registry = ServiceProxyRegistry()
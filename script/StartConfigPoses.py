@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import os
+import time
+import pickle
+import multiprocessing
+
+############################### description ###########################################
+### This module generates the config poses (the approaching/grasping configs and labels)
+### of the start positions of the objects for Planner.generateAllConfigPoses_startPositions
+### (1) StartConfigPosesCache: a persistent cache keyed by the quantized object position.
+###     A start position which is the same as (or close to) a cached one reuses its config
+###     poses: a cached IK is re-validated (reachability + collision with the robot and
+###     the known geometries) at the exact pose before it is reused, the labels are reused
+###     as they are. A config pose which fails the validation is generated again.
+###     Only the valid config poses are cached: a pose without a valid IK is tried again
+###     the next time (an IK miss is random and must not disable the pose for good).
+### (2) StartConfigPosesGenerator: generates the config poses which are not cached in a
+###     process pool over the (object, orientation) pairs. Each worker process holds a
+###     headless plan scene (a PybulletPlanScene in "direct" mode) which is set up once
+###     and reused for all the instances.
+#######################################################################################
+
+### the plan scene of a worker process
+worker_plan_scene = None
+
+
+def initWorkerPlanScene():
+    global worker_plan_scene
+    ### import here since PybulletPlanScene imports this module
+    from PybulletPlanScene import PybulletPlanScene
+    worker_plan_scene = PybulletPlanScene(["PybulletPlanScene.py", "direct"])
+
+
+def generateConfigPoseInWorker(pose_task):
+    grasping_pose, armType = pose_task
+    cylinder_position_candidates = {candidate.position_idx : candidate \
+                    for candidate in worker_plan_scene.workspace_p.candidate_geometries.values()}
+    return worker_plan_scene.planner_p.generateConfigBasedOnPose_initialPositions(
+        grasping_pose, worker_plan_scene.robot_p, worker_plan_scene.workspace_p, armType, cylinder_position_candidates)
+
+
+class StartConfigPosesCache(object):
+    def __init__(self, cacheFile, resolution=0.005):
+        self.cacheFile = cacheFile
+        self.resolution = resolution ### (m) the size of a cell of the quantized object positions
+        ### key: (armType, quantized object position, orientation of the grasping pose)
+        ### value: (approaching_config, grasping_config, approaching_label, grasping_label, total_label)
+        self.config_poses = {}
+        self.isModified = False
+        if os.path.exists(self.cacheFile):
+            f_cache = open(self.cacheFile, 'rb')
+            self.config_poses = pickle.load(f_cache)
+            f_cache.close()
+
+    def getKey(self, object_position, grasping_pose, armType):
+        quantized_position = tuple(int(round(coord / self.resolution)) for coord in object_position)
+        quantized_orientation = tuple(round(coord, 4) for coord in grasping_pose[1])
+        return (armType, quantized_position, quantized_orientation)
+
+    def get(self, object_position, grasping_pose, armType):
+        return self.config_poses.get(self.getKey(object_position, grasping_pose, armType), None)
+
+    def add(self, object_position, grasping_pose, armType, config_pose):
+        self.config_poses[self.getKey(object_position, grasping_pose, armType)] = config_pose
+        self.isModified = True
+
+    def save(self):
+        if not self.isModified:
+            return
+        f_cache = open(self.cacheFile, 'wb')
+        pickle.dump(self.config_poses, f_cache)
+        f_cache.close()
+        self.isModified = False
+
+
+class StartConfigPosesGenerator(object):
+    def __init__(self, cacheFile, num_processes=0, resolution=0.005):
+        self.cache = StartConfigPosesCache(cacheFile, resolution)
+        ### num_processes <= 1: generate the config poses in the plan scene (no process pool)
+        self.num_processes = num_processes
+        self.pool = None
+
+    def getPool(self):
+        ### the worker processes are spawned (a forked pybullet client is not usable)
+        ### the first time they are needed, and then kept for the following instances
+        if self.pool == None:
+            self.pool = multiprocessing.get_context("spawn").Pool(
+                self.num_processes, initializer=initWorkerPlanScene)
+        return self.pool
+
+    def generateConfigPoses(self, pose_tasks, planner, robot, workspace, armType):
+        '''generate the config poses of a list of (object_position, grasping_pose)
+           planner, robot, workspace: the plan scene which validates the cached config poses
+           (and generates the config poses if there is no process pool)
+           return a list of (approaching_config, grasping_config, approaching_label, grasping_label, total_label)'''
+        start_time = time.time()
+        config_poses = [None] * len(pose_tasks)
+        tasks_to_generate = []
+        for task_idx, (object_position, grasping_pose) in enumerate(pose_tasks):
+            cached_config_pose = self.cache.get(object_position, grasping_pose, armType)
+            if (cached_config_pose == None) or (cached_config_pose[0] == []):
+                ### (a failure cached by an older version is tried again as well)
+                tasks_to_generate.append(task_idx)
+            elif planner.checkConfigPose_initialPositions(
+                    grasping_pose, cached_config_pose[0], cached_config_pose[1], robot, workspace, armType):
+                config_poses[task_idx] = cached_config_pose
+            else:
+                tasks_to_generate.append(task_idx)
+        num_cached = len(pose_tasks) - len(tasks_to_generate)
+
+        if self.num_processes > 1:
+            generated_config_poses = self.getPool().map(
+                generateConfigPoseInWorker, [(pose_tasks[task_idx][1], armType) for task_idx in tasks_to_generate])
+        else:
+            cylinder_position_candidates = {
+                candidate.position_idx : candidate for candidate in workspace.candidate_geometries.values()}
+            generated_config_poses = [planner.generateConfigBasedOnPose_initialPositions(
+                pose_tasks[task_idx][1], robot, workspace, armType, cylinder_position_candidates) \
+                                                                    for task_idx in tasks_to_generate]
+        for task_idx, config_pose in zip(tasks_to_generate, generated_config_poses):
+            config_poses[task_idx] = config_pose
+            if config_pose[0] != []:
+                object_position, grasping_pose = pose_tasks[task_idx]
+                self.cache.add(object_position, grasping_pose, armType, config_pose)
+        self.cache.save()
+        print("config poses of the start positions: {} cached, {} generated ({} processes) in {}s".format(
+            num_cached, len(tasks_to_generate), max(self.num_processes, 1), time.time() - start_time))
+        return config_poses
+
+    def close(self):
+        if self.pool != None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import time
+import threading
+from collections import deque
+
+import rospy
+
+import utils2
+from TrajectoryInterpolation import densifyObjectRearrangePath
+
+############################### description ###########################################
+### This module defines a StreamingExecutor class which
+### executes the object paths of a plan while the plan is still being searched.
+### The task planner commits the object paths of a prefix of the plan which it
+### will not revise any more (see RearrangementTaskPlanner.commitMonotonePrefix),
+### and a worker thread executes the committed paths in order through the
+### execute_trajectory/attach_object services of the execution scene
+### (the same sequence as utils2.executeWholePlan).
+### (1) backpressure: at most max_pending_paths paths wait for the execution.
+###     When the queue is full, a non-blocking commit is refused and the planner
+###     keeps searching (the prefix stays uncommitted and thus revisable).
+### (2) abort: if the rest of the plan fails, the paths not yet executed are dropped
+###     and the robot stops at the end of the path being executed.
+#######################################################################################
+
+
+class StreamingExecutor(object):
+    def __init__(self, max_pending_paths=2):
+        self.max_pending_paths = max_pending_paths
+        self.pending_paths = deque() ### the committed paths yet to execute
+        self.condition = threading.Condition()
+        self.num_paths_committed = 0
+        self.num_paths_executed = 0
+        self.isFinished = False ### no more paths will be committed
+        self.isAborted = False
+        self.execute_success = True
+        self.resetHome_trajectory = None
+        self.execution_startTime = None
+        self.execution_endTime = None
+        self.worker = threading.Thread(target=self.executeCommittedPaths)
+        self.worker.daemon = True
+        self.worker.start()
+
+    def commitPath(self, object_path, block=False):
+        '''commit an object path to execute
+           return False (the path is not committed) if the executor is aborted or
+           the queue is full and block is False, otherwise wait for a free slot'''
+        with self.condition:
+            while (not self.isAborted) and (len(self.pending_paths) >= self.max_pending_paths):
+                if not block:
+                    return False
+                self.condition.wait()
+            if self.isAborted or self.isFinished:
+                return False
+            self.pending_paths.append(object_path)
+            self.num_paths_committed += 1
+            self.condition.notify_all()
+        return True
+
+    def finish(self, resetHome_trajectory=None):
+        '''no more paths are committed (the plan is complete), optionally reset the robot home
+           afterwards, wait for the execution to finish and return the execution success'''
+        with self.condition:
+            self.resetHome_trajectory = resetHome_trajectory
+            self.isFinished = True
+            self.condition.notify_all()
+        self.worker.join()
+        return self.execute_success and (not self.isAborted)
+
+    def abort(self):
+        '''the rest of the plan fails, drop the paths which are not executed yet'''
+        with self.condition:
+            if not self.isFinished:
+                rospy.logwarn("ABORT THE STREAMING EXECUTION: %s committed path(s) dropped" % str(len(self.pending_paths)))
+            self.pending_paths.clear()
+            self.isAborted = True
+            self.isFinished = True
+            self.condition.notify_all()
+        self.worker.join()
+
+    def executeCommittedPaths(self):
+        while True:
+            with self.condition:
+                while (len(self.pending_paths) == 0) and (not self.isFinished):
+                    self.condition.wait()
+                if len(self.pending_paths) == 0:
+                    ### finished (or aborted) and nothing left to execute
+                    break
+                object_path = self.pending_paths.popleft()
+                self.condition.notify_all() ### a slot is free for the planner
+            if self.execution_startTime == None:
+                self.execution_startTime = time.time()
+            self.executeObjectPath(object_path)
+            self.num_paths_executed += 1
+        if (not self.isAborted) and (self.resetHome_trajectory != None):
+            execute_success = utils2.serviceCall_execute_trajectory(self.resetHome_trajectory)
+            self.execute_success = self.execute_success and (execute_success == True)
+        self.execution_endTime = time.time()
+
+    def executeObjectPath(self, object_path):
+        ### the path can be sparse if it is committed during the search
+        path = densifyObjectRearrangePath(object_path)
+        rospy.logwarn("STREAMING EXECUTION: rearrange object %s" % str(path.object_idx))
+        ### first execute the transit trajectory in the path
+        execute_success = utils2.serviceCall_execute_trajectory(path.transit_trajectory)
+        ### now attach the object
+        attach_success = utils2.serviceCall_attach_object(
+            attach=True, object_idx=path.object_idx, armType=path.transit_trajectory.armType)
+        ### then execute the transfer trajectory in the path
+        execute_success = utils2.serviceCall_execute_trajectory(path.transfer_trajectory) and execute_success
+        ### now detach the object
+        attach_success = utils2.serviceCall_attach_object(
+            attach=False, object_idx=path.object_idx, armType=path.transit_trajectory.armType) and attach_success
+        ### finally execute the finish trajectory in the path
+        execute_success = utils2.serviceCall_execute_trajectory(path.finish_trajectory) and execute_success
+        self.execute_success = self.execute_success and (execute_success == True) and (attach_success == True)
+
+    def reportExecutionStats(self):
+        print("streaming execution: #paths committed: {}, #paths executed: {}, aborted: {}".format(
+            self.num_paths_committed, self.num_paths_executed, self.isAborted))
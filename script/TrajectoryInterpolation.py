@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import math
+import numpy as np
+
+from sensor_msgs.msg import JointState
+from uniform_object_rearrangement.msg import ArmTrajectory
+from uniform_object_rearrangement.msg import ObjectRearrangePath
+
+############################### description ###########################################
+### This module interpolates joint-space trajectories without a physics server.
+### During the search, a plan scene in sparse mode returns the waypoints of the
+### smoothed paths only (see ArmTrajectory.msg): the start config followed by the
+### roadmap node configs and the endpoint configs of each segment.
+### The dense trajectory (1 degree resolution) is only generated for the harvested
+### solution, by interpolating the straight-line segments between the waypoints,
+### which gives the same trajectory as Planner.generateTrajectory_DirectConfigPath.
+#######################################################################################
+
+
+def interpolateConfigs(n1, n2, min_degree=math.pi/180*1):
+    '''interpolate the straight-line path between two configs n1, n2
+       (a list of 7 or 8 joint values) with a resolution of min_degree
+       return a list of configs which includes the endtail but not the head'''
+    n1 = np.array(n1, dtype=float)
+    n2 = np.array(n2, dtype=float)
+    nseg = int(np.max(np.abs(n1 - n2)) / min_degree)
+    if nseg == 0: nseg += 1
+    ### all the waypoints at once: row i is n1 + (n2-n1) / nseg * i (i = 1, ..., nseg)
+    steps = np.arange(1, nseg+1, dtype=float).reshape(-1, 1)
+    config_edge_traj = n1 + (n2 - n1) / nseg * steps
+    return config_edge_traj.tolist()
+
+
+def densifyArmTrajectory(arm_trajectory):
+    '''generate the dense ArmTrajectory of a sparse ArmTrajectory
+       a dense ArmTrajectory is returned as it is'''
+    if not arm_trajectory.isSparse:
+        return arm_trajectory
+    dense_trajectory = ArmTrajectory()
+    dense_trajectory.armType = arm_trajectory.armType
+    waypoints = [list(joint_state.position) for joint_state in arm_trajectory.trajectory]
+    if len(waypoints) == 0:
+        return dense_trajectory
+    jointNames = arm_trajectory.trajectory[0].name
+    ### the first waypoint is the start config (the head) which is not part of the trajectory
+    for i in range(0, len(waypoints)-1):
+        for config in interpolateConfigs(waypoints[i], waypoints[i+1]):
+            joint_state = JointState()
+            joint_state.name = jointNames
+            joint_state.position = config
+            dense_trajectory.trajectory.append(joint_state)
+    return dense_trajectory
+
+
+def densifyObjectRearrangePath(object_path):
+    '''generate the dense ObjectRearrangePath (transit, transfer and finish trajectories)
+       of an ObjectRearrangePath which may contain sparse trajectories'''
+    dense_path = ObjectRearrangePath()
+    dense_path.transit_trajectory = densifyArmTrajectory(object_path.transit_trajectory)
+    dense_path.transfer_trajectory = densifyArmTrajectory(object_path.transfer_trajectory)
+    dense_path.finish_trajectory = densifyArmTrajectory(object_path.finish_trajectory)
+    dense_path.object_idx = object_path.object_idx
+    return dense_path
+
+
+def getStraightLineCorners(waypoints, tolerance=1e-6):
+    '''return the indices of the waypoints where the path changes its direction
+       (including the first and the last waypoint), so that the path between two
+       consecutive corners is a straight line in the joint space'''
+    diffs = np.diff(waypoints, axis=0)
+    norms = np.linalg.norm(diffs, axis=1)
+    moving = np.nonzero(norms > 1e-9)[0] ### the diffs which move the robot
+    if len(moving) == 0:
+        return [0, len(waypoints)-1]
+    directions = diffs[moving] / norms[moving].reshape(-1, 1)
+    cosines = np.sum(directions[1:] * directions[:-1], axis=1)
+    ### a diff which changes the direction starts at a corner
+    corners = moving[1:][cosines < 1.0 - tolerance]
+    return [0] + corners.tolist() + [len(waypoints)-1]
+
+
+def trapezoidalProfile(distance, max_velocity, max_acceleration, times):
+    '''the distance traveled at times along a trapezoidal velocity profile
+       which starts and ends at rest (a triangular profile if max_velocity is not reached)'''
+    accel_time = max_velocity / max_acceleration
+    if max_acceleration * accel_time * accel_time >= distance:
+        ### triangular profile
+        accel_time = math.sqrt(distance / max_acceleration)
+        peak_velocity = max_acceleration * accel_time
+        cruise_time = 0.0
+    else:
+        peak_velocity = max_velocity
+        cruise_time = (distance - max_acceleration * accel_time * accel_time) / max_velocity
+    decel_start = accel_time + cruise_time
+    accel_distance = 0.5 * max_acceleration * accel_time * accel_time
+    times = np.asarray(times, dtype=float)
+    traveled = np.where(
+        times < accel_time,
+        0.5 * max_acceleration * times * times,
+        np.where(
+            times < decel_start,
+            accel_distance + peak_velocity * (times - accel_time),
+            distance - 0.5 * max_acceleration * np.square(np.maximum(2*accel_time + cruise_time - times, 0.0))))
+    return np.minimum(traveled, distance)
+
+
+def timeParameterizeWaypoints(waypoints, max_velocity, max_acceleration, control_rate):
+    '''time-parameterize a piecewise straight-line path in the joint space
+       inputs
+       ======
+           waypoints (#waypoints x #joints): the path, waypoints[0] is the start config
+           max_velocity (rad/s), max_acceleration (rad/s^2): the limits of each joint
+           control_rate (Hz): the rate at which the configs are sampled
+       outputs
+       =======
+           times (a list of float): the time (s) to reach each config since the start
+           configs (a list of list): the configs sampled at (at most) 1/control_rate apart
+       Each straight-line segment (between two corners) follows a trapezoidal profile
+       which starts and ends at rest, so the velocity is continuous at the corners.
+       The joint which moves the most in a segment moves at the limits.'''
+    waypoints = np.array(waypoints, dtype=float)
+    times = []
+    configs = []
+    segment_start_time = 0.0
+    corners = getStraightLineCorners(waypoints)
+    for i in range(len(corners)-1):
+        q_start = waypoints[corners[i]]
+        q_end = waypoints[corners[i+1]]
+        distance = np.max(np.abs(q_end - q_start))
+        if distance == 0.0:
+            continue
+        accel_time = min(max_velocity / max_acceleration, math.sqrt(distance / max_acceleration))
+        cruise_time = max(distance - max_acceleration * accel_time * accel_time, 0.0) / max_velocity
+        duration = 2 * accel_time + cruise_time
+        nsamples = max(int(math.ceil(duration * control_rate)), 1)
+        segment_times = np.arange(1, nsamples+1) * (duration / nsamples)
+        traveled = trapezoidalProfile(distance, max_velocity, max_acceleration, segment_times)
+        segment_configs = q_start + (q_end - q_start) * (traveled / distance).reshape(-1, 1)
+        times += (segment_start_time + segment_times).tolist()
+        configs += segment_configs.tolist()
+        segment_start_time += duration
+    return times, configs
+
+
+def getPathLength(waypoints):
+    '''the length of a path in the joint space
+       (the sum of the euclidean distances between consecutive waypoints)'''
+    waypoints = np.array(waypoints, dtype=float)
+    if len(waypoints) < 2:
+        return 0.0
+    return float(np.sum(np.linalg.norm(np.diff(waypoints, axis=0), axis=1)))
+
+
+def getArmTrajectoryWaypoints(arm_trajectory, start_config):
+    '''the waypoints of an ArmTrajectory which start with its start config
+       (a sparse trajectory already starts with it, see ArmTrajectory.msg)'''
+    waypoints = [list(joint_state.position) for joint_state in arm_trajectory.trajectory]
+    if arm_trajectory.isSparse:
+        return waypoints
+    return [list(start_config)] + waypoints
@@ -6,7 +6,6 @@ import sys
 import os
 import copy
 import numpy as np
-import random
 from collections import OrderedDict
 
 import rospy
@@ -28,35 +27,50 @@ def enablePrint():
 
 class UnidirMRSPlanner(RearrangementTaskPlanner):
     def __init__(
-        self, initial_arrangement, final_arrangement, time_allowed, isLabeledRoadmapUsed=True):
+        self, initial_arrangement, final_arrangement, time_allowed, isLabeledRoadmapUsed=True, isAnytime=False,
+        heuristic_level=0):
         RearrangementTaskPlanner.__init__(
-            self, initial_arrangement, final_arrangement, time_allowed, isLabeledRoadmapUsed)
+            self, initial_arrangement, final_arrangement, time_allowed, isLabeledRoadmapUsed, isAnytime)
         rospy.logwarn("initialize an unidirectional MRS planner")
-        self.heuristic_level = 0
+        ### 0: random node/object/buffer, 1: object ranked by constraints
+        ### 2 (3): informed node/buffer selection with random (constraint-ranked) object
+        self.heuristic_level = heuristic_level
 
         remaining_time_allowed = self.time_threshold - (time.time() - self.planning_startTime)
         self.growSubTree(self.treeL["L0"], self.final_arrangement, remaining_time_allowed, self.isLabeledRoadmapUsed)
-        while (self.isSolved == False):
+        if self.isAnytime: self.updateBestSolution()
+        ### in anytime mode, keep perturbing and growing after a solution is found
+        while (self.isSolved == False) or (self.isAnytime and self.isSolutionImprovable()):
             remaining_time_allowed = self.time_threshold - (time.time() - self.planning_startTime)
             if (remaining_time_allowed > 0):
                 ### do a perturbation
                 perturb_success, perturb_node = self.perturbNode()
                 if not perturb_success: continue
-                else: 
+                else:
                     remaining_time_allowed = self.time_threshold - (time.time() - self.planning_startTime)
+                    num_nodes = len(self.treeL)
                     self.growSubTree(perturb_node, self.final_arrangement, remaining_time_allowed, self.isLabeledRoadmapUsed)
+                    if len(self.treeL) == num_nodes:
+                        ### nothing grows from the perturbation
+                        self.recordPerturbationFailure(perturb_node.parent_id)
+                    if self.isAnytime: self.updateBestSolution()
             else:
                 break
 
         if self.isSolved:
             self.harvestSolution()
+            if self.isAnytime: self.reportSolutionCostCurve()
 
 
     def perturbNode(self):
         '''this function selects a node to perturb by
            choosing an object to put on a buffer'''
         ### (i) first randomly select a node
-        temp_node_id = random.choice(self.idLeftRegistr)
+        nodes_to_perturb = self.getNodesToPerturb()
+        if len(nodes_to_perturb) == 0:
+            ### (anytime mode) no node can lead to a better solution
+            return False, None
+        temp_node_id = self.pickNodeToPerturb(nodes_to_perturb)
         temp_node = self.treeL[temp_node_id]
         set_scene_success = self.serviceCall_setSceneBasedOnArrangementNode(temp_node.arrangement, temp_node.robotConfig, "Right_torso")
         ### (ii) randomly select an object and then buffer
@@ -66,6 +80,7 @@ class UnidirMRSPlanner(RearrangementTaskPlanner):
                             objects_yet_to_move, self.final_arrangement, "Right_torso", self.heuristic_level, self.isLabeledRoadmapUsed)
         if success == False:
             ### the perturbation process fails either due to failure to select an object or the failure to select a buffer
+            self.recordPerturbationFailure(temp_node_id)
             return False, None
         else:
             ### the perturbation is a success, generate a tree node for this perturbation
@@ -169,8 +184,12 @@ class UnidirMRSPlanner(RearrangementTaskPlanner):
                     if subTree[child_id].arrangement == self.final_arrangement:
                         rospy.logwarn("SOLUTION HAS BEEN FOUND")
                         self.isSolved = True
-                        self.finalNodeID = "L"+str(self.left_idx)
-                        return
+                        if self.isAnytime:
+                            ### keep engrafting, the best solution is picked in updateBestSolution()
+                            self.finalNodeIDs.append("L"+str(self.left_idx))
+                        else:
+                            self.finalNodeID = "L"+str(self.left_idx)
+                            return
                 
                 ### before move on to other children, add this child into the queue for future expansion
                 queue.insert(0, child_id)
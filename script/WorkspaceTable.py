@@ -11,9 +11,10 @@ import numpy as np
 import time
 import IPython
 import random
+import copy
 
 from CollisionChecker import CollisionChecker
-import utils
+from InstanceGeneration import sampleInstancePositions
 
 from uniform_object_rearrangement.msg import CylinderObj
 
@@ -183,11 +184,30 @@ class WorkspaceTable(object):
         self.object_interval_x = object_interval_x
         self.object_interval_y = object_interval_y
 
+    def getInstanceSamplingArea(self):
+        ### the area where the objects of a random instance are placed: the (x,y) limits of the
+        ### object centers, the height of the object centers, and the minimum distance between two
+        ### object centers (more than one object diameter apart, plus a margin for the rounding to mm)
+        x_limit = [self.constrained_area_x_limit[0] + self.cylinder_radius, \
+                   self.constrained_area_x_limit[1] - self.side_clearance_x - self.cylinder_radius]
+        y_limit = [self.constrained_area_y_limit[0] + self.side_clearance_y + self.cylinder_radius, \
+                   self.constrained_area_y_limit[1] - self.side_clearance_y - self.cylinder_radius]
+        z = round(self.tablePosition[2] + self.table_dim[2] / 2 + self.cylinder_height / 2, 3)
+        min_distance = 4 * self.cylinder_radius + 0.002
+        return x_limit, y_limit, z, min_distance
+
     def generateInstance_cylinders(self, num_objects):
         ### return: success (bool)
         self.num_objects = num_objects ### obtain the number of objects
         self.object_geometries = OrderedDict()
         print("--------generate an instance---------")
+        ### sample the start positions analytically (no collision query), see InstanceGeneration
+        x_limit, y_limit, z, min_distance = self.getInstanceSamplingArea()
+        positions_xy = sampleInstancePositions(self.num_objects, x_limit, y_limit, min_distance)
+        if positions_xy is None:
+            ### the objects do not fit in the workspace, the instance generation fails...
+            print("{} objects do not fit in the workspace".format(self.num_objects))
+            return False
         cylinder_c = p.createCollisionShape(shapeType=p.GEOM_CYLINDER,
                                                 radius=self.cylinder_radius, height=self.cylinder_height, 
                                                 physicsClientId=self.server)
@@ -196,33 +216,12 @@ class WorkspaceTable(object):
             cylinder_v = p.createVisualShape(shapeType=p.GEOM_CYLINDER,
                                                 radius=self.cylinder_radius, length=self.cylinder_height, 
                                                 rgbaColor=rgbacolor, physicsClientId=self.server)
-            isCollision = True
-            timeout = 20
-            while isCollision and timeout > 0:
-                print("generate the {}th object".format(obj_i))
-                timeout -= 1
-                start_pos = [
-                    round(random.uniform(self.constrained_area_x_limit[0] + self.cylinder_radius, \
-                            self.constrained_area_x_limit[1] - self.side_clearance_x - self.cylinder_radius), 3),
-                    round(random.uniform(self.constrained_area_y_limit[0] + self.side_clearance_y + self.cylinder_radius, \
-                            self.constrained_area_y_limit[1] - self.side_clearance_y - self.cylinder_radius), 3),
-                    round(self.tablePosition[2] + self.table_dim[2] / 2 + self.cylinder_height / 2, 3)
-                ]
-                cylinder_objectM = p.createMultiBody(
-                            baseCollisionShapeIndex=cylinder_c, baseVisualShapeIndex=cylinder_v,
-                            basePosition=start_pos, physicsClientId=self.server)
-                isCollision = self.collisionAgent.collisionCheck_instance_cylinder_objects(
-                    cylinder_objectM, [obj_geo.geo for obj_geo in self.object_geometries.values()], self.cylinder_radius)
-                if isCollision:
-                    ### remove that mesh as it is invalid (collision with existing object meshes)
-                    p.removeBody(cylinder_objectM)
-            if isCollision:
-                ### could not fit in this object, the instance generation fails...
-                return False
-            else:
-                ### congrats, the object's location is accepted
-                self.object_geometries[obj_i] = CylinderObject(
-                    obj_i, start_pos, cylinder_objectM, self.cylinder_radius, self.cylinder_height)
+            start_pos = [round(positions_xy[obj_i][0], 3), round(positions_xy[obj_i][1], 3), z]
+            cylinder_objectM = p.createMultiBody(
+                        baseCollisionShapeIndex=cylinder_c, baseVisualShapeIndex=cylinder_v,
+                        basePosition=start_pos, physicsClientId=self.server)
+            self.object_geometries[obj_i] = CylinderObject(
+                obj_i, start_pos, cylinder_objectM, self.cylinder_radius, self.cylinder_height)
 
         ############## print to confirm ##############
         for obj_idx in range(self.num_objects):
@@ -364,13 +363,12 @@ class WorkspaceTable(object):
     def deployAllPositionCandidates(self, generateMesh=True, discretization_x=None, discretization_y=None):
         ################ This function calculates all possible postions (x,y) ################
         ################### given the constrained area + discretization ######################
-        ############### and generates the candidate meshes if necessary ######################
+        ############# and prepares the candidate meshes if necessary, which are ##############
+        ############# only created when a collision query needs them (lazily) ################
         self.candidate_geometries = OrderedDict()
-        cylinder_c = p.createCollisionShape(shapeType=p.GEOM_CYLINDER,
-            radius=self.cylinder_radius, height=self.cylinder_height, physicsClientId=self.server)
-        rgbacolor = [0.5, 0.5, 0.5, 0.15]
-        cylinder_v = p.createVisualShape(shapeType=p.GEOM_CYLINDER,
-            radius=self.cylinder_radius, length=self.cylinder_height, rgbaColor=rgbacolor, physicsClientId=self.server)        
+        self.candidate_mesh_shapes = None
+        ### the candidates whose meshes are created, in the order of creation
+        self.candidates_with_mesh = []
 
         if discretization_x == None: discretization_x = self.discretization_x
         if discretization_y == None: discretization_y = self.discretization_y
@@ -382,23 +380,22 @@ class WorkspaceTable(object):
         self.n_candidates_y = \
             int(np.floor((self.constrained_area_dim[1] - 2*self.side_clearance_y + discretization_y - 2*self.cylinder_radius) / discretization_y))
 
-        candidate_idx = 0
-        for x_i in range(self.n_candidates_x):
-            for y_j in range(self.n_candidates_y):
-                candidate_pos = [
-                    round(self.constrained_area_x_limit[0] + 0.02 + self.cylinder_radius + discretization_x * x_i, 3),
-                    round(self.constrained_area_y_limit[0] + self.side_clearance_y + self.cylinder_radius + discretization_y * y_j, 3),
-                    round(self.tablePosition[2] + self.table_dim[2] / 2 + self.cylinder_height / 2, 3)                    
-                ]
-                if generateMesh:
-                    cylinder_objectM = p.createMultiBody(
-                        baseCollisionShapeIndex=cylinder_c, baseVisualShapeIndex=cylinder_v, \
-                        basePosition=candidate_pos, physicsClientId=self.server)
-                else:
-                    cylinder_objectM = None
-                self.candidate_geometries[candidate_idx] = CylinderCandidate(
-                                    candidate_idx, candidate_pos, cylinder_objectM, self.cylinder_radius, self.cylinder_height)
-                candidate_idx += 1
+        ### the grid index (x_i, y_j) of each candidate (candidate_idx = x_i * n_candidates_y + y_j)
+        ### and the positions of all the candidates (#candidates x 3)
+        grid_x, grid_y = np.meshgrid(np.arange(self.n_candidates_x), np.arange(self.n_candidates_y), indexing="ij")
+        self.candidate_grid_indices = np.stack([grid_x.ravel(), grid_y.ravel()], axis=1)
+        self.candidate_positions = np.zeros((len(self.candidate_grid_indices), 3))
+        self.candidate_positions[:, 0] = np.round(self.constrained_area_x_limit[0] + 0.02 + self.cylinder_radius \
+                                                    + discretization_x * self.candidate_grid_indices[:, 0], 3)
+        self.candidate_positions[:, 1] = np.round(self.constrained_area_y_limit[0] + self.side_clearance_y + self.cylinder_radius \
+                                                    + discretization_y * self.candidate_grid_indices[:, 1], 3)
+        self.candidate_positions[:, 2] = round(self.tablePosition[2] + self.table_dim[2] / 2 + self.cylinder_height / 2, 3)
+        self.candidate_discretization = [discretization_x, discretization_y]
+
+        for candidate_idx, candidate_pos in enumerate(self.candidate_positions.tolist()):
+            self.candidate_geometries[candidate_idx] = CylinderCandidate(
+                    candidate_idx, candidate_pos, None, self.cylinder_radius, self.cylinder_height,
+                    self.createCandidateMesh if generateMesh else None)
         self.num_candidates = len(self.candidate_geometries)
         self.positionCandidate_x_limit = [self.candidate_geometries[0].pos[0], \
                                           self.candidate_geometries[self.num_candidates-1].pos[0]]
@@ -408,6 +405,41 @@ class WorkspaceTable(object):
         # for candidate_idx, cylinder_candidate in self.candidate_geometries.items():
         #     print(str(candidate_idx) + ": " + str(cylinder_candidate.pos))
 
+    def createCandidateMesh(self, candidate_idx):
+        ### the mesh of a position candidate (the shapes are shared by all the candidates)
+        if self.candidate_mesh_shapes == None:
+            cylinder_c = p.createCollisionShape(shapeType=p.GEOM_CYLINDER,
+                radius=self.cylinder_radius, height=self.cylinder_height, physicsClientId=self.server)
+            rgbacolor = [0.5, 0.5, 0.5, 0.15]
+            cylinder_v = p.createVisualShape(shapeType=p.GEOM_CYLINDER,
+                radius=self.cylinder_radius, length=self.cylinder_height, rgbaColor=rgbacolor, physicsClientId=self.server)
+            self.candidate_mesh_shapes = [cylinder_c, cylinder_v]
+        self.candidates_with_mesh.append(candidate_idx)
+        return p.createMultiBody(
+            baseCollisionShapeIndex=self.candidate_mesh_shapes[0], baseVisualShapeIndex=self.candidate_mesh_shapes[1], \
+            basePosition=self.candidate_geometries[candidate_idx].pos, physicsClientId=self.server)
+
+    def getCandidatesWithMesh(self):
+        ### the candidates whose meshes are created (in the order of creation), e.g., recorded
+        ### with a saved physics state, which only matches the bodies existing when it was saved
+        return list(self.candidates_with_mesh)
+
+    def setCandidatesWithMesh(self, candidates_with_mesh):
+        ### remove/create the candidate meshes so that exactly candidates_with_mesh have a mesh,
+        ### in the same order (e.g., before a saved physics state is restored)
+        ### the meshes created after the common part are the last bodies, they are removed
+        ### from the last one so that the order of the other bodies is kept
+        num_common = 0
+        while (num_common < min(len(candidates_with_mesh), len(self.candidates_with_mesh))) and \
+                (candidates_with_mesh[num_common] == self.candidates_with_mesh[num_common]):
+            num_common += 1
+        for candidate_idx in reversed(self.candidates_with_mesh[num_common:]):
+            p.removeBody(self.candidate_geometries[candidate_idx].mesh, physicsClientId=self.server)
+            self.candidate_geometries[candidate_idx].mesh = None
+        del self.candidates_with_mesh[num_common:]
+        for candidate_idx in candidates_with_mesh[num_common:]:
+            self.candidate_geometries[candidate_idx].geo
+
     def assignGoalPositions(self, object_interval_x=None, object_interval_y=None):
         ### assign goal positions based on #objects
         ### as well as object_interval_x and object_interval_y
@@ -438,38 +470,34 @@ class WorkspaceTable(object):
     def assignToNearestCandiate(self, position):
         ### given a position (x,y,z), calculate the nearest candidate to that position
         ### and return the idx of the position candidate
-        potential_neighbor_indexes = []
-        x_value = math.floor((position[0]-self.positionCandidate_x_limit[0])/self.discretization_x)
-        if x_value < 0:
-            ### very close to constraint area x lower limit
-            x_indexes = [0]
-        elif x_value >= self.n_candidates_x - 1:
-            ### very close to constraint area x upper limit
-            x_indexes = [self.n_candidates_x - 1] 
-        else:
-            x_indexes = [x_value, x_value+1]
-        y_value = math.floor((position[1]-self.positionCandidate_y_limit[0])/self.discretization_y)
-        if y_value < 0:
-            ### very close to constraint area y lower limit
-            y_indexes = [0]
-        elif y_value >= self.n_candidates_y - 1:
-            ### very close to constraint area y upper limit
-            y_indexes = [self.n_candidates_y - 1] 
-        else:
-            y_indexes = [y_value, y_value+1]
-
-        for y_idx in y_indexes:
-            for x_idx in x_indexes:
-                potential_neighbor_indexes.append(x_idx*self.n_candidates_y+y_idx)
-        ### find the nearest candidate
-        nearest_candidate_dist = np.inf
-        for neighbor_idx in potential_neighbor_indexes:
-            temp_dist = utils.computePoseDist_pos(position, self.candidate_geometries[neighbor_idx].pos)
-            if temp_dist < nearest_candidate_dist:
-                nearest_candidate_dist = temp_dist
-                nearest_candidate_idx = neighbor_idx
-
-        return nearest_candidate_idx
+        return int(self.assignToNearestCandidates([position])[0])
+
+    def assignToNearestCandidates(self, positions):
+        ### the batch version of assignToNearestCandiate (positions: #positions x 3)
+        ### the candidates are on a regular grid at the same height, so the nearest candidate
+        ### is given by the nearest grid index along x and y (clipped to the grid)
+        positions = np.array(positions, dtype=float).reshape(-1, 3)
+        x_indexes = np.clip(np.round((positions[:, 0] - self.positionCandidate_x_limit[0]) / self.candidate_discretization[0]),
+                                                                                    0, self.n_candidates_x - 1).astype(int)
+        y_indexes = np.clip(np.round((positions[:, 1] - self.positionCandidate_y_limit[0]) / self.candidate_discretization[1]),
+                                                                                    0, self.n_candidates_y - 1).astype(int)
+        return x_indexes * self.n_candidates_y + y_indexes
+
+    def getCandidateClearances(self, positions):
+        ### the distance (x,y) from each candidate to the nearest of the positions (#positions x 3)
+        ### (np.inf if there is no position)
+        positions = np.array(positions, dtype=float).reshape(-1, 3)
+        if len(positions) == 0:
+            return np.full(self.num_candidates, np.inf)
+        distances = np.linalg.norm(
+            self.candidate_positions[:, np.newaxis, 0:2] - positions[np.newaxis, :, 0:2], axis=2)
+        return np.min(distances, axis=1)
+
+    def getOccupiedCandidates(self, positions, clearance=None):
+        ### whether each candidate is occupied by the objects at the positions, i.e., an object of the same
+        ### cylinder (upright) would be within the clearance between the surfaces (default: 2*radius)
+        if clearance == None: clearance = 2 * self.cylinder_radius
+        return self.getCandidateClearances(positions) < 2 * self.cylinder_radius + clearance
 
 
     def updateObjectMesh(self, obj_idx, position_idx, orientation=[0, 0, 0, 1]):
@@ -541,21 +569,43 @@ class WorkspaceTable(object):
         #     print(obj_info.collision_position_idx)
         #     print("\n")
 
-    def selectNoCollisionBuffer(self, object_idx, target_position_idx):
+    def getObjectsState(self):
+        ### the position bookkeeping of all the objects (kept outside pybullet)
+        objects_state = OrderedDict()
+        for obj_idx, object_geometry in self.object_geometries.items():
+            objects_state[obj_idx] = [object_geometry.curr_position_idx, \
+                object_geometry.collision_position_idx, copy.deepcopy(object_geometry.curr_pos)]
+        return objects_state
+
+    def setObjectsState(self, objects_state):
+        ### restore the position bookkeeping of all the objects
+        ### (the object meshes are restored with the physics state)
+        for obj_idx, object_state in objects_state.items():
+            curr_position_idx, collision_position_idx, curr_pos = object_state
+            self.object_geometries[obj_idx].setCurrPosition(curr_position_idx, collision_position_idx, curr_pos)
+
+    def selectNoCollisionBuffer(self, object_idx, target_position_idx, reachability_map=None, position_candidates_configPoses=None):
         ### this function selects a buffer to put a specified object without collision
+        ### reachability_map, position_candidates_configPoses: if both given, the buffers without any
+        ### reachable grasp orientation in the map or valid IK in the stored config poses are pruned
         max_trials = 3
         current_trials = 1
         buffer_select_success = False
-        other_object_curr_geometries =[obj_info.geo for obj_info in self.object_geometries.values() if obj_info.object_index != object_idx]
+        ### the candidates within the safe distance (2*radius between the surfaces) of other existing objects
+        isCandidateOccupied = self.getOccupiedCandidates(
+            [obj_info.curr_pos for obj_info in self.object_geometries.values() if obj_info.object_index != object_idx])
+        buffer_choices = [buffer_idx for buffer_idx in range(self.num_candidates) \
+            if buffer_idx != self.object_geometries[object_idx].curr_position_idx and buffer_idx != target_position_idx]
+        if (reachability_map != None) and (position_candidates_configPoses != None):
+            buffer_choices = [buffer_idx for buffer_idx in buffer_choices \
+                if reachability_map.isCandidateReachable(buffer_idx, position_candidates_configPoses.get(buffer_idx))]
+        if len(buffer_choices) == 0:
+            return buffer_select_success, -1
         while (current_trials <= max_trials) and (buffer_select_success == False):
-            buffer_idx = random.choice(range(self.num_candidates))
-            while buffer_idx == self.object_geometries[object_idx].curr_position_idx or buffer_idx == target_position_idx:
-                ### the buffer is selected as the chosen object's current position or its target position
-                buffer_idx = random.choice(range(self.num_candidates))
+            ### the buffer is neither the chosen object's current position nor its target position
+            buffer_idx = random.choice(buffer_choices)
             ### now make sure the selected buffer has safe distance with other existing objects
-            isCollision = self.collisionAgent.collisionCheck_instance_cylinder_objects(
-                self.candidate_geometries[buffer_idx].geo, other_object_curr_geometries, self.cylinder_radius)
-            if not isCollision:
+            if not isCandidateOccupied[buffer_idx]:
                 buffer_select_success = True
                 break
             else:
@@ -563,6 +613,51 @@ class WorkspaceTable(object):
         ### reach here either success or not
         return buffer_select_success, buffer_idx
 
+    def getBufferRanking(self, object_idx, target_position_idx, final_arrangement, position_candidates_configPoses,
+                                                                                    reachability_map=None, isSampled=False):
+        ### this function ranks the buffers to put a specified object analytically
+        ### (no collision query), the buffers in collision with other objects are excluded
+        ### (as well as the buffers without any reachable grasp orientation in the reachability_map, if given,
+        ### and valid IK in the stored config poses)
+        ### the score of a buffer considers
+        ### (1) reachability: the ratio of grasping configs at the buffer
+        ###     whose labels are not occupied by other objects
+        ### (2) free space: the distance to the nearest other object
+        ### (3) whether the buffer blocks the goal of an object yet to move
+        ### isSampled: the buffers are sampled in proportion to their scores instead of sorted
+        other_object_infos = [obj_info for obj_info in self.object_geometries.values() if obj_info.object_index != object_idx]
+        occupied_labels = set([obj_info.collision_position_idx for obj_info in other_object_infos])
+        buffer_clearances = self.getCandidateClearances([obj_info.curr_pos for obj_info in other_object_infos])
+        goals_yet_to_reach = set([final_arrangement[obj_info.object_index] for obj_info in other_object_infos \
+            if obj_info.curr_position_idx != final_arrangement[obj_info.object_index]])
+        buffer_scores = {}
+        for buffer_idx in range(self.num_candidates):
+            if buffer_idx == self.object_geometries[object_idx].curr_position_idx or buffer_idx == target_position_idx:
+                continue
+            if (reachability_map != None) and \
+                    (not reachability_map.isCandidateReachable(buffer_idx, position_candidates_configPoses.get(buffer_idx))):
+                continue
+            ### same safe distance as selectNoCollisionBuffer (2*radius between the surfaces)
+            clearance = buffer_clearances[buffer_idx]
+            if clearance < 4 * self.cylinder_radius: continue
+            configPoses = position_candidates_configPoses[buffer_idx]
+            if len(configPoses.total_labels) == 0: continue
+            num_free_grasps = len(
+                [labels for labels in configPoses.total_labels if len(labels & occupied_labels) == 0])
+            if num_free_grasps == 0: continue
+            score = num_free_grasps / len(configPoses.total_labels)
+            score += min(clearance / (8 * self.cylinder_radius), 1.0)
+            if buffer_idx in goals_yet_to_reach: score -= 1.0
+            buffer_scores[buffer_idx] = score
+        if isSampled:
+            ### a random order where a buffer comes earlier with a higher probability the higher its score
+            ### (weighted sampling without replacement: key = u^(1/weight), weight = exp(score) > 0),
+            ### so that the perturbations of the same node/object do not keep trying the same buffers
+            buffer_keys = {buffer_idx : random.random() ** (1.0 / math.exp(score)) for buffer_idx, score in buffer_scores.items()}
+            return sorted(buffer_keys, key=lambda k : buffer_keys[k], reverse=True)
+        buffer_ranking = sorted(buffer_scores, key=lambda k : buffer_scores[k], reverse=True)
+        return buffer_ranking
+
     def getObjectConstraintRanking(self, objects_to_move, final_arrangement):
         ### this functions ranks the objects in the objects_to_move
         ### giving the reasoning about the their constraints
@@ -626,12 +721,20 @@ class CylinderObject(AnyObject):
         self.goal_position_idx = goal_position_idx
 
 class CylinderCandidate(object):
-    def __init__(self, position_idx, pos, geo, cylinder_radius, cylinder_height):
+    def __init__(self, position_idx, pos, geo, cylinder_radius, cylinder_height, createMesh=None):
         self.position_idx = position_idx
         self.pos = pos
-        self.geo = geo
+        self.mesh = geo
         self.cylinder_radius = cylinder_radius
         self.cylinder_height = cylinder_height
+        ### if given, createMesh(position_idx) creates the mesh the first time it is needed
+        self.createMesh = createMesh
+
+    @property
+    def geo(self):
+        if (self.mesh == None) and (self.createMesh != None):
+            self.mesh = self.createMesh(self.position_idx)
+        return self.mesh
 
 class objectInitialInfo(object):
     def __init__(self, object_idx, pos, position_idx, collision_position_idx):
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import time
+import sys
+import os
+
+from PybulletPlanScene import PybulletPlanScene
+from StartConfigPoses import StartConfigPosesGenerator
+from InstanceGeneration import loadInstancePositions
+from InstanceCorpus import CorpusInstance, InstanceCorpusWriter, getCorpusFile
+
+import rospy
+
+### This file builds the instance corpus of a number of objects (corpora/<num_objects>.obj)
+### from the instance folders of a source, which the experiments then stream instead of
+### setting up each instance (see InstanceCorpus.py)
+### source: examples (examples/<num_objects>/<instance_id>, not classified)
+###         final_experiments (final_experiments/<num_objects>/(non_)monotone_instances/<id>)
+###         side_experiments (side_experiments/<num_objects>/<id>, all monotone)
+### usage: rosrun uniform_object_rearrangement build_instance_corpus.py <num_objects> [source]
+
+def getInstanceFolders(rosPackagePath, num_objects, source):
+    ### return a list of (instance folder, monotonicity class)
+    def listInstanceFolders(folder):
+        if not os.path.exists(folder):
+            return []
+        instance_ids = sorted([int(name) for name in os.listdir(folder) \
+                                if name.isdigit() and os.path.isdir(os.path.join(folder, name))])
+        return [os.path.join(folder, str(instance_id)) for instance_id in instance_ids]
+
+    if source == "examples":
+        return [(instanceFolder, None) for instanceFolder in \
+                    listInstanceFolders(os.path.join(rosPackagePath, "examples", str(num_objects)))]
+    if source == "final_experiments":
+        objectFolder = os.path.join(rosPackagePath, "final_experiments", str(num_objects))
+        return [(instanceFolder, True) for instanceFolder in \
+                    listInstanceFolders(os.path.join(objectFolder, "monotone_instances"))] + \
+               [(instanceFolder, False) for instanceFolder in \
+                    listInstanceFolders(os.path.join(objectFolder, "non_monotone_instances"))]
+    if source == "side_experiments":
+        return [(instanceFolder, True) for instanceFolder in \
+                    listInstanceFolders(os.path.join(rosPackagePath, "side_experiments", str(num_objects)))]
+    raise ValueError("unknown source of instances: {}".format(source))
+
+
+def main(args):
+    num_objects = int(args[1])
+    source = args[2] if len(args) > 2 else "examples"
+    print("Let's build the instance corpus of {} objects from {}".format(num_objects, source))
+    pybullet_plan_scene = PybulletPlanScene(["PybulletPlanScene.py", "direct"])
+    robot_p = pybullet_plan_scene.robot_p
+    workspace_p = pybullet_plan_scene.workspace_p
+    planner_p = pybullet_plan_scene.planner_p
+    start_config_poses_generator = StartConfigPosesGenerator(
+        os.path.join(planner_p.roadmapFolder, "StartConfigPosesCache.obj"),
+        rospy.get_param("/start_config_poses/num_processes", 0),
+        rospy.get_param("/start_config_poses/cache_resolution", 0.005))
+
+    armType = "Right_torso"
+    corpusFile = getCorpusFile(pybullet_plan_scene.rosPackagePath, num_objects)
+    corpus_writer = InstanceCorpusWriter(corpusFile, num_objects,
+        workspace_p.candidate_positions, workspace_p.cylinder_radius, workspace_p.cylinder_height)
+    start_time = time.time()
+    for instance_id, (instanceFolder, isMonotone) in enumerate(
+            getInstanceFolders(pybullet_plan_scene.rosPackagePath, num_objects, source), 1):
+        positions = loadInstancePositions(instanceFolder)
+        corpus_instance = CorpusInstance(instance_id, positions, isMonotone=isMonotone,
+            source=os.path.relpath(instanceFolder, pybullet_plan_scene.rosPackagePath))
+        initial_arrangement, final_arrangement, success = workspace_p.reproduceInstance_cylinders(
+            corpus_instance.getCylinderObjects(workspace_p.cylinder_radius, workspace_p.cylinder_height))
+        if not success:
+            print("fail to reproduce the instance {}, skip it".format(instanceFolder))
+        else:
+            planner_p.generateAllConfigPoses_startPositions(robot_p, workspace_p, armType, start_config_poses_generator)
+            corpus_instance.initial_arrangement = initial_arrangement
+            corpus_instance.final_arrangement = final_arrangement
+            corpus_instance.config_poses = planner_p.getAllConfigPoses_startPositions()
+            corpus_writer.addInstance(corpus_instance)
+        ### clear the instance before moving on to the next instance
+        workspace_p.clear_planning_instance()
+        planner_p.resetPlannerParams()
+        robot_p.resetRobotToHomeConfiguration()
+    corpus_writer.close()
+    start_config_poses_generator.close()
+    print("the instance corpus of {} instances is saved to {} in {:.1f}s".format(
+        corpus_writer.num_instances, corpusFile, time.time() - start_time))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
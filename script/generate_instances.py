@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import time
+import sys
+import os
+
+from PybulletPlanScene import PybulletPlanScene
+from InstanceGeneration import generateInstanceSet
+
+### This file generates a set of random instances of a number of objects in the
+### examples/ layout (examples/<num_objects>/<instance_id>/instance_info.txt), numbered after
+### the existing instances, which can then be loaded by the experiments (see InstanceGeneration.py)
+### usage: rosrun uniform_object_rearrangement generate_instances.py <num_objects> <num_instances> [seed]
+
+def main(args):
+    num_objects = int(args[1])
+    num_instances = int(args[2])
+    seed = int(args[3]) if len(args) > 3 else None
+    print("Let's generate {} instances of {} objects".format(num_instances, num_objects))
+    ### the headless plan scene only provides the workspace parameters
+    pybullet_plan_scene = PybulletPlanScene(["PybulletPlanScene.py", "direct"])
+    examplesFolder = os.path.join(pybullet_plan_scene.rosPackagePath, "examples")
+
+    start_time = time.time()
+    instance_ids = generateInstanceSet(examplesFolder, num_objects, num_instances,
+                        pybullet_plan_scene.workspace_p.getInstanceSamplingArea(), seed=seed)
+    print("{} instances generated in {:.3f}s in {}: {}".format(
+        len(instance_ids), time.time() - start_time, os.path.join(examplesFolder, str(num_objects)), instance_ids))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
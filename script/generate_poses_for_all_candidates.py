@@ -9,17 +9,33 @@ import sys
 import os
 
 from PybulletPlanScene import PybulletPlanScene
+from CandidatesConfigPosesBuilder import buildCandidatesConfigPoses
 
 import rospy
 import rospkg
 
 ### This file generates multiple poses for
 ### each position candidate
+### with the "batch" argument (e.g., "direct batch"), the poses are generated without any
+### interaction in a process pool and saved to CandidatesConfigPoses.obj
+### (see CandidatesConfigPosesBuilder.py and /candidates_config_poses/* in task_specification.launch)
 
 def main(args):
     print("Let's generate multiple poses for each position candidate")
     pybullet_plan_scene = PybulletPlanScene(args)
 
+    if "batch" in args[1:]:
+        planner_p = pybullet_plan_scene.planner_p
+        planner_p.position_candidates_configPoses = buildCandidatesConfigPoses(
+            planner_p, pybullet_plan_scene.robot_p, pybullet_plan_scene.workspace_p, "Right_torso",
+            num_processes=rospy.get_param("/candidates_config_poses/num_processes", 4),
+            seed=rospy.get_param("/candidates_config_poses/seed", 0),
+            num_solutions=rospy.get_param("/candidates_config_poses/num_solutions", 3),
+            max_rounds=rospy.get_param("/candidates_config_poses/max_rounds", 6),
+            max_trials=rospy.get_param("/candidates_config_poses/max_trials", 10))
+        planner_p.serializeCandidatesConfigPoses()
+        return
+
     ### option 1: generates poses for all position candidate
     pybullet_plan_scene.planner_p.generatePosesForAllCandidates(
         pybullet_plan_scene.robot_p, pybullet_plan_scene.workspace_p, "Right_torso")
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import sys
+
+from PybulletPlanScene import PybulletPlanScene
+from ReachabilityMap import buildReachabilityMap
+
+import rospy
+
+### This file (re)generates the reachability map of all the position candidates
+### x grasp orientations (roadmaps/ReachabilityMap_Right_torso.npz) in a process pool,
+### which is needed each time the workspace parameters change
+### (see ReachabilityMap.py and /reachability_map/* in task_specification.launch)
+### usage: rosrun uniform_object_rearrangement generate_reachability_map.py direct
+
+def main(args):
+    print("Let's generate the reachability map of the position candidates")
+    pybullet_plan_scene = PybulletPlanScene(args)
+    planner_p = pybullet_plan_scene.planner_p
+
+    armType = "Right_torso"
+    reachability_map = buildReachabilityMap(
+        planner_p, pybullet_plan_scene.robot_p, pybullet_plan_scene.workspace_p, armType,
+        num_processes=rospy.get_param("/reachability_map/num_processes", 4),
+        seed=rospy.get_param("/reachability_map/seed", 0),
+        max_trials=rospy.get_param("/reachability_map/max_trials", 10))
+    reachability_map.save(planner_p.getReachabilityMapFile(armType))
+    print("the reachability map is saved to {}".format(planner_p.getReachabilityMapFile(armType)))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -24,7 +24,9 @@ def main(args):
 
     ### generate samples
     pybullet_plan_scene.planner_p.generateSamples(
-        nsamples, pybullet_plan_scene.robot_p, pybullet_plan_scene.workspace_p, "hybrid_space")
+        nsamples, pybullet_plan_scene.robot_p, pybullet_plan_scene.workspace_p, "hybrid_space",
+        batch_size=rospy.get_param("/roadmap_sampling/batch_size", 2000),
+        num_processes=rospy.get_param("/roadmap_sampling/num_processes", 0))
     pybullet_plan_scene.planner_p.samplesConnect_labeledRoadmap(
         pybullet_plan_scene.robot_p, pybullet_plan_scene.workspace_p, "Right_torso")
     
@@ -25,7 +25,9 @@ def main(args):
 
     # generate samples
     pybullet_plan_scene.planner_p.generateSamples(
-        nsamples, pybullet_plan_scene.robot_p, pybullet_plan_scene.workspace_p)
+        nsamples, pybullet_plan_scene.robot_p, pybullet_plan_scene.workspace_p,
+        batch_size=rospy.get_param("/roadmap_sampling/batch_size", 2000),
+        num_processes=rospy.get_param("/roadmap_sampling/num_processes", 0))
     # pybullet_plan_scene.planner_p.generateSamples(
     #     nsamples, pybullet_plan_scene.robot_p, pybullet_plan_scene.workspace_p, "hybrid_space")
     pybullet_plan_scene.planner_p.samplesConnect(
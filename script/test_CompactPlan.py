@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import pickle
+import numpy as np
+import pytest
+
+sensor_msgs_msg = pytest.importorskip("sensor_msgs.msg")
+uniform_object_rearrangement_msg = pytest.importorskip("uniform_object_rearrangement.msg")
+from CompactPlan import CompactPlan, saveCompactPlan, isCompactPlanSaved, loadPickledPlan, \
+    SEGMENT_EVENT_NONE, SEGMENT_EVENT_ATTACH, SEGMENT_EVENT_DETACH
+
+### This file checks the save -> load round trip of the compact plan format ###
+
+JOINT_NAMES = ["torso_joint_b1"] + ["arm_right_joint_{}".format(i) for i in range(1, 8)]
+
+
+def makeArmTrajectory(configs):
+    arm_trajectory = uniform_object_rearrangement_msg.ArmTrajectory()
+    arm_trajectory.armType = "Right_torso"
+    for config in configs:
+        joint_state = sensor_msgs_msg.JointState()
+        joint_state.name = JOINT_NAMES
+        joint_state.position = list(config)
+        arm_trajectory.trajectory.append(joint_state)
+    return arm_trajectory
+
+
+def makePlan(num_object_paths, rng):
+    object_paths = []
+    for path_idx in range(num_object_paths):
+        object_path = uniform_object_rearrangement_msg.ObjectRearrangePath()
+        object_path.transit_trajectory = makeArmTrajectory(rng.uniform(-1, 1, size=(rng.randint(1, 6), 8)))
+        object_path.transfer_trajectory = makeArmTrajectory(rng.uniform(-1, 1, size=(rng.randint(1, 6), 8)))
+        ### an empty segment is kept as an empty trajectory
+        object_path.finish_trajectory = makeArmTrajectory(np.zeros((path_idx % 2, 8)))
+        object_path.object_idx = 3 * path_idx + 1
+        object_paths.append(object_path)
+    return object_paths, makeArmTrajectory(rng.uniform(-1, 1, size=(4, 8)))
+
+
+def checkSamePlan(compact_plan, object_paths, resetHome_trajectory):
+    assert len(compact_plan) == len(object_paths)
+    for loaded_path, object_path in zip(compact_plan, object_paths):
+        assert loaded_path.object_idx == object_path.object_idx
+        for loaded_trajectory, arm_trajectory in [
+                (loaded_path.transit_trajectory, object_path.transit_trajectory),
+                (loaded_path.transfer_trajectory, object_path.transfer_trajectory),
+                (loaded_path.finish_trajectory, object_path.finish_trajectory)]:
+            assert loaded_trajectory.armType == arm_trajectory.armType
+            assert len(loaded_trajectory.trajectory) == len(arm_trajectory.trajectory)
+            for loaded_state, joint_state in zip(loaded_trajectory.trajectory, arm_trajectory.trajectory):
+                assert list(loaded_state.name) == JOINT_NAMES
+                ### the waypoints are stored in float32
+                assert np.allclose(loaded_state.position, joint_state.position, atol=1e-6)
+    loaded_resetHome = compact_plan.getResetHomeTrajectory()
+    assert np.allclose([joint_state.position for joint_state in loaded_resetHome.trajectory],
+                       [joint_state.position for joint_state in resetHome_trajectory.trajectory], atol=1e-6)
+    events = [event for (arm_trajectory, object_idx, event) in compact_plan.iterateSegments()]
+    assert events == [SEGMENT_EVENT_ATTACH, SEGMENT_EVENT_DETACH, SEGMENT_EVENT_NONE] * len(object_paths) + \
+                     [SEGMENT_EVENT_NONE]
+
+
+def test_save_load_roundtrip(tmp_path):
+    object_paths, resetHome_trajectory = makePlan(4, np.random.RandomState(0))
+    instanceFolder = str(tmp_path / "instance")
+    assert not isCompactPlanSaved(instanceFolder)
+    saveCompactPlan(object_paths, instanceFolder, resetHome_trajectory)
+    assert isCompactPlanSaved(instanceFolder)
+    compact_plan = CompactPlan(instanceFolder)
+    checkSamePlan(compact_plan, object_paths, resetHome_trajectory)
+    assert compact_plan[-1].object_idx == object_paths[-1].object_idx
+    with pytest.raises(IndexError):
+        compact_plan[len(object_paths)]
+
+
+def test_plan_without_reset_home(tmp_path):
+    object_paths, resetHome_trajectory = makePlan(2, np.random.RandomState(1))
+    saveCompactPlan(object_paths, str(tmp_path))
+    compact_plan = CompactPlan(str(tmp_path))
+    assert len(compact_plan) == 2
+    assert compact_plan.getResetHomeTrajectory() == None
+
+
+def test_load_pickled_plan(tmp_path):
+    object_paths, resetHome_trajectory = makePlan(3, np.random.RandomState(2))
+    f_path = open(str(tmp_path / "path.obj"), "wb")
+    pickle.dump(object_paths, f_path)
+    pickle.dump(resetHome_trajectory, f_path)
+    f_path.close()
+    checkSamePlan(loadPickledPlan(str(tmp_path)), object_paths, resetHome_trajectory)
+    ### nothing is written
+    assert not isCompactPlanSaved(str(tmp_path))
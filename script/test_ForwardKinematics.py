@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import os
+import numpy as np
+import pytest
+
+from ForwardKinematics import KinematicChain, getTransformFromPose, \
+    getRotationMatrixFromQuaternion, getQuaternionsFromRotationMatrices, getRotationMatricesAboutAxis
+
+### This file checks the numpy forward kinematics (against pybullet if it is installed) ###
+
+URDF_FILEPATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "urdf", "motoman.urdf")
+
+
+def test_quaternion_roundtrip():
+    rng = np.random.default_rng(0)
+    quats = rng.normal(size=(50, 4))
+    quats /= np.linalg.norm(quats, axis=1).reshape(-1, 1)
+    R = np.array([getRotationMatrixFromQuaternion(quat) for quat in quats])
+    recovered = getQuaternionsFromRotationMatrices(R)
+    ### q and -q are the same rotation
+    assert np.allclose(np.abs(np.sum(recovered * quats, axis=1)), 1.0)
+
+
+def test_rotation_about_axis():
+    angles = np.array([0.0, np.pi / 2, -1.0])
+    R = getRotationMatricesAboutAxis(np.array([0.0, 0.0, 1.0]), angles)
+    for rotation, angle in zip(R, angles):
+        expected = np.array([[np.cos(angle), -np.sin(angle), 0], [np.sin(angle), np.cos(angle), 0], [0, 0, 1]])
+        assert np.allclose(rotation, expected)
+        assert np.allclose(np.dot(rotation, rotation.T), np.eye(3))
+
+
+def test_chain_of_right_arm():
+    fk = KinematicChain(URDF_FILEPATH, "motoman_right_ee")
+    ### the torso + the 7 joints of the right arm
+    assert len(fk.joint_names) == 8
+    configs = np.zeros((3, len(fk.joint_names)))
+    positions, quaternions = fk.computeTipPoses(configs)
+    assert positions.shape == (3, 3)
+    assert quaternions.shape == (3, 4)
+    assert np.allclose(positions, positions[0])
+
+
+def test_against_pybullet():
+    p = pytest.importorskip("pybullet")
+    server = p.connect(p.DIRECT)
+    try:
+        robot = p.loadURDF(URDF_FILEPATH, basePosition=[0.1, -0.2, 0.3], useFixedBase=True, physicsClientId=server)
+        joint_indices = {}
+        tip_idx = None
+        for i in range(p.getNumJoints(robot, physicsClientId=server)):
+            info = p.getJointInfo(robot, i, physicsClientId=server)
+            joint_indices[info[1].decode()] = i
+            if info[12].decode() == "motoman_right_ee":
+                tip_idx = i
+        fk = KinematicChain(URDF_FILEPATH, "motoman_right_ee")
+        chain_indices = [joint_indices[name] for name in fk.joint_names]
+
+        def getTipTransform(config):
+            for joint_idx, value in zip(chain_indices, config):
+                p.resetJointState(robot, joint_idx, value, physicsClientId=server)
+            tip_state = p.getLinkState(robot, tip_idx, computeForwardKinematics=True, physicsClientId=server)
+            return getTransformFromPose([tip_state[0], tip_state[1]])
+
+        ### calibrate the root link at the home config as MotomanRobot does
+        home_config = np.zeros(len(fk.joint_names))
+        fk.calibrateBaseTransform(home_config, getTipTransform(home_config))
+
+        rng = np.random.default_rng(1)
+        configs = rng.uniform(-1.5, 1.5, size=(30, len(fk.joint_names)))
+        fk_transforms = fk.computeTipTransforms(configs)
+        for config, fk_transform in zip(configs, fk_transforms):
+            assert np.allclose(fk_transform, getTipTransform(config), atol=1e-6)
+    finally:
+        p.disconnect(server)
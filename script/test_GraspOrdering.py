@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import multiprocessing
+
+from GraspOrdering import GraspOrderingStats
+
+### This file checks that the grasp statistics of several plan scenes merge on save ###
+
+GRASP_A = [0.1, 0.2, 0.3]
+GRASP_B = [0.4, 0.5, 0.6]
+
+
+def recordAttempts(statsFile, grasping_config, isSuccess, num_attempts, stage="pick"):
+    grasp_ordering = GraspOrderingStats(statsFile, save_interval=0)
+    for attempt_i in range(num_attempts):
+        grasp_ordering.startAttempt(stage, grasping_config)
+        grasp_ordering.finishAttempt(isSuccess)
+        ### save after each attempt so that the processes interleave their saves
+        grasp_ordering.save()
+
+
+def test_save_merges_the_attempts(tmp_path):
+    statsFile = str(tmp_path / "GraspOrderingStats.obj")
+    grasp_ordering_1 = GraspOrderingStats(statsFile, save_interval=0)
+    grasp_ordering_2 = GraspOrderingStats(statsFile, save_interval=0)
+    grasp_ordering_1.startAttempt("pick", GRASP_A)
+    grasp_ordering_1.finishAttempt(True)
+    grasp_ordering_2.startAttempt("pick", GRASP_A)
+    grasp_ordering_2.finishAttempt(False)
+    grasp_ordering_2.startAttempt("place", GRASP_B)
+    grasp_ordering_2.finishAttempt(True)
+    grasp_ordering_1.save()
+    grasp_ordering_2.save()
+    ### saving again adds nothing
+    grasp_ordering_1.save()
+    stats = GraspOrderingStats(statsFile).stats
+    key_A = ("pick", grasp_ordering_1.getGraspKey(GRASP_A))
+    key_B = ("place", grasp_ordering_1.getGraspKey(GRASP_B))
+    assert sorted(stats.keys()) == sorted([key_A, key_B])
+    assert stats[key_A][:2] == [2, 1]
+    assert stats[key_B][:2] == [1, 1]
+    ### the last one to save sees the attempts of both
+    assert grasp_ordering_2.stats[key_A][:2] == [2, 1]
+
+
+def test_unsaved_attempts_stay_in_memory(tmp_path):
+    statsFile = str(tmp_path / "GraspOrderingStats.obj")
+    grasp_ordering = GraspOrderingStats(statsFile, save_interval=0)
+    grasp_ordering.startAttempt("pick", GRASP_A, isSaved=False)
+    ### starting a new attempt fails the one in progress
+    grasp_ordering.startAttempt("pick", GRASP_B)
+    grasp_ordering.finishAttempt(True)
+    grasp_ordering.save()
+    key_A = ("pick", grasp_ordering.getGraspKey(GRASP_A))
+    key_B = ("pick", grasp_ordering.getGraspKey(GRASP_B))
+    assert grasp_ordering.stats[key_A][:2] == [1, 0]
+    assert grasp_ordering.stats[key_B][:2] == [1, 1]
+    assert list(GraspOrderingStats(statsFile).stats.keys()) == [key_B]
+
+
+def test_save_interval(tmp_path):
+    statsFile = str(tmp_path / "GraspOrderingStats.obj")
+    grasp_ordering = GraspOrderingStats(statsFile, save_interval=2)
+    grasp_ordering.startAttempt("pick", GRASP_A)
+    grasp_ordering.finishAttempt(True)
+    assert GraspOrderingStats(statsFile).stats == {}
+    grasp_ordering.startAttempt("pick", GRASP_A)
+    grasp_ordering.finishAttempt(True)
+    assert GraspOrderingStats(statsFile).stats[("pick", grasp_ordering.getGraspKey(GRASP_A))][:2] == [2, 2]
+
+
+def test_concurrent_saves(tmp_path):
+    statsFile = str(tmp_path / "GraspOrderingStats.obj")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=recordAttempts, args=(statsFile, grasping_config, isSuccess, 25)) \
+        for grasping_config, isSuccess in [(GRASP_A, True), (GRASP_A, False), (GRASP_B, True), (GRASP_B, False)]]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    grasp_ordering = GraspOrderingStats(statsFile)
+    assert grasp_ordering.stats[("pick", grasp_ordering.getGraspKey(GRASP_A))][:2] == [50, 25]
+    assert grasp_ordering.stats[("pick", grasp_ordering.getGraspKey(GRASP_B))][:2] == [50, 25]
+
+
+def test_order_by_expected_cost(tmp_path):
+    grasp_ordering = GraspOrderingStats(str(tmp_path / "GraspOrderingStats.obj"), isOrderingUsed=True)
+    ### same mean time, different success rates
+    grasp_ordering.stats[("pick", grasp_ordering.getGraspKey(GRASP_A))] = [5, 0, 5.0]
+    grasp_ordering.stats[("pick", grasp_ordering.getGraspKey(GRASP_B))] = [5, 5, 5.0]
+    assert grasp_ordering.getOrder("pick", [GRASP_A, GRASP_B]) == [1, 0]
+    ### a grasp never tried comes between them
+    assert grasp_ordering.getOrder("pick", [GRASP_A, [0.7, 0.8, 0.9], GRASP_B]) == [2, 1, 0]
+    grasp_ordering.isOrderingUsed = False
+    assert grasp_ordering.getOrder("pick", [GRASP_A, GRASP_B]) == [0, 1]
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import numpy as np
+
+from IKSeeding import IKSeedDataset
+
+### This file checks the nearest-solution lookup and the online learning of the IK seeds ###
+
+
+def getEEPoses(configs):
+    ### a toy forward kinematics: the position is the first 3 joints, the orientation is fixed
+    configs = np.array(configs, dtype=float)
+    quaternions = np.tile([0.0, 0.0, 0.0, 1.0], (len(configs), 1))
+    return configs[:, :3], quaternions
+
+
+def makeDataset(**kwargs):
+    configs = [[0.0, 0.0, 0.0, 0.5], [1.0, 0.0, 0.0, 0.6], [0.0, 1.0, 0.0, 0.7], [0.0, 0.0, 1.0, 0.8]]
+    ik_dataset = IKSeedDataset(configs, **kwargs)
+    ik_dataset.computeEEPoses(getEEPoses)
+    return ik_dataset
+
+
+def test_not_ready_before_computing_poses():
+    ik_dataset = IKSeedDataset([[0.0, 0.0, 0.0, 0.5]])
+    assert not ik_dataset.isReady()
+    assert ik_dataset.getNearestConfigs([[0, 0, 0], [0, 0, 0, 1]]) == []
+    ### nothing is learned before the poses of the loaded configs are computed
+    assert not ik_dataset.addSolution([0.5, 0.5, 0.5, 0.0], [[0.5, 0.5, 0.5], [0, 0, 0, 1]])
+    ik_dataset.computeEEPoses(getEEPoses)
+    assert ik_dataset.isReady()
+
+
+def test_nearest_configs():
+    ik_dataset = makeDataset()
+    assert ik_dataset.getNearestConfigs([[0.9, 0.1, 0.0], [0, 0, 0, 1]]) == [[1.0, 0.0, 0.0, 0.6]]
+    assert ik_dataset.getNearestConfigs([[0.1, 0.0, 0.8], [0, 0, 0, 1]], k=2) == \
+        [[0.0, 0.0, 1.0, 0.8], [0.0, 0.0, 0.0, 0.5]]
+    ### q and -q are the same orientation
+    assert ik_dataset.getNearestConfigs([[0.1, 0.0, 0.8], [0, 0, 0, -1]]) == [[0.0, 0.0, 1.0, 0.8]]
+
+
+def test_orientation_distance():
+    ik_dataset = IKSeedDataset([[0.0], [1.0]], orientation_weight=10.0)
+    ik_dataset.computeEEPoses(lambda configs: (np.zeros((2, 3)), np.array([[0.0, 0.0, 0.0, 1.0], [1.0, 0.0, 0.0, 0.0]])))
+    assert ik_dataset.getNearestConfigs([[0, 0, 0], [0.9, 0.0, 0.0, 0.1]]) == [[1.0]]
+
+
+def test_add_solution():
+    ik_dataset = makeDataset(max_size=6, min_distance=0.01)
+    assert ik_dataset.addSolution([0.5, 0.5, 0.0, 0.1], [[0.5, 0.5, 0.0], [0, 0, 0, 1]])
+    assert ik_dataset.getNearestConfigs([[0.45, 0.5, 0.0], [0, 0, 0, 1]]) == [[0.5, 0.5, 0.0, 0.1]]
+    ### too close to a stored pose
+    assert not ik_dataset.addSolution([0.5, 0.5, 0.0, 0.2], [[0.505, 0.5, 0.0], [0, 0, 0, 1]])
+    assert ik_dataset.addSolution([0.5, 0.0, 0.5, 0.1], [[0.5, 0.0, 0.5], [0, 0, 0, 1]])
+    ### full
+    assert not ik_dataset.addSolution([0.0, 0.5, 0.5, 0.1], [[0.0, 0.5, 0.5], [0, 0, 0, 1]])
+    assert len(ik_dataset.configs) == len(ik_dataset.ee_poses) == 6
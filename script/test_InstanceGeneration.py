@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import numpy as np
+import pytest
+
+from InstanceGeneration import sampleInstancePositions, sampleHexagonalPacking, \
+    saveInstancePositions, loadInstancePositions, generateInstanceSet
+
+### This file checks the analytic instance generator ###
+
+
+def checkPositions(positions, num_objects, x_limit, y_limit, min_distance):
+    assert positions.shape == (num_objects, 2)
+    assert np.all(positions[:, 0] >= x_limit[0]) and np.all(positions[:, 0] <= x_limit[1])
+    assert np.all(positions[:, 1] >= y_limit[0]) and np.all(positions[:, 1] <= y_limit[1])
+    distances = np.linalg.norm(positions[:, np.newaxis, :] - positions[np.newaxis, :, :], axis=2)
+    distances[np.diag_indices(num_objects)] = np.inf
+    assert np.min(distances) > min_distance
+
+
+@pytest.mark.parametrize("num_objects", [1, 5, 14])
+def test_sparse_instance(num_objects):
+    rng = np.random.RandomState(0)
+    for instance_i in range(20):
+        positions = sampleInstancePositions(num_objects, [0.4, 1.1], [-0.6, 0.2], 0.1, rng)
+        checkPositions(positions, num_objects, [0.4, 1.1], [-0.6, 0.2], 0.1)
+
+
+def test_dense_instance_never_fails_spuriously():
+    ### as many objects as the densest packing of the area holds (a sequential placement gets stuck)
+    x_limit, y_limit, min_distance = [0.0, 1.0], [0.0, 1.0], 0.1
+    num_objects = len(sampleHexagonalPacking(x_limit, y_limit, min_distance, np.random.RandomState(0))) - 5
+    for seed in range(5):
+        positions = sampleInstancePositions(num_objects, x_limit, y_limit, min_distance, np.random.RandomState(seed))
+        assert positions is not None
+        checkPositions(positions, num_objects, x_limit, y_limit, min_distance)
+
+
+def test_infeasible_instance():
+    assert sampleInstancePositions(50, [0.0, 0.3], [0.0, 0.3], 0.1, np.random.RandomState(0)) is None
+    assert sampleInstancePositions(0, [0.0, 0.3], [0.0, 0.3], 0.1).shape == (0, 2)
+
+
+def test_deterministic_given_seed():
+    positions_1 = sampleInstancePositions(10, [0.0, 1.0], [0.0, 1.0], 0.1, np.random.RandomState(7))
+    positions_2 = sampleInstancePositions(10, [0.0, 1.0], [0.0, 1.0], 0.1, np.random.RandomState(7))
+    assert np.array_equal(positions_1, positions_2)
+
+
+def test_instance_set_roundtrip(tmp_path):
+    examplesFolder = str(tmp_path)
+    sampling_area = ([0.0, 1.0], [0.0, 1.0], 0.6, 0.1)
+    assert generateInstanceSet(examplesFolder, 6, 3, sampling_area, seed=0) == [1, 2, 3]
+    assert generateInstanceSet(examplesFolder, 6, 2, sampling_area, seed=1) == [4, 5]
+    positions = loadInstancePositions(str(tmp_path / "6" / "1"))
+    assert len(positions) == 6
+    assert all(position[2] == 0.6 for position in positions)
+    saveInstancePositions(positions, str(tmp_path / "copy"))
+    assert loadInstancePositions(str(tmp_path / "copy")) == positions
+    with pytest.raises(ValueError):
+        generateInstanceSet(examplesFolder, 50, 1, ([0.0, 0.3], [0.0, 0.3], 0.6, 0.1), seed=0)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import pytest
+
+rospy = pytest.importorskip("rospy")
+from ServiceProxyRegistry import ServiceProxyRegistry, isRetrySafe
+
+### This file checks when a failed service call is sent again ###
+
+
+class ScriptedProxy(object):
+    '''a service proxy which raises the scripted errors, then returns the request'''
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.requests = []
+        self.isClosed = False
+
+    def __call__(self, request):
+        self.requests.append(request)
+        if len(self.errors) != 0:
+            raise self.errors.pop(0)
+        return request
+
+    def close(self):
+        self.isClosed = True
+
+
+def test_retry_safe_without_connection():
+    error = rospy.ServiceException("unable to connect to service: [Errno 111] Connection refused")
+    assert isRetrySafe("/motoman_robot_execute/attach_object", error)
+    assert isRetrySafe("get_curr_robot_config", error)
+
+
+def test_retry_safe_transport_error():
+    error = rospy.ServiceException("transport error completing service call: receive_once[/x]: Connection reset")
+    ### the request may have been handled: only the idempotent services are sent again
+    assert isRetrySafe("/planning_scene/get_curr_robot_config", error)
+    assert isRetrySafe("set_scene_based_on_arrangement", error)
+    assert not isRetrySafe("/planning_scene/attach_object", error)
+    assert not isRetrySafe("/planning_scene/rearrange_cylinder_object", error)
+
+
+def test_not_retry_safe_handler_error():
+    error = rospy.ServiceException("service [/x] responded with an error: ")
+    assert not isRetrySafe("/planning_scene/get_curr_robot_config", error)
+
+
+def makeRegistry(monkeypatch, proxies):
+    registry = ServiceProxyRegistry()
+    proxies = list(proxies)
+    created = []
+
+    def getProxy(service_name, service_class):
+        if service_name not in registry.proxies:
+            registry.proxies[service_name] = proxies.pop(0)
+            created.append(registry.proxies[service_name])
+        return registry.proxies[service_name]
+    monkeypatch.setattr(registry, "getProxy", getProxy)
+    return registry, created
+
+
+def test_call_reconnects_once(monkeypatch):
+    broken_proxy = ScriptedProxy([rospy.ServiceException("transport error completing service call: reset")])
+    registry, created = makeRegistry(monkeypatch, [broken_proxy, ScriptedProxy([])])
+    assert registry.call("/planning_scene/get_curr_robot_config", None, "request") == "request"
+    assert broken_proxy.isClosed
+    assert len(created) == 2
+    num_calls, average_latency, max_latency, num_reconnections = \
+        registry.getLatencyStats("/planning_scene/get_curr_robot_config")
+    assert (num_calls, num_reconnections) == (1, 1)
+
+
+def test_call_is_not_repeated(monkeypatch):
+    broken_proxy = ScriptedProxy([rospy.ServiceException("transport error completing service call: reset")])
+    registry, created = makeRegistry(monkeypatch, [broken_proxy, ScriptedProxy([])])
+    with pytest.raises(rospy.ServiceException):
+        registry.call("/planning_scene/attach_object", None, "request")
+    ### the request is sent once and the broken connection is not reused
+    assert broken_proxy.requests == ["request"]
+    assert broken_proxy.isClosed
+    assert "/planning_scene/attach_object" not in registry.proxies
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+from __future__ import division
+
+import math
+import numpy as np
+import pytest
+
+pytest.importorskip("sensor_msgs.msg")
+pytest.importorskip("uniform_object_rearrangement.msg")
+from TrajectoryInterpolation import interpolateConfigs, getStraightLineCorners, \
+    trapezoidalProfile, timeParameterizeWaypoints
+
+### This file checks the interpolation and the time parameterization of the trajectories ###
+
+MAX_VELOCITY = 1.0
+MAX_ACCELERATION = 2.0
+CONTROL_RATE = 100.0
+
+
+def getVelocitiesAndAccelerations(times, configs):
+    times = np.array([0.0] + list(times))
+    configs = np.array(configs)
+    dts = np.diff(times)
+    velocities = np.diff(configs, axis=0) / dts.reshape(-1, 1)
+    accelerations = np.diff(velocities, axis=0) / ((dts[:-1] + dts[1:]) / 2).reshape(-1, 1)
+    return velocities, accelerations
+
+
+def test_interpolate_configs():
+    configs = interpolateConfigs([0.0, 0.0], [0.5, -0.2])
+    assert np.allclose(configs[-1], [0.5, -0.2])
+    ### as Planner.generateTrajectory_DirectConfigPath: int(max joint change / 1 degree) equal steps
+    assert len(configs) == int(0.5 / (math.pi / 180))
+    assert np.allclose(np.diff(np.array([[0.0, 0.0]] + configs), axis=0), [0.5 / len(configs), -0.2 / len(configs)])
+    assert interpolateConfigs([0.1, 0.2], [0.1, 0.2]) == [[0.1, 0.2]]
+
+
+def test_straight_line_corners():
+    waypoints = np.array([[0, 0], [1, 0], [2, 0], [2, 0], [2, 1], [3, 2]], dtype=float)
+    assert getStraightLineCorners(waypoints) == [0, 3, 4, 5]
+    assert getStraightLineCorners(np.zeros((3, 2))) == [0, 2]
+
+
+@pytest.mark.parametrize("distance", [0.05, 0.5, 3.0])
+def test_trapezoidal_profile(distance):
+    accel_time = min(MAX_VELOCITY / MAX_ACCELERATION, math.sqrt(distance / MAX_ACCELERATION))
+    cruise_time = max(distance - MAX_ACCELERATION * accel_time * accel_time, 0.0) / MAX_VELOCITY
+    duration = 2 * accel_time + cruise_time
+    times = np.linspace(0.0, duration, 2001)
+    traveled = trapezoidalProfile(distance, MAX_VELOCITY, MAX_ACCELERATION, times)
+    assert traveled[0] == 0.0
+    assert np.isclose(traveled[-1], distance)
+    dt = times[1] - times[0]
+    velocities = np.diff(traveled) / dt
+    assert np.all(velocities >= -1e-9)
+    assert np.max(velocities) <= MAX_VELOCITY + 1e-6
+    assert np.max(np.abs(np.diff(velocities) / dt)) <= MAX_ACCELERATION * (1 + 1e-3)
+    ### starts and ends at rest
+    assert velocities[0] <= MAX_ACCELERATION * dt
+    assert velocities[-1] <= MAX_ACCELERATION * dt
+
+
+def test_time_parameterize_waypoints():
+    waypoints = [[0.0, 0.0, 0.0], [0.4, 0.2, 0.0], [0.8, 0.4, 0.0], [0.8, -1.5, 0.3], [0.81, -1.5, 0.3]]
+    times, configs = timeParameterizeWaypoints(waypoints, MAX_VELOCITY, MAX_ACCELERATION, CONTROL_RATE)
+    assert len(times) == len(configs)
+    assert np.all(np.diff(times) > 0)
+    assert np.max(np.diff([0.0] + times)) <= 1.0 / CONTROL_RATE + 1e-9
+    ### the corners are reached and the path ends at the last waypoint
+    for corner in [waypoints[2], waypoints[3], waypoints[4]]:
+        assert np.min(np.linalg.norm(np.array(configs) - corner, axis=1)) < 1e-9
+    assert np.allclose(configs[-1], waypoints[-1])
+    velocities, accelerations = getVelocitiesAndAccelerations(times, [waypoints[0]] + configs)
+    assert np.max(np.abs(velocities)) <= MAX_VELOCITY + 1e-6
+    assert np.max(np.abs(accelerations)) <= MAX_ACCELERATION * 1.05
+    ### ends at rest
+    assert np.max(np.abs(velocities[-1])) <= MAX_ACCELERATION / CONTROL_RATE
+
+
+def test_time_parameterize_still_path():
+    times, configs = timeParameterizeWaypoints([[0.1, 0.2], [0.1, 0.2]], MAX_VELOCITY, MAX_ACCELERATION, CONTROL_RATE)
+    assert times == [] and configs == []
@@ -11,11 +11,14 @@ import math
 import numpy as np
 import time
 import IPython
-import pickle
 
 import rospy
 import rospkg
 
+from ServiceProxyRegistry import service_proxy_registry
+from CompactPlan import CompactPlan, saveCompactPlan, isCompactPlanSaved, loadPickledPlan
+from CompactPlan import SEGMENT_EVENT_ATTACH, SEGMENT_EVENT_DETACH
+
 from uniform_object_rearrangement.msg import CylinderObj
 from uniform_object_rearrangement.srv import GenerateInstanceCylinder, GenerateInstanceCylinderRequest
 from uniform_object_rearrangement.srv import CylinderPositionEstimate, CylinderPositionEstimateRequest
@@ -34,107 +37,96 @@ from uniform_object_rearrangement.srv import AttachObject, AttachObjectRequest
 
 
 def serviceCall_generateInstanceCylinder(num_objects, instance_number, isNewInstance):
-    rospy.wait_for_service("generate_instance_cylinder")
     request = GenerateInstanceCylinderRequest()
     request.num_objects = num_objects
     request.instance_number = instance_number
     request.isNewInstance = isNewInstance
     try:
-        generateInstanceCylinder_proxy = rospy.ServiceProxy(
-                    "generate_instance_cylinder", GenerateInstanceCylinder)
-        generate_instance_cylinder_response = generateInstanceCylinder_proxy(
-                request.num_objects, request.instance_number, request.isNewInstance)
+        generate_instance_cylinder_response = service_proxy_registry.call(
+            "generate_instance_cylinder", GenerateInstanceCylinder, request)
         return generate_instance_cylinder_response.success
     except rospy.ServiceException as e:
         print("generate_instance_cylinder service call failed: %s" % e)
 
 def serviceCall_cylinderPositionEstimate():
-    rospy.wait_for_service("cylinder_position_estimate")
     request = CylinderPositionEstimateRequest()
     try:
-        cylinderPositionEstimate_proxy = rospy.ServiceProxy(
-            "cylinder_position_estimate", CylinderPositionEstimate)
-        cylinder_position_estimate_response = cylinderPositionEstimate_proxy(request)
+        cylinder_position_estimate_response = service_proxy_registry.call(
+            "cylinder_position_estimate", CylinderPositionEstimate, request)
         return cylinder_position_estimate_response.cylinder_objects
     except rospy.ServiceException as e:
         print("cylinder_position_estimate service call failed: %s" % e)
 
-def serviceCall_reproduceInstanceCylinder(cylinder_objects):
+def serviceCall_reproduceInstanceCylinder(cylinder_objects, plan_scene_ns=""):
     ### Input: cylinder_objects (CylinderObj[])
-    rospy.wait_for_service("reproduce_instance_cylinder")
     request = ReproduceInstanceCylinderRequest(cylinder_objects)
     try:
-        reproduceInstanceCylinder_proxy = rospy.ServiceProxy(
-            "reproduce_instance_cylinder", ReproduceInstanceCylinder)
-        reproduce_instance_cylinder_response = reproduceInstanceCylinder_proxy(request.cylinder_objects)
+        reproduce_instance_cylinder_response = service_proxy_registry.call(
+            plan_scene_ns + "reproduce_instance_cylinder", ReproduceInstanceCylinder, request)
         return list(reproduce_instance_cylinder_response.initial_arrangement), \
                 list(reproduce_instance_cylinder_response.final_arrangement), \
                 reproduce_instance_cylinder_response.success
     except rospy.ServiceException as e:
         print("reproduce_instance_cylinder service call failed: %s" % e)
 
-def serviceCall_generateConfigsForStartPositions(armType):
-    rospy.wait_for_service("generate_configs_for_start_positions")
+def serviceCall_generateConfigsForStartPositions(armType, plan_scene_ns="", corpus_file="", instance_id=0):
+    ### corpus_file, instance_id: use the config poses precomputed in the instance corpus (if any)
     request = GenerateConfigsForStartPositionsRequest()
     request.armType = armType
+    request.corpus_file = corpus_file
+    request.instance_id = instance_id
     try:
-        generateConfigsForStartPositions_proxy = rospy.ServiceProxy(
-            "generate_configs_for_start_positions", GenerateConfigsForStartPositions)
-        generate_configs_for_start_positions_response = generateConfigsForStartPositions_proxy(request.armType)
+        generate_configs_for_start_positions_response = service_proxy_registry.call(
+            plan_scene_ns + "generate_configs_for_start_positions", GenerateConfigsForStartPositions, request)
         return generate_configs_for_start_positions_response.success
     except rospy.ServiceException as e:
         print("generate_configs_for_start_positions service call failed" % e)
 
-def serviceCall_reset_planning_instance():
-    rospy.wait_for_service("reset_planning_instance")
+def serviceCall_reset_planning_instance(plan_scene_ns=""):
     request = ResetPlanningInstanceRequest()
     try:
-        resetPlanningInstance_proxy = rospy.ServiceProxy("reset_planning_instance", ResetPlanningInstance)
-        reset_planning_instance_response = resetPlanningInstance_proxy(request)
+        reset_planning_instance_response = service_proxy_registry.call(
+            plan_scene_ns + "reset_planning_instance", ResetPlanningInstance, request)
         return reset_planning_instance_response.success
     except rospy.ServiceException as e:
         print("reset_planning_instance service call failed: %s" % e)
 
-def serviceCall_clear_planning_instance():
-    rospy.wait_for_service("clear_planning_instance")
+def serviceCall_clear_planning_instance(plan_scene_ns=""):
     request = ClearPlanningInstanceRequest()
     try:
-        clearPlanningInstance_proxy = rospy.ServiceProxy("clear_planning_instance", ClearPlanningInstance)
-        clear_planning_instance_response = clearPlanningInstance_proxy(request)
+        clear_planning_instance_response = service_proxy_registry.call(
+            plan_scene_ns + "clear_planning_instance", ClearPlanningInstance, request)
         return clear_planning_instance_response.success
     except rospy.ServiceException as e:
         print("clear_planning_instance service call failed: %s" % e)
 
 def serviceCall_clear_execution_instance():
-    rospy.wait_for_service("clear_execution_instance")
     request = ClearExecutionInstanceRequest()
     try:
-        clearExecutionInstance_proxy = rospy.ServiceProxy("clear_execution_instance", ClearExecutionInstance)
-        clear_execution_instance_response = clearExecutionInstance_proxy(request)
+        clear_execution_instance_response = service_proxy_registry.call(
+            "clear_execution_instance", ClearExecutionInstance, request)
         return clear_execution_instance_response.success
     except rospy.ServiceException as e:
         print("clear_execution_instance service call failed: %s" % e)
 
-def serviceCall_reset_roadmap(armType):
-    rospy.wait_for_service("reset_roadmap")
+def serviceCall_reset_roadmap(armType, plan_scene_ns=""):
     request = ResetRoadmapRequest()
     request.armType = armType
 
     try:
-        resetRoadmap_proxy = rospy.ServiceProxy("reset_roadmap", ResetRoadmap)
-        reset_roadmap_response = resetRoadmap_proxy(request)
+        reset_roadmap_response = service_proxy_registry.call(
+            plan_scene_ns + "reset_roadmap", ResetRoadmap, request)
         return reset_roadmap_response.success
     except rospy.ServiceException as e:
         print("reset_roadmap service call failed: %s" % e)
 
 def serviceCall_reset_robot_home(armType, isLabeledRoadmapUsed=True):
-    rospy.wait_for_service("reset_robot_home")
     request = ResetRobotHomeRequest()
     request.armType = armType
     request.isLabeledRoadmapUsed = isLabeledRoadmapUsed
     try:
-        resetRobotHome_proxy = rospy.ServiceProxy("reset_robot_home", ResetRobotHome)
-        reset_robot_home_response = resetRobotHome_proxy(request)
+        reset_robot_home_response = service_proxy_registry.call(
+            "reset_robot_home", ResetRobotHome, request)
         return reset_robot_home_response.success, reset_robot_home_response.resetHome_trajectory
     except rospy.ServiceException as e:
         print("reset_robot_home service call failed: %s" % e)
@@ -148,12 +140,11 @@ def serviceCall_execute_trajectory(traj):
     =======
         success: indicator of whether the trajectory is executed successfully
     '''
-    rospy.wait_for_service("execute_trajectory")
     request = ExecuteTrajectoryRequest()
     request.arm_trajectory = traj
     try:
-        executeTraj_proxy = rospy.ServiceProxy("execute_trajectory", ExecuteTrajectory)
-        executeTraj_response = executeTraj_proxy(request.arm_trajectory)
+        executeTraj_response = service_proxy_registry.call(
+            "execute_trajectory", ExecuteTrajectory, request)
         return executeTraj_response.success
     except rospy.ServiceException as e:
         print("execute_trajectory service call failed: %s" % e)
@@ -169,14 +160,13 @@ def serviceCall_attach_object(attach, object_idx, armType):
     =======
         success: indicator of whether the attach/detach command is fulfilled
     """
-    rospy.wait_for_service("attach_object")
     request = AttachObjectRequest()
     request.attach = attach
     request.object_idx = object_idx
     request.armType = armType
     try:
-        attachObject_proxy = rospy.ServiceProxy("attach_object", AttachObject)
-        attachObject_response = attachObject_proxy(request.attach, request.object_idx, request.armType)
+        attachObject_response = service_proxy_registry.call(
+            "attach_object", AttachObject, request)
         return attachObject_response.success
     except rospy.ServiceException as e:
         print(" attach_object service call failed: %s" % e)
@@ -186,12 +176,14 @@ def executeWholePlan(whole_path, resetHome_trajectory=None):
         also tell the robot to attach or detach the object among the motions 
         inputs
         ======
-            whole path (a list of ObjectRearrangementPath): a sequence of object paths
+            whole path (a list of ObjectRearrangementPath or a CompactPlan): a sequence of object paths
             resetHome_trajectory (ArmTrajectory): the trajectory to set the robot home
         outputs
         =======
             execute_success (bool): indicate whether success or not
     """
+    if isinstance(whole_path, CompactPlan):
+        return executeCompactPlan(whole_path, resetHome_trajectory)
     for path in whole_path:
         print("rearrange object:" + str(path.object_idx))
         ### first execute the transit trajectory in the path
@@ -220,15 +212,45 @@ def resetInstance(armType):
     else:
         return False
 
-def clearInstance(armType):
+def clearInstance(armType, isExecutionSceneUsed=True):
+    ### isExecutionSceneUsed=False: the instance is only in the planning scene (e.g., loaded from a corpus)
     clear_planning_success = serviceCall_clear_planning_instance()
-    clear_execution_success = serviceCall_clear_execution_instance()
+    clear_execution_success = serviceCall_clear_execution_instance() if isExecutionSceneUsed else True
     reset_roadmap_success = serviceCall_reset_roadmap(armType)
     if clear_planning_success and clear_execution_success and reset_roadmap_success:
         return True
     else:
         return False
 
+def setupWorkerPlanScenes(cylinder_objects, armType, plan_scene_namespaces):
+    ### reproduce the instance and generate IK config for start positions
+    ### in each worker plan scene (used by the parallel planners)
+    for plan_scene_ns in plan_scene_namespaces:
+        initial_arrangement, final_arrangement, reproduce_instance_success = \
+                serviceCall_reproduceInstanceCylinder(cylinder_objects, plan_scene_ns)
+        if not reproduce_instance_success:
+            return False
+        ik_generate_success = serviceCall_generateConfigsForStartPositions(armType, plan_scene_ns)
+        if not ik_generate_success:
+            return False
+    return True
+
+def resetWorkerPlanScenes(armType, plan_scene_namespaces):
+    for plan_scene_ns in plan_scene_namespaces:
+        reset_planning_success = serviceCall_reset_planning_instance(plan_scene_ns)
+        reset_roadmap_success = serviceCall_reset_roadmap(armType, plan_scene_ns)
+        if not (reset_planning_success and reset_roadmap_success):
+            return False
+    return True
+
+def clearWorkerPlanScenes(armType, plan_scene_namespaces):
+    for plan_scene_ns in plan_scene_namespaces:
+        clear_planning_success = serviceCall_clear_planning_instance(plan_scene_ns)
+        reset_roadmap_success = serviceCall_reset_roadmap(armType, plan_scene_ns)
+        if not (clear_planning_success and reset_roadmap_success):
+            return False
+    return True
+
 def saveInstance(cylinder_objects, instanceFolder):
     ### create the instance folder specified
     if not os.path.exists(instanceFolder):
@@ -241,17 +263,46 @@ def saveInstance(cylinder_objects, instanceFolder):
             str(cylinder_object.curr_position.y) + " " + str(cylinder_object.curr_position.z) + "\n")
     f_instance.close()
 
+def executeCompactPlan(compact_plan, resetHome_trajectory=None):
+    """ execute a CompactPlan segment by segment (each segment is only converted 
+        to an ArmTrajectory right before it is executed)
+        and attach/detach the object after a segment as recorded in the plan
+        the execution succeeds only if every segment and every attach/detach succeeds
+    """
+    execute_success = True
+    for arm_trajectory, object_idx, event in compact_plan.iterateSegments():
+        if object_idx == -1:
+            ### the trajectory to reset home is executed at last (resetHome_trajectory)
+            continue
+        execute_success = serviceCall_execute_trajectory(arm_trajectory) and execute_success
+        if event == SEGMENT_EVENT_ATTACH:
+            print("rearrange object:" + str(object_idx))
+            attach_success = serviceCall_attach_object(
+                attach=True, object_idx=object_idx, armType=arm_trajectory.armType)
+            execute_success = attach_success and execute_success
+        if event == SEGMENT_EVENT_DETACH:
+            attach_success = serviceCall_attach_object(
+                attach=False, object_idx=object_idx, armType=arm_trajectory.armType)
+            execute_success = attach_success and execute_success
+
+    if resetHome_trajectory != None:
+        execute_success = serviceCall_execute_trajectory(resetHome_trajectory) and execute_success
+
+    return execute_success
+
 def saveWholePlan(object_paths, instanceFolder, resetHome_trajectory=None):
-    f_path = open(instanceFolder + "/path.obj", 'wb')
-    pickle.dump(object_paths, f_path)
-    pickle.dump(resetHome_trajectory, f_path)
+    '''save a plan to the specified folder in the compact format (see CompactPlan.py)'''
+    saveCompactPlan(object_paths, instanceFolder, resetHome_trajectory)
 
 def loadWholePlan(instanceFolder):
-    '''load a plan from the specified folder'''
-    f_path = open(instanceFolder + "/path.obj", 'rb')
-    object_paths = pickle.load(f_path)
-    resetHome_trajectory = pickle.load(f_path)
-    return object_paths, resetHome_trajectory
+    '''load a plan (a CompactPlan, loaded lazily) from the specified folder
+    a pickled plan (path.obj) is converted in memory (use CompactPlan.importPickledPlan to save it)'''
+    if isCompactPlanSaved(instanceFolder):
+        compact_plan = CompactPlan(instanceFolder)
+    else:
+        compact_plan = loadPickledPlan(instanceFolder)
+    resetHome_trajectory = compact_plan.getResetHomeTrajectory()
+    return compact_plan, resetHome_trajectory
 
 def saveSolution(all_methods_time, all_methods_success, all_method_nActions, instanceFolder):
     timeFile = instanceFolder + "/time.txt"